@@ -1,6 +1,16 @@
 # app/admin.py
 from django.contrib import admin
-from .models import Department, Position, Role, Employee, LeaveRequest, ApprovalHistory, InOutHistory
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import Department, Position, Role, Employee, LeaveRequest, ApprovalHistory, InOutHistory, NotificationOutbox, ReportJob, ApprovalWorkflow, ApprovalWorkflowStep, StoredBlob
+
+# ไฟล์แนบ/ภาพ/รายงานไม่ถูกเปิดผ่าน /media/ แล้ว: ลิงก์ไปยัง view ที่ตรวจสิทธิ์ก่อนส่งไฟล์
+def file_link(fieldfile, url, label="เปิดไฟล์"):
+    if not fieldfile:
+        return "-"
+    return format_html('<a href="{}" target="_blank">{}</a>', url, label)
+
 
 # 1. การตั้งค่าสำหรับโมเดลพื้นฐาน (ไม่มีการเปลี่ยนแปลง)
 # --------------------------------------------
@@ -77,7 +87,7 @@ class LeaveRequestAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('ข้อมูลคำขอ', {
-            'fields': ('employee', 'leave_date', 'leave_duration', 'reason')
+            'fields': ('employee', 'leave_date', 'leave_duration', 'reason', 'attachment_link')
         }),
         ('สถานะและการอนุมัติ', {
             'fields': ('status', 'current_approver_role')
@@ -87,9 +97,13 @@ class LeaveRequestAdmin(admin.ModelAdmin):
         })
     )
     
-    readonly_fields = ('request_datetime',)
+    readonly_fields = ('request_datetime', 'attachment_link')
     inlines = [ApprovalHistoryInline]
 
+    @admin.display(description="ไฟล์แนบ")
+    def attachment_link(self, obj):
+        return file_link(obj.attachment, reverse('app:request-attachment', args=[obj.pk]))
+
 
 # 4. การตั้งค่าสำหรับโมเดลประวัติ (ไม่มีการเปลี่ยนแปลง)
 # --------------------------------------------
@@ -104,4 +118,74 @@ class InOutHistoryAdmin(admin.ModelAdmin):
     list_display = ('history_id', 'employee', 'time_in', 'time_out', 'guard')
     list_filter = ('time_in', 'time_out')
     search_fields = ('employee__name', 'guard__name')
+    # ภาพถูกสร้าง/แทนที่โดย image_worker ไม่แก้ไขผ่านหน้า admin
+    exclude = ('return_image', 'return_image_display', 'return_image_thumb')
+    readonly_fields = ('return_image_link',)
+
+    @admin.display(description="ภาพถ่ายตอนกลับเข้า")
+    def return_image_link(self, obj):
+        if not obj.return_image:
+            return "-"
+        return format_html(
+            '<a href="{}" target="_blank"><img src="{}" alt="" style="max-height: 120px;"></a>',
+            reverse('app:return-image', args=[obj.pk, 'original']),
+            reverse('app:return-image', args=[obj.pk, 'thumb']),
+        )
+
+
 
+# 5. คิวแจ้งเตือน (Notification Outbox)
+# --------------------------------------------
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('outbox_id', 'channel', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('recipient__name', 'subject', 'message')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['retry_notifications']
+
+    @admin.action(description="ส่งใหม่อีกครั้ง")
+    def retry_notifications(self, request, queryset):
+        updated = queryset.exclude(status='Sent').update(
+            status='Pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"ตั้งค่าให้ส่งใหม่ {updated} รายการ")
+
+
+# 6. งานสร้างรายงานเบื้องหลัง (Report Jobs)
+# --------------------------------------------
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'dataset', 'file_format', 'requested_by', 'status', 'progress', 'created_at', 'expires_at')
+    list_filter = ('status', 'dataset', 'file_format')
+    exclude = ('file',)
+    readonly_fields = ('file_link', 'filter_hash', 'created_at', 'updated_at', 'finished_at', 'error')
+
+    @admin.display(description="ไฟล์รายงาน")
+    def file_link(self, obj):
+        if obj.status != 'Done':
+            return "-"
+        return file_link(obj.file, reverse('app:download-report-job', args=[obj.pk]), "ดาวน์โหลด")
+
+
+# 7. ลำดับขั้นการอนุมัติ (Approval Workflow)
+# --------------------------------------------
+class ApprovalWorkflowStepInline(admin.TabularInline):
+    model = ApprovalWorkflowStep
+    extra = 0
+
+
+@admin.register(ApprovalWorkflow)
+class ApprovalWorkflowAdmin(admin.ModelAdmin):
+    list_display = ('workflow_id', 'name', 'department', 'leave_duration', 'is_active', 'updated_at')
+    list_filter = ('is_active', 'leave_duration')
+    inlines = [ApprovalWorkflowStepInline]
+
+
+# 8. ไฟล์แนบที่เก็บตามเนื้อหา (Stored Blobs)
+# --------------------------------------------
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('blob_id', 'name', 'size', 'ref_count', 'updated_at')
+    list_filter = ('ref_count',)
+    readonly_fields = ('name', 'size', 'ref_count', 'created_at', 'updated_at')
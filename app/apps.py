@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # ลงทะเบียน signal handlers (เช่น ตัวนับจำนวนพนักงาน)
+        from . import signals  # noqa: F401
+
+        # สร้าง full-text index ของการค้นหาพนักงานคืน หากหายไปหลังแก้ schema (ดู search.py)
+        post_migrate.connect(signals.ensure_employee_search_index, sender=self)
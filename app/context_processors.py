@@ -1,23 +1,24 @@
-import json
-import os
-from django.conf import settings
+from .site_config import get_site_config
 
-# ระบุตำแหน่งไฟล์ Config
-CONFIG_FILE_PATH = os.path.join(settings.BASE_DIR, 'site_config.json')
 
 def load_site_config(request):
-    try:
-        # เปิดไฟล์ .json เพื่ออ่านค่า
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # ถ้าไฟล์ไม่มี หรือไฟล์เสีย ให้ใช้ค่าเริ่มต้นแทน
-        config = {
-            'brand_name': 'eLeave (Default)',
-            'footer_text': '&copy; 2025 (Default)',
-            'color_primary': '#3498db',
-            'color_success': '#198754',
-            'color_warning': '#f39c12',
-            'color_danger': '#e74c3c'
-        }
-    return {'site_config': config}
\ No newline at end of file
+    # อ่านค่าจาก cache ที่ใช้ร่วมกัน (parse ใหม่เฉพาะเมื่อมีการบันทึกค่าใหม่)
+    return {'site_config': get_site_config()}
+
+
+def load_principal_flags(request):
+    """
+    สิทธิ์และตัวเลข badge สำหรับ Navbar (base.html) ทุกหน้า
+    - ค่ามาจาก request.principal ที่โหลดไว้แล้วใน PrincipalMiddleware
+    - approval_inbox_count ส่งเป็น callable: จะ query เฉพาะเมื่อ template ใช้จริง และครั้งเดียวต่อ request
+    """
+    principal = getattr(request, 'principal', None)
+    if principal is None:
+        return {}
+    return {
+        'principal': principal,
+        'is_hr_or_admin': principal.is_hr_or_admin,
+        'is_security': principal.is_security,
+        'is_approver_or_admin': principal.is_approver_or_admin,
+        'approval_inbox_count': lambda: principal.approval_inbox_count,
+    }
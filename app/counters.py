@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+EMPLOYEE_COUNT_CACHE_KEY = "app:employee_total_count"
+
+
+def _employee_count_timeout():
+    """
+    อายุของตัวนับใน cache (วินาที) - เป็นตาข่ายกันพลาดกรณีใช้ cache แบบแยกต่อ process
+    (ตัวนับจะถูกคำนวณใหม่ทันทีทุกครั้งที่มีการเพิ่ม/ลบพนักงานอยู่แล้ว)
+    """
+    return getattr(settings, "EMPLOYEE_COUNT_CACHE_TIMEOUT", 300)
+
+
+def refresh_employee_count():
+    """นับจำนวนพนักงานทั้งหมดใหม่ แล้วเก็บลง cache"""
+    from .models import Employee
+
+    total = Employee.objects.count()
+    cache.set(EMPLOYEE_COUNT_CACHE_KEY, total, _employee_count_timeout())
+    return total
+
+
+def get_employee_count():
+    """จำนวนพนักงานทั้งหมด (อ่านจาก cache, นับใหม่เฉพาะเมื่อยังไม่มีใน cache)"""
+    total = cache.get(EMPLOYEE_COUNT_CACHE_KEY)
+    if total is None:
+        total = refresh_employee_count()
+    return total
+
+
+def count_subquery(queryset, group_field):
+    """
+    แปลง queryset ที่กรองด้วย OuterRef ให้เป็น Subquery ที่คืนค่าจำนวนแถว (ไม่มีแถว = 0)
+    ใช้รวมตัวนับหลายตัวไว้ใน SELECT เดียว
+    """
+    counted = (
+        queryset.order_by()
+        .values(group_field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def employee_dashboard_counters(employee_id):
+    """
+    ดึงข้อมูลพนักงาน (พร้อม role) และตัวนับทั้งหมดของหน้า Dashboard ใน query เดียว
+    """
+    from .models import ApprovalHistory, Employee, LeaveRequest
+
+    my_requests = LeaveRequest.objects.filter(employee=OuterRef("pk"))
+    return (
+        Employee.objects.select_related("role")
+        .annotate(
+            pending_requests_count=count_subquery(
+                my_requests.filter(status__in=["Pending", "Info Requested"]), "employee"
+            ),
+            approved_requests_count=count_subquery(
+                my_requests.filter(status="Approved"), "employee"
+            ),
+            rejected_requests_count=count_subquery(
+                my_requests.filter(status="Rejected"), "employee"
+            ),
+            approval_inbox_count=count_subquery(
+                ApprovalHistory.objects.filter(approver=OuterRef("pk"), status="Pending"),
+                "approver",
+            ),
+        )
+        .get(pk=employee_id)
+    )
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+
+def build_notification_email(subject, message_body, recipient, request_obj):
+    """
+    สร้าง EmailMessage จาก template 'app/email/notification_email.txt'
+    คืนค่า None ถ้าผู้รับไม่มีอีเมลที่ใช้ได้
+    """
+    if not recipient or not recipient.user or not recipient.user.email:
+        print(f"Email not sent: Recipient '{getattr(recipient, 'name', None)}' has no valid email.")
+        return None
+
+    context = {
+        "recipient_name": recipient.name,
+        "message_body": message_body,
+        "request_obj": request_obj,
+    }
+    email_content = render_to_string("app/email/notification_email.txt", context)
+    return EmailMessage(
+        subject=subject,
+        body=email_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient.user.email],
+    )
+
+
+class EmailBatch:
+    """
+    รวบรวมอีเมลแจ้งเตือนหลายฉบับ แล้วส่งทั้งหมดผ่าน SMTP connection เดียว
+    (STARTTLS ครั้งเดียวต่อรอบ แทนที่จะเปิด/ปิดใหม่ทุกฉบับ)
+
+    ใช้งาน:
+        with EmailBatch() as batch:
+            batch.add(subject, message_body, recipient, request_obj)
+            ...
+        # ส่งทั้งหมดตอนออกจาก with (ถ้าไม่มี Error เกิดขึ้นระหว่างทาง)
+    """
+
+    def __init__(self, connection=None, fail_silently=True):
+        self.connection = connection
+        self.fail_silently = fail_silently
+        self.messages = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add(self, subject, message_body, recipient, request_obj):
+        """เพิ่มอีเมลหนึ่งฉบับเข้ารอบส่ง คืนค่า False ถ้าผู้รับไม่มีอีเมล"""
+        message = build_notification_email(subject, message_body, recipient, request_obj)
+        self.messages.append(message)
+        return message is not None
+
+    def flush(self):
+        """
+        ส่งอีเมลที่รวบรวมไว้ทั้งหมด แล้วล้างรายการ
+        คืนค่า list ของ Error ตามลำดับที่ add (None = ส่งสำเร็จ หรือไม่มีอีเมลให้ส่ง)
+        """
+        messages, self.messages = self.messages, []
+        results = [None] * len(messages)
+        pending = [i for i, message in enumerate(messages) if message is not None]
+        if not pending:
+            return results
+
+        connection = self.connection or get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            print(f"Error opening email connection: {e}")
+            for i in pending:
+                results[i] = e
+        else:
+            try:
+                for i in pending:
+                    # ส่งทีละฉบับบน connection เดิม เพื่อให้รู้ผลของแต่ละฉบับ
+                    try:
+                        connection.send_messages([messages[i]])
+                        print(f"Email sent to: {', '.join(messages[i].to)}")
+                    except Exception as e:
+                        print(f"Error sending email: {e}")
+                        results[i] = e
+            finally:
+                connection.close()
+
+        if not self.fail_silently:
+            for error in results:
+                if error is not None:
+                    raise error
+        return results
@@ -0,0 +1,378 @@
+import base64
+import csv
+import io
+import tempfile
+import zlib
+from datetime import datetime, time, timedelta
+
+import openpyxl
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ApprovalHistory, InOutHistory, LeaveRequest, VisitorLog
+
+# จำนวนแถวที่ดึงจากฐานข้อมูลต่อครั้ง (ไม่โหลดทั้งตารางเข้าหน่วยความจำ ดู keyset_values)
+EXPORT_QUERY_CHUNK_SIZE = 2000
+# ขนาดของแต่ละก้อนที่ส่งออกไปใน response
+EXPORT_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Excel ที่ส่งตรงจาก request ได้ไม่เกินจำนวนแถวนี้ ถ้าเกินจะส่งไปสร้างเบื้องหลัง (ดู xlsx_too_large)
+EXPORT_XLSX_MAX_ROWS = 20000
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ==============================================================================
+# 1. ตัวกรองที่ใช้ร่วมกันระหว่างหน้ารายงานและไฟล์ Export
+# ==============================================================================
+
+
+def get_report_filters(params):
+    """อ่านค่าตัวกรองจาก request.GET (ค่าว่าง = ไม่กรอง)"""
+    return {
+        "search_query": params.get("search_query", ""),
+        "start_date": params.get("start_date", ""),
+        "end_date": params.get("end_date", ""),
+    }
+
+
+def parse_filter_date(value):
+    """แปลงค่า YYYY-MM-DD จากฟอร์ม (ค่าว่างหรือรูปแบบผิด = ไม่กรอง)"""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def local_day_start(day):
+    """เวลาเริ่มต้นของวันตามเวลาท้องถิ่น (TIME_ZONE = Asia/Bangkok) เป็น aware datetime"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def apply_report_filters(
+    queryset, filters, search_field, date_field=None, datetime_field=None
+):
+    """
+    กรองตามชื่อ (search_field) และช่วงวันที่
+    - date_field: DateField กรองด้วยวันที่ตรงๆ
+    - datetime_field: DateTimeField กรองเป็นช่วงเวลาแบบ [เริ่มวันแรก, เริ่มวันถัดจากวันสุดท้าย)
+      ตามเวลาท้องถิ่น แทนการใช้ __date ซึ่งครอบคอลัมน์ด้วย DATE() ทำให้ใช้ index ไม่ได้
+    """
+    if filters["search_query"]:
+        queryset = queryset.filter(
+            **{f"{search_field}__icontains": filters["search_query"]}
+        )
+    start_date = parse_filter_date(filters["start_date"])
+    end_date = parse_filter_date(filters["end_date"])
+    if datetime_field:
+        if start_date:
+            queryset = queryset.filter(
+                **{f"{datetime_field}__gte": local_day_start(start_date)}
+            )
+        if end_date:
+            queryset = queryset.filter(
+                **{f"{datetime_field}__lt": local_day_start(end_date + timedelta(days=1))}
+            )
+    elif date_field:
+        if start_date:
+            queryset = queryset.filter(**{f"{date_field}__gte": start_date})
+        if end_date:
+            queryset = queryset.filter(**{f"{date_field}__lte": end_date})
+    return queryset
+
+
+def filter_in_out_history(queryset, filters):
+    return apply_report_filters(
+        queryset, filters, "employee__name", datetime_field="time_out"
+    )
+
+
+# ==============================================================================
+# 2. แปลงข้อมูลเป็นแถว (join ใน SQL แล้วอ่านทีละ batch)
+# ==============================================================================
+
+
+def keyset_values(queryset, fields, descending=False, batch_size=None):
+    """
+    generator ของ values_list(*fields) เรียงตาม primary key อ่านทีละ batch_size แถว
+    แต่ละ batch เป็น query ใหม่ที่เริ่มต่อจาก pk สุดท้ายของ batch ก่อน (pk > last หรือ pk < last)
+    ใช้แทน .iterator(): mysqlclient ไม่มี server-side cursor จึงดึงผลลัพธ์ทั้งหมดมาเก็บฝั่ง client
+    """
+    batch_size = batch_size or EXPORT_QUERY_CHUNK_SIZE
+    order = "-pk" if descending else "pk"
+    lookup = "pk__lt" if descending else "pk__gt"
+    queryset = queryset.order_by(order).values_list("pk", *fields)
+    last = None
+    while True:
+        batch = queryset.filter(**{lookup: last}) if last is not None else queryset
+        rows = list(batch[:batch_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+IN_OUT_HISTORY_HEADERS = ["ชื่อพนักงาน", "แผนก", "วันที่", "เวลาออก", "เวลากลับ", "ผู้บันทึก (รปภ.)"]
+
+
+def in_out_history_rows(queryset):
+    """
+    คืนค่า generator ของแถวรายงานการเข้า-ออก (เวลาแสดงตามเวลาท้องถิ่น)
+    เรียงจากใหม่ไปเก่าตาม history_id (แถวถูกสร้างตอนบันทึกเวลาออก จึงเป็นลำดับเดียวกับ time_out)
+    """
+    rows = keyset_values(
+        queryset,
+        [
+            "employee__name",
+            "employee__department__department_name",
+            "time_out",
+            "time_in",
+            "guard__name",
+        ],
+        descending=True,
+    )
+
+    for employee_name, department_name, time_out, time_in, guard_name in rows:
+        time_out = timezone.localtime(time_out) if time_out else None
+        yield [
+            employee_name,
+            department_name,
+            time_out.strftime("%d/%m/%Y") if time_out else "",
+            time_out.strftime("%H:%M:%S") if time_out else "",
+            timezone.localtime(time_in).strftime("%H:%M:%S") if time_in else "ยังไม่กลับ",
+            guard_name,
+        ]
+
+
+# ==============================================================================
+# 3. ชุดข้อมูลสำหรับ Export CSV (สำหรับดึงข้อมูลจำนวนมากไปใช้ต่อ เช่น งาน BI)
+# ==============================================================================
+# แต่ละชุดข้อมูลระบุ: queryset, คอลัมน์ (หัวตาราง, field), field ที่ใช้ค้นหาชื่อ,
+# field วันที่ (date_field สำหรับ DateField หรือ datetime_field สำหรับ DateTimeField)
+
+CSV_DATASETS = {
+    "in-out-history": {
+        "queryset": InOutHistory.objects.order_by("history_id"),
+        "columns": [
+            ("history_id", "history_id"),
+            ("request_id", "request_id"),
+            ("employee_name", "employee__name"),
+            ("department", "employee__department__department_name"),
+            ("time_out", "time_out"),
+            ("time_in", "time_in"),
+            ("status", "status"),
+            ("guard_name", "guard__name"),
+        ],
+        "search_field": "employee__name",
+        "datetime_field": "time_out",
+    },
+    "visitor-log": {
+        "queryset": VisitorLog.objects.order_by("log_id"),
+        "columns": [
+            ("log_id", "log_id"),
+            ("visitor_name", "visitor_name"),
+            ("contact_person", "contact_person"),
+            ("reason", "reason"),
+            ("time_in", "time_in"),
+            ("time_out", "time_out"),
+            ("status", "status"),
+            ("guard_name", "guard__name"),
+        ],
+        "search_field": "visitor_name",
+        "datetime_field": "time_in",
+    },
+    "leave-requests": {
+        "queryset": LeaveRequest.objects.order_by("request_id"),
+        "columns": [
+            ("request_id", "request_id"),
+            ("employee_name", "employee__name"),
+            ("department", "employee__department__department_name"),
+            ("leave_date", "leave_date"),
+            ("leave_duration", "leave_duration"),
+            ("status", "status"),
+            ("current_approver_role", "current_approver_role"),
+            ("request_datetime", "request_datetime"),
+            ("reason", "reason"),
+        ],
+        "search_field": "employee__name",
+        "date_field": "leave_date",
+    },
+    "approval-history": {
+        "queryset": ApprovalHistory.objects.order_by("history_id"),
+        "columns": [
+            ("history_id", "history_id"),
+            ("request_id", "request_id"),
+            ("employee_name", "request__employee__name"),
+            ("leave_date", "request__leave_date"),
+            ("approval_order", "approval_order"),
+            ("approver_name", "approver__name"),
+            ("status", "status"),
+            ("approval_date", "approval_date"),
+            ("approval_time", "approval_time"),
+            ("comment", "comment"),
+        ],
+        "search_field": "request__employee__name",
+        "date_field": "request__leave_date",
+    },
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def dataset_queryset(dataset, filters):
+    return apply_report_filters(
+        dataset["queryset"].all(),
+        filters,
+        dataset["search_field"],
+        date_field=dataset.get("date_field"),
+        datetime_field=dataset.get("datetime_field"),
+    )
+
+
+def dataset_rows(dataset, queryset):
+    """คืนค่า (หัวตาราง, generator ของแถว) ของชุดข้อมูล (join ใน SQL, อ่านทีละ batch เรียงตาม pk)"""
+    headers = [header for header, _ in dataset["columns"]]
+    rows = keyset_values(queryset, [field for _, field in dataset["columns"]])
+    return headers, ([_csv_value(value) for value in row] for row in rows)
+
+
+# ==============================================================================
+# 4. สร้างไฟล์แบบ streaming
+# ==============================================================================
+# CSV ส่งออกได้ทันทีที่อ่านแถวแรก ๆ แต่ไฟล์ xlsx เป็น zip ที่ต้องเขียนให้ครบก่อนจึงจะเปิดได้
+# Excel จึงส่ง byte แรกได้หลังสร้างทั้งไฟล์เสร็จ (ระหว่างนั้นผู้ใช้รอโดยไม่เห็นอะไร)
+# ไฟล์ใหญ่จึงส่งไปสร้างในคิว report job แทน (ดู xlsx_too_large)
+
+
+def write_xlsx(fileobj, sheet_title, headers, rows):
+    """
+    เขียน Excel ด้วย write-only workbook
+    (openpyxl เขียนแถวลงไฟล์ชั่วคราวทันที ไม่เก็บไว้ใน memory)
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def xlsx_too_large(queryset):
+    """จำนวนแถวเกิน EXPORT_XLSX_MAX_ROWS หรือไม่ (นับแค่ถึงเกณฑ์ ไม่ COUNT ทั้งตาราง)"""
+    limit = getattr(settings, "EXPORT_XLSX_MAX_ROWS", EXPORT_XLSX_MAX_ROWS)
+    return queryset[: limit + 1].count() > limit
+
+
+def stream_xlsx(sheet_title, headers, rows):
+    """
+    สร้าง Excel ทั้งไฟล์ลงไฟล์ชั่วคราวก่อน แล้วจึงส่งออกไปทีละก้อน ใช้กับ StreamingHttpResponse
+    หน่วยความจำไม่โตตามจำนวนแถว แต่ byte แรกจะออกไปหลังสร้างไฟล์เสร็จแล้วเท่านั้น
+    """
+    with tempfile.TemporaryFile() as f:
+        write_xlsx(f, sheet_title, headers, rows)
+        f.seek(0)
+        while chunk := f.read(EXPORT_STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def stream_csv(headers, rows):
+    """เขียน CSV (UTF-8) แล้วส่งออกเป็นก้อนละประมาณ EXPORT_STREAM_CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_STREAM_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks):
+    """บีบอัดข้อมูลที่ไหลผ่านเป็นรูปแบบ gzip ทีละก้อน (ไม่ต้องรอข้อมูลทั้งหมด)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ==============================================================================
+# 5. แบ่งหน้าแบบ keyset (cursor) สำหรับหน้ารายงาน
+# ==============================================================================
+# เรียงตาม (time_out, history_id) จากใหม่ไปเก่า แล้วใช้แถวสุดท้ายของหน้าเป็นจุดเริ่มของหน้าถัดไป
+# ฐานข้อมูลอ่านจาก index ต่อจากตำแหน่งนั้นได้เลย ต่างจาก OFFSET ที่ต้องข้ามแถวก่อนหน้าทั้งหมด
+# จึงใช้เวลาเท่ากันไม่ว่าจะอยู่หน้าที่เท่าไร (ไม่แสดงจำนวนหน้าทั้งหมด เพราะ COUNT ต้องอ่านทุกแถว)
+
+
+def encode_cursor(history):
+    value = f"{history.time_out.isoformat()}|{history.history_id}"
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """คืนค่า (time_out, history_id) หรือ None ถ้า cursor ไม่ถูกต้อง"""
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        time_out, history_id = value.split("|")
+        time_out = parse_datetime(time_out)
+        history_id = int(history_id)
+    except (ValueError, UnicodeError):
+        return None
+    if time_out is None or timezone.is_naive(time_out):
+        return None
+    return time_out, history_id
+
+
+def in_out_history_page(queryset, after=None, before=None, page_size=50):
+    """
+    คืนค่าหน้าหนึ่งของรายงานการเข้า-ออก เป็น dict:
+    rows, next_cursor (None = หน้าสุดท้าย), previous_cursor (None = หน้าแรก)
+    - after: cursor ของแถวสุดท้ายในหน้าก่อน (ไปหน้าถัดไป)
+    - before: cursor ของแถวแรกในหน้าถัดไป (ย้อนกลับ)
+    """
+    # บันทึกออกทุกรายการมี time_out เสมอ (ตั้งตอน รปภ. กดบันทึก) แถวที่เป็น NULL จะไม่มีตำแหน่งใน cursor
+    queryset = queryset.filter(time_out__isnull=False)
+    after = decode_cursor(after) if after else None
+    before = decode_cursor(before) if before else None
+
+    if before:
+        time_out, history_id = before
+        # time_out__gte ซ้ำกับเงื่อนไข OR เพื่อให้ฐานข้อมูลใช้ index เป็นช่วง (range scan) ได้
+        rows = list(
+            queryset.filter(time_out__gte=time_out)
+            .filter(
+                Q(time_out__gt=time_out) | Q(time_out=time_out, history_id__gt=history_id)
+            )
+            .order_by("time_out", "history_id")[: page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after:
+            time_out, history_id = after
+            queryset = queryset.filter(time_out__lte=time_out).filter(
+                Q(time_out__lt=time_out) | Q(time_out=time_out, history_id__lt=history_id)
+            )
+        rows = list(queryset.order_by("-time_out", "-history_id")[: page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    return {
+        "rows": rows,
+        "next_cursor": encode_cursor(rows[-1]) if rows and has_next else None,
+        "previous_cursor": encode_cursor(rows[0]) if rows and has_previous else None,
+    }
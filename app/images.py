@@ -0,0 +1,152 @@
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import InOutHistory
+
+# ==============================================================================
+# ประมวลผลภาพถ่ายการกลับเข้า (InOutHistory.return_image) เบื้องหลัง
+# ==============================================================================
+# View บันทึกไฟล์ที่อัปโหลดแล้วตั้ง image_status = "Pending" ทันที (ไม่ประมวลผลภาพระหว่าง request)
+# python manage.py image_worker  ดึงงานไปทำใน process pool:
+# - หมุนภาพตาม EXIF แล้วตัด EXIF ทิ้งทั้งหมด (รวมพิกัด GPS ของโทรศัพท์)
+# - return_image         : JPEG ไม่เกิน RETURN_IMAGE_MAX_SIZE (แทนไฟล์ต้นฉบับหลายเมกะไบต์)
+# - return_image_display : WebP ไม่เกิน RETURN_IMAGE_DISPLAY_SIZE (สำหรับเปิดดู)
+# - return_image_thumb   : WebP ไม่เกิน RETURN_IMAGE_THUMB_SIZE (สำหรับตาราง/รายงาน)
+
+
+def _size(name, default):
+    return getattr(settings, name, default)
+
+
+def _lease():
+    """งาน Processing ที่ค้างนานกว่านี้ (worker ตาย) จะถูกดึงไปทำใหม่"""
+    return timedelta(seconds=getattr(settings, "IMAGE_WORKER_LEASE_SECONDS", 300))
+
+
+# ==============================================================================
+# 1. ฝั่ง View
+# ==============================================================================
+
+
+def set_return_image(history, upload):
+    """แนบภาพถ่ายการกลับเข้า และเข้าคิวประมวลผล (บันทึกพร้อม history.save())"""
+    history.return_image = upload
+    history.return_image_display = None
+    history.return_image_thumb = None
+    history.image_status = "Pending"
+    history.image_updated_at = timezone.now()
+
+
+# ==============================================================================
+# 2. ฝั่ง Worker
+# ==============================================================================
+
+
+def claim_image_jobs(limit):
+    """จองภาพที่รอประมวลผล (รวมงาน Processing ที่ค้างเกิน lease) ด้วย UPDATE แบบมีเงื่อนไข"""
+    now = timezone.now()
+    due = Q(image_status="Pending") | Q(
+        image_status="Processing", image_updated_at__lt=now - _lease()
+    )
+    candidate_ids = list(
+        InOutHistory.objects.filter(due)
+        .order_by("image_updated_at")
+        .values_list("history_id", flat=True)[:limit]
+    )
+    return [
+        history_id
+        for history_id in candidate_ids
+        if InOutHistory.objects.filter(due, history_id=history_id).update(
+            image_status="Processing", image_updated_at=now
+        )
+    ]
+
+
+def _encode(image, max_size, file_format, **options):
+    """ย่อภาพให้ด้านยาวไม่เกิน max_size (ไม่ขยาย) แล้วเข้ารหัสใหม่ คืนค่า bytes (ไม่มี EXIF)"""
+    image = image.copy()
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, file_format, **options)
+    return buffer.getvalue()
+
+
+def _render_variants(fileobj):
+    """คืนค่า {field: (นามสกุล, bytes)} ของภาพทุกขนาด"""
+    with Image.open(fileobj) as image:
+        # ภาพจากโทรศัพท์มักเก็บการหมุนไว้ใน EXIF: หมุนจริงก่อน เพราะ EXIF จะถูกตัดทิ้ง
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+    quality = _size("RETURN_IMAGE_QUALITY", 80)
+    return {
+        "return_image": (
+            ".jpg",
+            _encode(
+                image,
+                _size("RETURN_IMAGE_MAX_SIZE", 2048),
+                "JPEG",
+                quality=quality + 5,
+                optimize=True,
+            ),
+        ),
+        "return_image_display": (
+            ".webp",
+            _encode(image, _size("RETURN_IMAGE_DISPLAY_SIZE", 1280), "WEBP", quality=quality),
+        ),
+        "return_image_thumb": (
+            ".webp",
+            _encode(image, _size("RETURN_IMAGE_THUMB_SIZE", 320), "WEBP", quality=quality - 10),
+        ),
+    }
+
+
+def process_return_image(history_id):
+    """ประมวลผลภาพของ InOutHistory หนึ่งรายการ (รันใน process ของ pool) คืนค่าสถานะสุดท้าย"""
+    try:
+        history = InOutHistory.objects.get(history_id=history_id)
+        source_name = history.return_image.name
+        if not source_name:
+            InOutHistory.objects.filter(history_id=history_id).update(image_status="")
+            return ""
+
+        with history.return_image.open("rb") as f:
+            variants = _render_variants(f)
+        names = {
+            field: history.return_image.storage.save(
+                f"return_images/{history_id}{ext}", ContentFile(content)
+            )
+            for field, (ext, content) in variants.items()
+        }
+
+        with transaction.atomic():
+            history = InOutHistory.objects.select_for_update().get(history_id=history_id)
+            if history.return_image.name != source_name:
+                # มีภาพใหม่ระหว่างประมวลผล (ภาพใหม่อยู่ในคิวแล้ว) ไฟล์ที่เพิ่งสร้างจะถูกลบโดย dedupe_media
+                return history.image_status
+            for field, name in names.items():
+                setattr(history, field, name)
+            history.image_status = "Done"
+            history.image_updated_at = timezone.now()
+            # บันทึกผ่าน save() เพื่อให้ signal ปรับจำนวนการอ้างอิงไฟล์ (ต้นฉบับเดิมจะถูกปล่อย)
+            history.save(update_fields=[*names, "image_status", "image_updated_at"])
+        return "Done"
+    except Exception as e:
+        print(f"Error processing return image {history_id}: {e}")
+        mark_image_failed(history_id)
+        return "Failed"
+    finally:
+        connection.close()
+
+
+def mark_image_failed(history_id):
+    # ภาพต้นฉบับยังอยู่ ใช้แสดงแทนได้ (ไม่ลองใหม่อัตโนมัติ เช่น ไฟล์ที่ไม่ใช่ภาพ)
+    InOutHistory.objects.filter(history_id=history_id).update(
+        image_status="Failed", image_updated_at=timezone.now()
+    )
@@ -0,0 +1,124 @@
+import threading
+import uuid
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LINE_API_BASE_URL = "https://api.line.me/v2/bot/message"
+
+# LINE Messaging API รับผู้รับได้สูงสุด 500 คนต่อการเรียก multicast หนึ่งครั้ง
+MULTICAST_MAX_RECIPIENTS = 500
+
+
+class LineClient:
+    """
+    ตัวส่งข้อความ LINE ที่ใช้ requests.Session เดียว (keep-alive + connection pool)
+    - มี timeout ทั้งตอนเชื่อมต่อและตอนรอคำตอบ ป้องกัน thread ค้างตลอดไป
+    - ลองใหม่อัตโนมัติเมื่อเจอ 429/5xx โดยใช้ X-Line-Retry-Key เดิม
+      (LINE จะไม่ส่งข้อความซ้ำ ถ้า retry key เดิมเคยส่งสำเร็จแล้ว)
+    """
+
+    def __init__(
+        self,
+        access_token,
+        connect_timeout=3.05,
+        read_timeout=10,
+        max_retries=3,
+        pool_size=10,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {access_token}",
+            }
+        )
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+
+    def _post(self, endpoint, payload, retry_key=None):
+        # ใช้ retry_key เดิมเมื่อส่งงานเดิมซ้ำ (เช่น notification worker ลองใหม่รอบถัดไป)
+        response = self.session.post(
+            f"{LINE_API_BASE_URL}/{endpoint}",
+            json=payload,
+            headers={"X-Line-Retry-Key": str(retry_key or uuid.uuid4())},
+            timeout=self.timeout,
+        )
+        # LINE ตอบ 409 เมื่อ retry key นี้เคยส่งสำเร็จแล้ว ถือว่าสำเร็จ
+        if response.status_code != 409:
+            response.raise_for_status()
+        return response
+
+    def push(self, user_id, text, retry_key=None):
+        """ส่งข้อความหาผู้รับหนึ่งคน"""
+        return self._post(
+            "push",
+            {"to": user_id, "messages": [{"type": "text", "text": text}]},
+            retry_key,
+        )
+
+    def multicast(self, user_ids, text, retry_key=None):
+        """ส่งข้อความเดียวกันหาผู้รับหลายคน (ไม่เกิน 500 คน) ในการเรียก API ครั้งเดียว"""
+        return self._post(
+            "multicast",
+            {"to": list(user_ids), "messages": [{"type": "text", "text": text}]},
+            retry_key,
+        )
+
+    def send_chunk(self, user_ids, text, retry_key=None):
+        """ส่งหนึ่งชุดจาก recipient_chunks(): push (คนเดียว) หรือ multicast (หลายคน)"""
+        if len(user_ids) == 1:
+            return self.push(user_ids[0], text, retry_key)
+        return self.multicast(user_ids, text, retry_key)
+
+    def send_text(self, user_ids, text):
+        """
+        ส่งข้อความเดียวกันหาผู้รับทุกคน (แบ่งเป็นชุดละไม่เกิน 500 คน)
+        คืนค่าจำนวนครั้งที่เรียก API
+        """
+        calls = 0
+        for chunk in recipient_chunks(user_ids):
+            self.send_chunk(chunk, text)
+            calls += 1
+        return calls
+
+
+def recipient_chunks(user_ids):
+    """ตัด ID ว่าง/ซ้ำ แล้วแบ่งเป็นชุดละไม่เกิน MULTICAST_MAX_RECIPIENTS (ชุดละหนึ่งครั้งที่เรียก API)"""
+    user_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    return [
+        user_ids[i : i + MULTICAST_MAX_RECIPIENTS]
+        for i in range(0, len(user_ids), MULTICAST_MAX_RECIPIENTS)
+    ]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_line_client():
+    """คืนค่า LineClient ตัวเดียวต่อ process (ใช้ connection pool ร่วมกัน)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LineClient(
+                    settings.LINE_CHANNEL_ACCESS_TOKEN,
+                    connect_timeout=getattr(settings, "LINE_CONNECT_TIMEOUT", 3.05),
+                    read_timeout=getattr(settings, "LINE_READ_TIMEOUT", 10),
+                    max_retries=getattr(settings, "LINE_MAX_RETRIES", 3),
+                    pool_size=getattr(settings, "LINE_POOL_SIZE", 10),
+                )
+    return _client
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.utils import dateformat, timezone
+from django.utils.module_loading import import_string
+
+# ==============================================================================
+# ช่องทาง (channel) และชนิดของ event
+# ==============================================================================
+# - "security"       : หน้า Security Dashboard ของ รปภ. ทุกคน
+# - "inbox:<emp_id>" : badge กล่องงานอนุมัติของผู้อนุมัติแต่ละคน
+SECURITY_CHANNEL = "security"
+
+# event ที่มี HTML ประกอบ (render ตอนส่งให้ผู้ฟังแต่ละคน เพื่อใส่ csrf_token ของคนนั้น)
+EVENT_TEMPLATES = {
+    "leave.ready": ["app/partials/security_ready_row.html"],
+    "inout.out": [
+        "app/partials/security_out_row.html",
+        "app/partials/security_record_in_modal.html",
+    ],
+    "visitor.in": ["app/partials/security_visitor_row.html"],
+}
+
+
+def inbox_channel(employee_id):
+    return f"inbox:{employee_id}"
+
+
+# ==============================================================================
+# 1. Hub: ผู้ฟัง (SSE connection) ทั้งหมดใน process นี้
+# ==============================================================================
+
+
+class _Subscriber:
+    def __init__(self, channels, loop, queue_size):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+
+    def offer(self, event):
+        """ถูกเรียกใน event loop ของผู้ฟัง ถ้าคิวเต็ม (ผู้ฟังช้า) ให้ล้างคิวแล้วสั่งโหลดหน้าใหม่แทน"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "data": {}})
+
+
+class LiveEventHub:
+    """
+    กระจาย event ให้ผู้ฟังใน process เดียวกัน
+    dispatch() เรียกได้จากทุก thread (เช่น thread ของ view แบบ sync)
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, channels):
+        """ต้องเรียกภายใน event loop ของผู้ฟัง และต้องเรียก unsubscribe() เมื่อเลิกฟัง"""
+        subscriber = _Subscriber(
+            set(channels), asyncio.get_running_loop(), self.queue_size
+        )
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def dispatch(self, channel, event_type, data):
+        event = {"type": event_type, "data": data}
+        with self._lock:
+            targets = [s for s in self._subscribers if channel in s.channels]
+        for subscriber in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # event loop ของผู้ฟังปิดไปแล้ว (กำลังตัดการเชื่อมต่อ)
+                pass
+
+
+# ==============================================================================
+# 2. Broker: เส้นทางจากผู้ส่ง (view) ไปยัง Hub ของทุก process
+# ==============================================================================
+
+
+class InProcessBroker:
+    """
+    ส่ง event เข้า Hub ของ process เดียวกันโดยตรง
+    ใช้ได้เมื่อรัน ASGI server เพียง process เดียว (เครื่องเดียว, worker เดียว)
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, channel, event_type, data):
+        self.hub.dispatch(channel, event_type, data)
+
+
+class DatabaseBroker:
+    """
+    ส่ง event ผ่านตาราง LiveEvent สำหรับหลายเครื่อง/หลาย worker
+    - ผู้ส่งบันทึก event ลงตาราง
+    - แต่ละ process มี thread เดียวที่อ่าน event ใหม่ (ตาม event_id) แล้วส่งต่อเข้า Hub ของตัวเอง
+      (ไม่ว่าจะมีผู้ฟังกี่คน ก็ query เพียงครั้งเดียวต่อรอบ)
+    event_id ถูกจองตอน INSERT แต่ commit ไม่เรียงตามลำดับ: event ที่ commit ช้ากว่าแถวที่ id สูงกว่า
+    จะปรากฏทีหลัง จึงอ่านต่อจาก "floor" (id สูงสุดที่ไม่มีช่องว่างก่อนหน้า) และจำ id ที่ส่งแล้วเหนือ floor
+    ช่องว่างที่ไม่มีแถวมาเติมภายใน LIVE_EVENTS_GAP_SECONDS (เช่น INSERT ที่ rollback) จะถูกข้ามไป
+    """
+
+    batch_size = 500
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._thread = None
+        self._lock = threading.Lock()
+        self._floor = None
+        self._seen = set()
+        self._gap_since = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="live-events-poller", daemon=True
+                )
+                self._thread.start()
+
+    def publish(self, channel, event_type, data):
+        from .models import LiveEvent
+
+        LiveEvent.objects.create(channel=channel, event_type=event_type, data=data)
+
+    def poll(self, now=None):
+        """อ่าน event ใหม่หนึ่งรอบแล้วส่งเข้า Hub คืนค่าจำนวนแถวที่อ่าน"""
+        from .models import LiveEvent
+
+        now = time.monotonic() if now is None else now
+        if self._floor is None:
+            # เริ่มฟังจาก event ล่าสุด (ไม่ส่ง event เก่าซ้ำ)
+            self._floor = LiveEvent.objects.aggregate(last=Max("event_id"))["last"] or 0
+        rows = list(
+            LiveEvent.objects.filter(event_id__gt=self._floor)
+            .exclude(event_id__in=self._seen)
+            .order_by("event_id")
+            .values_list("event_id", "channel", "event_type", "data")[: self.batch_size]
+        )
+        for event_id, channel, event_type, data in rows:
+            self.hub.dispatch(channel, event_type, data)
+            self._seen.add(event_id)
+        self._advance_floor(now)
+        return len(rows)
+
+    def _advance_floor(self, now):
+        while self._floor + 1 in self._seen:
+            self._floor += 1
+            self._seen.discard(self._floor)
+        if not self._seen:
+            self._gap_since = None
+            return
+        # มีช่องว่างก่อน id ที่ส่งแล้ว: รอให้ event ที่ยังไม่ commit ปรากฏ แต่ไม่เกิน LIVE_EVENTS_GAP_SECONDS
+        if self._gap_since is None:
+            self._gap_since = now
+        elif now - self._gap_since >= getattr(settings, "LIVE_EVENTS_GAP_SECONDS", 30):
+            self._floor = min(self._seen) - 1
+            self._gap_since = None
+            self._advance_floor(now)
+
+    def _run(self):
+        from .models import LiveEvent
+
+        interval = getattr(settings, "LIVE_EVENTS_POLL_INTERVAL", 1.0)
+        retention = timedelta(
+            seconds=getattr(settings, "LIVE_EVENTS_RETENTION_SECONDS", 300)
+        )
+        last_prune = 0.0
+        while True:
+            count = 0
+            try:
+                count = self.poll()
+                if time.monotonic() - last_prune > retention.total_seconds():
+                    LiveEvent.objects.filter(
+                        created_at__lt=timezone.now() - retention
+                    ).delete()
+                    last_prune = time.monotonic()
+            except DatabaseError as e:
+                print(f"Error polling live events: {e}")
+                connection.close()
+            if count < self.batch_size:
+                time.sleep(interval)
+
+
+_hub = None
+_broker = None
+_init_lock = threading.Lock()
+
+
+def get_hub():
+    """คืนค่า Hub ตัวเดียวต่อ process"""
+    global _hub
+    if _hub is None:
+        with _init_lock:
+            if _hub is None:
+                _hub = LiveEventHub(getattr(settings, "LIVE_EVENTS_QUEUE_SIZE", 100))
+    return _hub
+
+
+def get_broker():
+    """คืนค่า Broker ตาม LIVE_EVENTS_BROKER (ระบุ path ของ class ได้ เพื่อใช้ตัวกลางอื่น)"""
+    global _broker
+    if _broker is None:
+        hub = get_hub()
+        with _init_lock:
+            if _broker is None:
+                broker_class = import_string(
+                    getattr(
+                        settings, "LIVE_EVENTS_BROKER", "app.live_events.InProcessBroker"
+                    )
+                )
+                _broker = broker_class(hub)
+    return _broker
+
+
+# ==============================================================================
+# 3. ฝั่งผู้ส่ง: เรียกจาก view/signal
+# ==============================================================================
+
+
+def _publish_now(channel, event_type, data):
+    try:
+        get_broker().publish(channel, event_type, data)
+    except Exception as e:
+        # การแจ้งแบบ real-time เป็นส่วนเสริม ห้ามทำให้ request หลักล้มเหลว
+        print(f"Error publishing live event '{event_type}': {e}")
+
+
+def publish_event(channel, event_type, data):
+    """ส่ง event หลัง transaction commit แล้วเท่านั้น (ถ้า rollback จะไม่ส่ง)"""
+    transaction.on_commit(lambda: _publish_now(channel, event_type, data))
+
+
+def publish_inbox_count(employee_id):
+    """ส่งจำนวนงานรออนุมัติล่าสุดไปที่ badge ของผู้อนุมัติ (นับตอน commit แล้ว)"""
+    from .models import ApprovalHistory
+
+    def publish():
+        count = ApprovalHistory.objects.filter(
+            approver_id=employee_id, status="Pending"
+        ).count()
+        _publish_now(inbox_channel(employee_id), "inbox.count", {"count": count})
+
+    transaction.on_commit(publish)
+
+
+def _time_display(value):
+    return dateformat.format(timezone.localtime(value), "H:i:s")
+
+
+def ready_to_leave_data(leave_request):
+    return {
+        "request_id": leave_request.request_id,
+        "employee_name": leave_request.employee.name,
+        "department_name": leave_request.employee.department.department_name,
+        "duration": leave_request.get_leave_duration_display(),
+    }
+
+
+def already_out_data(history):
+    return {
+        "history_id": history.history_id,
+        "request_id": history.request_id,
+        "employee_name": history.employee.name,
+        "time_out": _time_display(history.time_out),
+    }
+
+
+def visitor_inside_data(visitor_log):
+    return {
+        "log_id": visitor_log.log_id,
+        "visitor_name": visitor_log.visitor_name,
+        "contact_person": visitor_log.contact_person,
+        "time_in": _time_display(visitor_log.time_in),
+    }
+
+
+# ==============================================================================
+# 4. ฝั่งผู้ฟัง: สร้าง stream สำหรับ StreamingHttpResponse (text/event-stream)
+# ==============================================================================
+
+
+def format_sse(event, csrf_token=""):
+    payload = dict(event["data"])
+    templates = EVENT_TEMPLATES.get(event["type"])
+    if templates:
+        context = {**payload, "csrf_token": csrf_token}
+        payload["html"] = [render_to_string(name, context) for name in templates]
+    return (
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    )
+
+
+async def stream_events(channels, csrf_token="", initial=None):
+    """
+    async generator ที่ส่ง event ของ channels ที่ระบุ
+    - initial: coroutine function ที่คืนค่า list ของ event ตั้งต้น (เรียกหลังเริ่มฟังแล้ว จะได้ไม่พลาด event)
+    - ส่ง comment เป็น keep-alive เป็นระยะ เพื่อไม่ให้ proxy ตัดการเชื่อมต่อ
+    """
+    keepalive = getattr(settings, "LIVE_EVENTS_KEEPALIVE_SECONDS", 15)
+    get_broker().start()
+    hub = get_hub()
+    subscriber = hub.subscribe(channels)
+    try:
+        yield "retry: 5000\n\n"
+        if initial is not None:
+            for event in await initial():
+                yield format_sse(event, csrf_token)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event, csrf_token)
+    finally:
+        # browser ปิดหน้า/ตัดการเชื่อมต่อ
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,315 @@
+import random
+import statistics
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from app.models import (
+    ApprovalHistory,
+    Department,
+    Employee,
+    InOutHistory,
+    LeaveRequest,
+    Position,
+    Role,
+    VisitorLog,
+)
+from app.rollups import rebuild_leave_request_rollups
+from app.search import refresh_employee_search_keys
+
+BENCH_DEPARTMENT = "[benchmark]"
+BENCH_USERNAME_PREFIX = "bench_"
+
+# โมเดลที่มี composite index สำหรับ hot query (ใช้ตอน --compare)
+INDEXED_MODELS = [LeaveRequest, ApprovalHistory, InOutHistory, VisitorLog]
+
+
+def _hot_queries(approver, employee, today):
+    """
+    รายการ query ที่ถูกเรียกบ่อยที่สุดในระบบ
+    คืนค่า list ของ (ชื่อ, queryset สำหรับ EXPLAIN, ฟังก์ชันที่ใช้จับเวลา)
+    """
+    inbox = ApprovalHistory.objects.filter(approver=approver, status="Pending")
+    my_pending = LeaveRequest.objects.filter(
+        employee=employee, status__in=["Pending", "Info Requested"]
+    ).order_by("-request_datetime")
+    my_approved = LeaveRequest.objects.filter(employee=employee, status="Approved")
+    ready_to_leave = LeaveRequest.objects.filter(
+        leave_date=today, status="Approved"
+    ).exclude(request_id__in=InOutHistory.objects.values_list("request_id", flat=True))
+    already_out = InOutHistory.objects.filter(request__leave_date=today, status="OUT")
+    visitors_inside = VisitorLog.objects.filter(status="IN").order_by("-time_in")
+
+    # ใช้ .all() ทุกครั้ง เพื่อไม่ให้ผลลัพธ์ถูก cache ไว้ใน QuerySet เดิม
+    return [
+        (
+            "approval inbox",
+            inbox.order_by("request__request_datetime"),
+            lambda: list(inbox.order_by("request__request_datetime")),
+        ),
+        ("inbox badge count", inbox, lambda: inbox.all().count()),
+        ("request list (pending)", my_pending, lambda: list(my_pending.all())),
+        ("dashboard count (approved)", my_approved, lambda: my_approved.all().count()),
+        ("security: ready to leave", ready_to_leave, lambda: list(ready_to_leave.all())),
+        ("security: already out", already_out, lambda: list(already_out.all())),
+        ("security: visitors inside", visitors_inside, lambda: list(visitors_inside.all())),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "สร้างข้อมูลจำลองปริมาณมาก แล้วแสดง EXPLAIN และเวลาที่ใช้ของ hot query "
+        "(ใช้ --compare เพื่อเทียบก่อน/หลังมี index) ห้ามรันบนฐานข้อมูลจริง"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="จำนวนคำขอ (LeaveRequest) จำลองที่จะสร้างเพิ่ม",
+        )
+        parser.add_argument(
+            "--employees", type=int, default=500, help="จำนวนพนักงานจำลอง (ใช้คู่กับ --seed)"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="จำนวนครั้งที่รันแต่ละ query เพื่อจับเวลา"
+        )
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="ลบ index ชั่วคราวเพื่อวัดผล 'ก่อน' แล้วสร้างกลับคืนเพื่อวัดผล 'หลัง'",
+        )
+        parser.add_argument(
+            "--cleanup", action="store_true", help="ลบข้อมูลจำลองทั้งหมดเมื่อทำงานเสร็จ"
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(options["seed"], max(options["employees"], 10))
+
+        bench_employees = Employee.objects.filter(
+            department__department_name=BENCH_DEPARTMENT
+        )
+        employee = bench_employees.filter(role__role_name__iexact="employee").first()
+        approver = bench_employees.filter(role__role_name__iexact="manager").first()
+        if not employee or not approver:
+            self.stderr.write("ไม่พบข้อมูลจำลอง กรุณารันพร้อม --seed ก่อน")
+            return
+
+        today = timezone.localdate()
+        self.stdout.write(
+            f"Database: {connection.vendor}, "
+            f"LeaveRequest rows: {LeaveRequest.objects.count()}, "
+            f"ApprovalHistory rows: {ApprovalHistory.objects.count()}"
+        )
+
+        try:
+            if options["compare"]:
+                self._drop_indexes()
+                self.stdout.write(self.style.WARNING("\n===== BEFORE (without indexes) ====="))
+                self.run_queries(approver, employee, today, options["repeat"])
+                self._create_indexes()
+                self.stdout.write(self.style.SUCCESS("\n===== AFTER (with indexes) ====="))
+            self.run_queries(approver, employee, today, options["repeat"])
+        finally:
+            if options["cleanup"]:
+                self.cleanup()
+
+    # --------------------------------------------------------------------------
+    # วัดผล
+    # --------------------------------------------------------------------------
+    def run_queries(self, approver, employee, today, repeat):
+        for name, queryset, runner in _hot_queries(approver, employee, today):
+            timings = []
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                runner()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"\n--- {name}: median {statistics.median(timings):.2f} ms, "
+                    f"best {min(timings):.2f} ms ---"
+                )
+            )
+            self.stdout.write(queryset.explain())
+
+    def _drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def _create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+
+    # --------------------------------------------------------------------------
+    # สร้าง/ลบข้อมูลจำลอง
+    # --------------------------------------------------------------------------
+    def seed(self, request_count, employee_count):
+        rng = random.Random(2025)
+        now = timezone.now()
+        today = timezone.localdate()
+
+        department, _ = Department.objects.get_or_create(department_name=BENCH_DEPARTMENT)
+        position, _ = Position.objects.get_or_create(
+            position_name=BENCH_DEPARTMENT, defaults={"position_level": 3}
+        )
+        roles = {
+            name: Role.objects.filter(role_name__iexact=name).first()
+            or Role.objects.create(role_name=name)
+            for name in ["employee", "manager", "supervisor", "security"]
+        }
+
+        # --- พนักงาน (ผู้อนุมัติ ~5%, รปภ. ~2%) ---
+        run_id = User.objects.filter(username__startswith=BENCH_USERNAME_PREFIX).count()
+        unusable_password = make_password(None)
+        users = [
+            User(
+                username=f"{BENCH_USERNAME_PREFIX}{run_id + i}",
+                password=unusable_password,
+            )
+            for i in range(employee_count)
+        ]
+        User.objects.bulk_create(users, batch_size=1000)
+        users = User.objects.filter(
+            username__in=[u.username for u in users]
+        ).order_by("id")
+
+        def role_for(i):
+            if i % 20 == 0:
+                return roles["manager"]
+            if i % 20 == 1:
+                return roles["supervisor"]
+            if i % 50 == 2:
+                return roles["security"]
+            return roles["employee"]
+
+        Employee.objects.bulk_create(
+            [
+                Employee(
+                    user=user,
+                    name=f"Benchmark {user.username}",
+                    department=department,
+                    position=position,
+                    role=role_for(i),
+                    must_change_password=False,
+                )
+                for i, user in enumerate(users)
+            ],
+            batch_size=1000,
+        )
+        # bulk_create ไม่ผ่าน Employee.save() จึงต้องคำนวณคีย์ค้นหาเอง
+        refresh_employee_search_keys(Employee.objects.filter(user__in=users))
+        employees = list(
+            Employee.objects.filter(user__in=users).select_related("role")
+        )
+        staff = [e for e in employees if e.role.role_name.lower() == "employee"]
+        approvers = [
+            e for e in employees if e.role.role_name.lower() in ("manager", "supervisor")
+        ]
+        guards = [e for e in employees if e.role.role_name.lower() == "security"] or approvers
+
+        # --- คำขอ (กระจายย้อนหลัง 2 ปี, ส่วนใหญ่อนุมัติแล้ว) ---
+        statuses = ["Approved"] * 80 + ["Rejected"] * 10 + ["Pending"] * 8 + ["Info Requested"] * 2
+        durations = [choice[0] for choice in LeaveRequest.DURATION_CHOICES]
+        requests = []
+        for _ in range(request_count):
+            days_ago = rng.randint(0, 730)
+            requests.append(
+                LeaveRequest(
+                    employee=rng.choice(staff),
+                    reason="benchmark",
+                    status=rng.choice(statuses),
+                    leave_date=today - timedelta(days=days_ago),
+                    leave_duration=rng.choice(durations),
+                    request_datetime=now - timedelta(days=days_ago, minutes=rng.randint(0, 1440)),
+                    current_approver_role="manager",
+                )
+            )
+        LeaveRequest.objects.bulk_create(requests, batch_size=1000)
+        created = list(
+            LeaveRequest.objects.filter(employee__department=department)
+            .order_by("-request_id")
+            .values_list("request_id", "status", "leave_date", "employee_id")[:request_count]
+        )
+
+        # --- ประวัติการอนุมัติ + ประวัติเข้า-ออก ---
+        histories = []
+        in_outs = []
+        tz = timezone.get_current_timezone()
+        for request_id, status, leave_date, employee_id in created:
+            steps = 3 if status == "Approved" else rng.randint(1, 3)
+            for order in range(1, steps + 1):
+                last = order == steps
+                histories.append(
+                    ApprovalHistory(
+                        request_id=request_id,
+                        approver=rng.choice(approvers),
+                        approval_order=order,
+                        status=(
+                            "Pending"
+                            if last and status in ("Pending", "Info Requested")
+                            else "Rejected" if last and status == "Rejected" else "Approved"
+                        ),
+                    )
+                )
+            if status == "Approved" and rng.random() < 0.7:
+                time_out = datetime.combine(leave_date, dt_time(9, 0), tzinfo=tz)
+                is_out = leave_date == today and rng.random() < 0.5
+                in_outs.append(
+                    InOutHistory(
+                        request_id=request_id,
+                        employee_id=employee_id,
+                        guard=rng.choice(guards),
+                        time_out=time_out,
+                        time_in=None if is_out else time_out + timedelta(hours=3),
+                        status="OUT" if is_out else "COMPLETED",
+                    )
+                )
+        ApprovalHistory.objects.bulk_create(histories, batch_size=1000)
+        InOutHistory.objects.bulk_create(in_outs, batch_size=1000)
+
+        # --- บุคคลภายนอก (~1 ต่อ 5 คำขอ, ส่วนใหญ่ออกไปแล้ว) ---
+        visitors = []
+        for _ in range(max(request_count // 5, 1)):
+            time_in = now - timedelta(minutes=rng.randint(0, 730 * 1440))
+            inside = rng.random() < 0.02
+            visitors.append(
+                VisitorLog(
+                    visitor_name=f"{BENCH_DEPARTMENT} visitor",
+                    contact_person=BENCH_DEPARTMENT,
+                    time_in=time_in,
+                    time_out=None if inside else time_in + timedelta(hours=1),
+                    status="IN" if inside else "OUT",
+                    guard=rng.choice(guards),
+                )
+            )
+        VisitorLog.objects.bulk_create(visitors, batch_size=1000)
+        # bulk_create ไม่ผ่าน signal จึงต้องสร้างตารางสรุปสถิติใหม่
+        rebuild_leave_request_rollups()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(employees)} employees, {len(created)} requests, "
+                f"{len(histories)} approval histories, {len(in_outs)} in/out records, "
+                f"{len(visitors)} visitors"
+            )
+        )
+
+    def cleanup(self):
+        # ลบ User -> Employee, คำขอ และประวัติทั้งหมดจะถูกลบตาม (CASCADE)
+        VisitorLog.objects.filter(contact_person=BENCH_DEPARTMENT).delete()
+        User.objects.filter(username__startswith=BENCH_USERNAME_PREFIX).delete()
+        Department.objects.filter(department_name=BENCH_DEPARTMENT).delete()
+        Position.objects.filter(position_name=BENCH_DEPARTMENT).delete()
+        self.stdout.write(self.style.SUCCESS("Benchmark data removed"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app.models import InOutHistory, LeaveRequest
+from app.storage import import_legacy_files, prune_blobs
+from app.uploads import prune_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "ย้ายไฟล์แนบแบบเดิม (attachments/, return_images/) เข้าที่เก็บแบบไม่ซ้ำ (blobs/) "
+        "ลบไฟล์ที่ไม่มีการอ้างอิงแล้ว และการอัปโหลดทีละส่วนที่ค้างไว้ (ควรตั้งเวลารันวันละครั้ง)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune-only",
+            action="store_true",
+            help="ลบไฟล์ที่ไม่มีการอ้างอิงอย่างเดียว ไม่ย้ายไฟล์แบบเดิม",
+        )
+
+    def handle(self, *args, **options):
+        if not options["prune_only"]:
+            moved = import_legacy_files(LeaveRequest, "attachment")
+            moved += import_legacy_files(InOutHistory, "return_image")
+            self.stdout.write(f"Moved {moved} file(s) into blobs/")
+        removed = prune_blobs()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} unreferenced file(s)"))
+        stale = prune_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Removed {stale} stale chunked upload(s)"))
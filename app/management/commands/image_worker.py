@@ -0,0 +1,90 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.images import claim_image_jobs, mark_image_failed, process_return_image
+
+
+class Command(BaseCommand):
+    help = "ประมวลผลภาพถ่ายการกลับเข้าที่รออยู่ (ตัด EXIF, ย่อขนาด, สร้าง WebP) ด้วย process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=getattr(settings, "IMAGE_WORKER_PROCESSES", 2),
+            help="จำนวน process ที่ประมวลผลภาพพร้อมกัน",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "IMAGE_WORKER_POLL_INTERVAL", 2.0),
+            help="จำนวนวินาทีที่รอเมื่อไม่มีงานค้าง",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="ประมวลผลภาพที่ค้างอยู่ทั้งหมดแล้วจบการทำงาน",
+        )
+
+    def handle(self, *args, **options):
+        processes = max(options["processes"], 1)
+        self.stdout.write(f"Image worker started ({processes} processes)")
+
+        pool = self._new_pool(processes)
+        broken = False
+        running = {}
+        try:
+            while True:
+                close_old_connections()
+
+                # ส่งงานเกินจำนวน process เล็กน้อย ให้ process ไม่ว่างระหว่างรอรอบถัดไป (ภาพแต่ละภาพใช้เวลาสั้น)
+                free = 0 if broken else processes * 2 - len(running)
+                for history_id in claim_image_jobs(free):
+                    running[pool.submit(process_return_image, history_id)] = history_id
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(
+                    running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    history_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool:
+                        # process ลูกตายกลางคัน (เช่น ภาพใหญ่ผิดปกติจนหน่วยความจำไม่พอ) pool เดิมใช้ต่อไม่ได้
+                        mark_image_failed(history_id)
+                        status = "Failed"
+                        broken = True
+                    except Exception:
+                        mark_image_failed(history_id)
+                        status = "Failed"
+                    self.stdout.write(f"Return image {history_id}: {status}")
+
+                if broken and not running:
+                    pool.shutdown(wait=False)
+                    pool = self._new_pool(processes)
+                    broken = False
+        except KeyboardInterrupt:
+            self.stdout.write("Image worker stopped")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _new_pool(self, processes):
+        # ใช้ spawn และ django.setup เหมือน report_worker (process ลูกไม่ใช้ connection ร่วมกับ process หลัก)
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
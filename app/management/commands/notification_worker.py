@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from app.notifications import due_notification_batches, process_notification_batch
+
+
+def _process_in_thread(outbox_ids):
+    """รันใน thread ของ pool: แต่ละ thread มี connection ฐานข้อมูลของตัวเอง"""
+    try:
+        return process_notification_batch(outbox_ids)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "ส่งแจ้งเตือน Email/LINE ที่ค้างอยู่ใน Notification Outbox (ทำงานต่อเนื่อง)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=getattr(settings, "NOTIFICATION_WORKER_THREADS", 4),
+            help="จำนวน thread ที่ใช้ส่งพร้อมกัน",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "NOTIFICATION_WORKER_BATCH_SIZE", 50),
+            help="จำนวนงานที่ดึงมาต่อรอบ",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "NOTIFICATION_WORKER_POLL_INTERVAL", 2.0),
+            help="จำนวนวินาทีที่รอเมื่อไม่มีงานค้าง",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="ส่งงานที่ค้างอยู่หนึ่งรอบแล้วจบการทำงาน",
+        )
+
+    def handle(self, *args, **options):
+        threads = max(options["threads"], 1)
+        batch_size = max(options["batch_size"], 1)
+        self.stdout.write(f"Notification worker started ({threads} threads)")
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    batches = due_notification_batches(batch_size)
+                    fetched = sum(len(batch) for batch in batches)
+                    if batches:
+                        results = [
+                            status
+                            for statuses in pool.map(_process_in_thread, batches)
+                            for status in statuses
+                        ]
+                        self.stdout.write(
+                            f"Processed {len(results)} notification(s): "
+                            f"sent={results.count('Sent')}, "
+                            f"retry={results.count('Pending')}, "
+                            f"dead={results.count('Dead')}"
+                        )
+                    if options["once"]:
+                        break
+                    if fetched < batch_size:
+                        time.sleep(options["poll_interval"])
+            except KeyboardInterrupt:
+                self.stdout.write("Notification worker stopped")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.rollups import rebuild_leave_request_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "คำนวณตารางสรุปสถิติคำขอรายวัน (LeaveRequestDailyStat) ใหม่ทั้งหมดจาก LeaveRequest "
+        "(ใช้หลังนำเข้า/แก้ไขข้อมูลโดยตรงในฐานข้อมูล หรือเมื่อสงสัยว่าตัวเลขไม่ตรง)"
+    )
+
+    def handle(self, *args, **options):
+        rows = rebuild_leave_request_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} statistics row(s)"))
@@ -0,0 +1,100 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.report_jobs import (
+    claim_report_jobs,
+    mark_report_job_failed,
+    prune_expired_report_jobs,
+    run_report_job,
+)
+
+
+class Command(BaseCommand):
+    help = "สร้างไฟล์รายงานที่อยู่ในคิว (ReportJob) ด้วย process pool (ทำงานต่อเนื่อง)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=getattr(settings, "REPORT_WORKER_PROCESSES", 2),
+            help="จำนวน process ที่สร้างรายงานพร้อมกัน",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "REPORT_WORKER_POLL_INTERVAL", 2.0),
+            help="จำนวนวินาทีที่รอเมื่อไม่มีงานค้าง",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="สร้างรายงานที่ค้างอยู่ทั้งหมดแล้วจบการทำงาน",
+        )
+
+    def handle(self, *args, **options):
+        processes = max(options["processes"], 1)
+        self.stdout.write(f"Report worker started ({processes} processes)")
+
+        pool = self._new_pool(processes)
+        broken = False
+        running = {}
+        try:
+            while True:
+                close_old_connections()
+                pruned = prune_expired_report_jobs()
+                if pruned:
+                    self.stdout.write(f"Removed {pruned} expired report(s)")
+
+                free = 0 if broken else processes - len(running)
+                for job_id in claim_report_jobs(free):
+                    running[pool.submit(run_report_job, job_id)] = job_id
+                    self.stdout.write(f"Report job {job_id} started")
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait(
+                    running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool as e:
+                        # process ลูกตายกลางคัน (เช่น หน่วยความจำไม่พอ) pool เดิมใช้ต่อไม่ได้
+                        mark_report_job_failed(job_id, e)
+                        status = "Failed"
+                        broken = True
+                    except Exception as e:
+                        mark_report_job_failed(job_id, e)
+                        status = "Failed"
+                    self.stdout.write(f"Report job {job_id}: {status}")
+
+                if broken and not running:
+                    pool.shutdown(wait=False)
+                    pool = self._new_pool(processes)
+                    broken = False
+        except KeyboardInterrupt:
+            self.stdout.write("Report worker stopped")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _new_pool(self, processes):
+        # ใช้ spawn เพื่อไม่ให้ process ลูกใช้ connection ฐานข้อมูลร่วมกับ process หลัก
+        # process ใหม่ต้องเรียก django.setup() ก่อนใช้ ORM (initializer ต้องอยู่ใน module
+        # ที่ import ได้โดยไม่ต้องโหลด model ก่อน จึงใช้ django.setup โดยตรง)
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
@@ -1,12 +1,23 @@
-import json
-import os
-from django.conf import settings  # ⬅️ (เพิ่ม)
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 from .models import Employee
+from .principal import load_principal
+from .site_config import get_site_config
 
-CONFIG_FILE_PATH = os.path.join(settings.BASE_DIR, "site_config.json")
+
+class PrincipalMiddleware:
+    """
+    โหลดข้อมูลพนักงาน + สิทธิ์ของผู้ใช้ครั้งเดียวต่อ request แล้วแนบไว้ที่ request.principal
+    (ต้องอยู่หลัง AuthenticationMiddleware และก่อน middleware/view ที่ใช้ request.user.employee)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = load_principal(request.user)
+        return self.get_response(request)
 
 
 class ForcePasswordChangeMiddleware:
@@ -14,13 +25,10 @@ class ForcePasswordChangeMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        try:
-            with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
-                config = json.load(f)
-            # .get(..., True) หมายความว่า ถ้ายังไม่มีคีย์นี้ในไฟล์ ให้ถือว่า "เปิดใช้งาน" (True) เป็นค่าเริ่มต้น
-            is_feature_enabled = config.get("force_password_change_enabled", True)
-        except (FileNotFoundError, json.JSONDecodeError):
-            is_feature_enabled = True  # ถ้าไฟล์ config เจ๊ง ให้เปิดใช้งานไว้ก่อน (ปลอดภัย)
+        # อ่านจาก cache ที่ใช้ร่วมกัน (ไม่เปิดไฟล์ทุก request)
+        # .get(..., True) หมายความว่า ถ้ายังไม่มีคีย์นี้ ให้ถือว่า "เปิดใช้งาน" (True) เป็นค่าเริ่มต้น
+        config = get_site_config()
+        is_feature_enabled = config.get("force_password_change_enabled", True)
 
         # 2. ถ้าฟีเจอร์นี้ถูก "ปิด" ให้ออกจาก middleware นี้ไปเลย
         if not is_feature_enabled:
@@ -41,10 +49,10 @@ class ForcePasswordChangeMiddleware:
             force_change_url = reverse("app:force-change-password")
             logout_url = reverse("app:logout")
 
+            # (ไฟล์ใน /files/ ต้องผ่านการตรวจสิทธิ์ของ view จึงไม่ยกเว้นเหมือน /media/ เดิม)
             if (
                 request.path.startswith(force_change_url)
                 or request.path.startswith(logout_url)
-                or request.path.startswith("/media/")
             ):
 
                 return self.get_response(request)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_siteconfiguration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('outbox_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('line', 'LINE')], max_length=10)),
+                ('subject', models.CharField(blank=True, default='', max_length=255)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('Pending', 'รอส่ง'), ('Sending', 'กำลังส่ง'), ('Sent', 'ส่งแล้ว'), ('Dead', 'ส่งไม่สำเร็จ (เลิกลองใหม่)')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='app.employee')),
+                ('request', models.ForeignKey(blank=True, db_column='request_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='app.leaverequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvalhistory',
+            index=models.Index(fields=['approver', 'status'], name='apphist_approver_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inouthistory',
+            index=models.Index(fields=['status', 'request'], name='inout_status_request_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['employee', 'status', 'request_datetime'], name='leavereq_emp_status_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['leave_date', 'status'], name='leavereq_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['status', 'time_in'], name='visitor_status_time_in_idx'),
+        ),
+    ]
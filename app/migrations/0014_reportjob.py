@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_liveevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('job_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('dataset', models.CharField(max_length=50)),
+                ('file_format', models.CharField(max_length=10)),
+                ('filters', models.JSONField(default=dict)),
+                ('filter_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('Pending', 'รอคิว'), ('Running', 'กำลังสร้าง'), ('Done', 'พร้อมดาวน์โหลด'), ('Failed', 'ไม่สำเร็จ')], default='Pending', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to='app.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['filter_hash', 'status'], name='reportjob_hash_status_idx'), models.Index(fields=['status', 'updated_at'], name='reportjob_status_upd_idx')],
+            },
+        ),
+    ]
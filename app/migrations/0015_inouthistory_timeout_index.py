@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inouthistory',
+            index=models.Index(fields=['time_out', 'history_id'], name='inout_timeout_id_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+from app.search import (
+    install_employee_search_index,
+    normalize_search_text,
+    uninstall_employee_search_index,
+)
+
+
+def fill_search_key(apps, schema_editor):
+    Employee = apps.get_model("app", "Employee")
+    employees = list(
+        Employee.objects.select_related("user", "department", "position")
+    )
+    for employee in employees:
+        employee.search_key = normalize_search_text(
+            " ".join(
+                [
+                    employee.name or "",
+                    employee.user.username,
+                    employee.department.department_name or "",
+                    employee.position.position_name or "",
+                ]
+            )
+        )
+    Employee.objects.bulk_update(employees, ["search_key"], batch_size=500)
+
+
+def install_index(apps, schema_editor):
+    install_employee_search_index(schema_editor.connection)
+
+
+def uninstall_index(apps, schema_editor):
+    uninstall_employee_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_inouthistory_timeout_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='search_key',
+            field=models.CharField(default='', editable=False, max_length=1000),
+        ),
+        migrations.RunPython(fill_search_key, migrations.RunPython.noop),
+        migrations.RunPython(install_index, uninstall_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    LeaveRequest = apps.get_model("app", "LeaveRequest")
+    LeaveRequestDailyStat = apps.get_model("app", "LeaveRequestDailyStat")
+    rows = (
+        LeaveRequest.objects.annotate(
+            day=TruncDate("request_datetime", tzinfo=timezone.get_current_timezone())
+        )
+        .values("day", "employee__department_id", "status", "leave_duration")
+        .annotate(total=Count("*"))
+        .order_by()
+    )
+    LeaveRequestDailyStat.objects.bulk_create(
+        [
+            LeaveRequestDailyStat(
+                day=row["day"],
+                department_id=row["employee__department_id"],
+                status=row["status"],
+                leave_duration=row["leave_duration"],
+                count=row["total"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_employee_search_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveRequestDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('leave_duration', models.CharField(max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(db_column='department_id', on_delete=django.db.models.deletion.CASCADE, to='app.department')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'department', 'status', 'leave_duration'), name='leavestat_day_dept_status_dur_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# ลำดับเดิมของระบบ (ตรงกับ DEFAULT_WORKFLOW_STEPS ใน app/workflow.py)
+DEFAULT_STEPS = [
+    (1, "manager", "ผู้จัดการ", "manager", "department"),
+    (2, "supervisor", "Supervisor", "supervisor", "department"),
+    (3, "hr_safety", "HR/Safety", "hr,safety", "all"),
+]
+
+
+def create_default_workflow(apps, schema_editor):
+    ApprovalWorkflow = apps.get_model("app", "ApprovalWorkflow")
+    ApprovalWorkflowStep = apps.get_model("app", "ApprovalWorkflowStep")
+    workflow = ApprovalWorkflow.objects.create(name="ค่าเริ่มต้น (ทุกแผนก)")
+    ApprovalWorkflowStep.objects.bulk_create(
+        [
+            ApprovalWorkflowStep(
+                workflow=workflow,
+                step_order=order,
+                stage=stage,
+                label=label,
+                roles=roles,
+                scope=scope,
+            )
+            for order, stage, label, roles, scope in DEFAULT_STEPS
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_leaverequestdailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalWorkflow',
+            fields=[
+                ('workflow_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('leave_duration', models.CharField(blank=True, choices=[('3 ชั่วโมง', '3 ชั่วโมง'), ('ครึ่งวัน', 'ครึ่งวัน'), ('เต็มวัน', 'เต็มวัน')], default='', max_length=10, verbose_name='ระยะเวลา (ว่าง = ทุกระยะเวลา)')),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, db_column='department_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='app.department', verbose_name='แผนก (ว่าง = ทุกแผนก)')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ApprovalWorkflowStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step_order', models.PositiveSmallIntegerField()),
+                ('stage', models.CharField(max_length=20)),
+                ('label', models.CharField(max_length=50, verbose_name='ชื่อที่แสดง (เช่น HR/Safety)')),
+                ('roles', models.CharField(max_length=100)),
+                ('scope', models.CharField(choices=[('department', 'ผู้มีบทบาทนี้ในแผนกเดียวกับผู้ขอ'), ('all', 'ผู้มีบทบาทนี้ทั้งหมด (คนใดคนหนึ่งอนุมัติ)')], default='department', max_length=10)),
+                ('workflow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='app.approvalworkflow')),
+            ],
+            options={
+                'ordering': ['workflow', 'step_order'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='approvalworkflow',
+            constraint=models.UniqueConstraint(fields=('department', 'leave_duration'), name='workflow_dept_duration_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='approvalworkflowstep',
+            constraint=models.UniqueConstraint(fields=('workflow', 'step_order'), name='workflowstep_order_uniq'),
+        ),
+        migrations.RunPython(create_default_workflow, migrations.RunPython.noop),
+    ]
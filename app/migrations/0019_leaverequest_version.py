@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_approval_workflow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaverequest',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:52
+
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_leaverequest_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inouthistory',
+            name='return_image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.get_dedup_storage, upload_to='return_images/', verbose_name='ภาพถ่ายการกลับเข้า'),
+        ),
+        migrations.AlterField(
+            model_name='leaverequest',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=app.storage.get_dedup_storage, upload_to='attachments/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('blob_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='blob_refcount_updated_idx')],
+            },
+        ),
+    ]
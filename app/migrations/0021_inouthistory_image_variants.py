@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:54
+
+import app.storage
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def queue_existing_images(apps, schema_editor):
+    # ภาพที่อัปโหลดไว้ก่อนหน้านี้ ให้ image_worker สร้างภาพย่อด้วย
+    InOutHistory = apps.get_model("app", "InOutHistory")
+    InOutHistory.objects.exclude(return_image__isnull=True).exclude(return_image="").update(
+        image_status="Pending", image_updated_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inouthistory',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('', '-'), ('Pending', 'Pending'), ('Processing', 'Processing'), ('Done', 'Done'), ('Failed', 'Failed')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='inouthistory',
+            name='image_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inouthistory',
+            name='return_image_display',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=app.storage.get_dedup_storage, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='inouthistory',
+            name='return_image_thumb',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=app.storage.get_dedup_storage, upload_to=''),
+        ),
+        migrations.AddIndex(
+            model_name='inouthistory',
+            index=models.Index(fields=['image_status', 'image_updated_at'], name='inout_image_status_idx'),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
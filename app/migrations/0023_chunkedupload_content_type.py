@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
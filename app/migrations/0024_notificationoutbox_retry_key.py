@@ -0,0 +1,31 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_retry_keys(apps, schema_editor):
+    # default ของ AddField ถูกคำนวณครั้งเดียว ทุกแถวเดิมจะได้ค่าเดียวกัน จึงต้องสุ่มใหม่ทีละแถว
+    NotificationOutbox = apps.get_model("app", "NotificationOutbox")
+    for outbox_id in NotificationOutbox.objects.values_list("outbox_id", flat=True).iterator():
+        NotificationOutbox.objects.filter(outbox_id=outbox_id).update(retry_key=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_chunkedupload_content_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='retry_key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_retry_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='retry_key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    ApprovalWorkflowVersion = apps.get_model("app", "ApprovalWorkflowVersion")
+    if not ApprovalWorkflowVersion.objects.exists():
+        ApprovalWorkflowVersion.objects.create()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_notificationoutbox_retry_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalWorkflowVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
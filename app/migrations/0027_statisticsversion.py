@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+def create_version_rows(apps, schema_editor):
+    StatisticsVersion = apps.get_model("app", "StatisticsVersion")
+    for scope in ("leave", "visitor"):
+        StatisticsVersion.objects.get_or_create(scope=scope)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_chunkedupload_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=20, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version_rows, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .search import employee_search_key
+from .storage import get_dedup_storage
+
 # ==============================================================================
 # 1. Core Models: Department, Position, Role
 # ==============================================================================
@@ -71,6 +76,16 @@ class Employee(models.Model):
         verbose_name="ผู้รับมอบอำนาจแทน",
     )
 
+    # ชื่อ, username, แผนก, ตำแหน่ง ที่ normalize แล้ว สำหรับค้นหา (ดู app/search.py)
+    search_key = models.CharField(max_length=1000, default="", editable=False)
+
+    def save(self, *args, **kwargs):
+        self.search_key = employee_search_key(self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "search_key"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -103,7 +118,22 @@ class LeaveRequest(models.Model):
     current_approver_role = models.CharField(max_length=20, default="manager")
 
     info_request_comment = models.TextField(null=True, blank=True)
-    attachment = models.FileField(upload_to="attachments/", null=True, blank=True)
+    attachment = models.FileField(
+        upload_to="attachments/", storage=get_dedup_storage, null=True, blank=True
+    )
+    # เพิ่มขึ้นทุกครั้งที่มีการตัดสิน/เปลี่ยนสถานะคำขอ (compare-and-swap ดู workflow.claim_request)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # รายการคำขอของพนักงาน + ตัวเลขบน Dashboard
+            models.Index(
+                fields=["employee", "status", "request_datetime"],
+                name="leavereq_emp_status_dt_idx",
+            ),
+            # Security Dashboard: คำขอที่อนุมัติแล้วของวันนี้
+            models.Index(fields=["leave_date", "status"], name="leavereq_date_status_idx"),
+        ]
 
     def __str__(self):
         return f"Request ID: {self.request_id} by {self.employee.name}"
@@ -128,6 +158,9 @@ class LeaveRequest(models.Model):
 
     @property
     def ordered_approval_history(self):
+        # ถ้า view ได้ prefetch ไว้แล้ว (เช่น กล่องงานอนุมัติ) ให้ใช้ข้อมูลนั้น ไม่ต้อง query ซ้ำ
+        if hasattr(self, "prefetched_approval_history"):
+            return self.prefetched_approval_history
         return self.approvalhistory_set.order_by("approval_order", "approval_date")
 
 
@@ -150,6 +183,12 @@ class ApprovalHistory(models.Model):
     approval_time = models.TimeField(null=True, blank=True)
     comment = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # กล่องงานอนุมัติ + ตัวเลข badge บน Navbar
+            models.Index(fields=["approver", "status"], name="apphist_approver_status_idx"),
+        ]
+
     def __str__(self):
         return f"History for Request ID: {self.request.request_id}"
 
@@ -186,12 +225,42 @@ class InOutHistory(models.Model):
     # --- START: บรรทัดที่เพิ่มเข้ามา ---
     return_image = models.ImageField(
         upload_to="return_images/",
+        storage=get_dedup_storage,
         null=True,
         blank=True,
         verbose_name="ภาพถ่ายการกลับเข้า",
     )
     # --- END: บรรทัดที่เพิ่มเข้ามา ---
 
+    # ภาพที่ย่อแล้ว (WebP, ไม่มี EXIF) สร้างโดย image_worker หลังอัปโหลด (ดู app/images.py)
+    IMAGE_STATUS_CHOICES = [
+        ("", "-"),
+        ("Pending", "Pending"),
+        ("Processing", "Processing"),
+        ("Done", "Done"),
+        ("Failed", "Failed"),
+    ]
+    return_image_display = models.ImageField(
+        storage=get_dedup_storage, null=True, blank=True, editable=False
+    )
+    return_image_thumb = models.ImageField(
+        storage=get_dedup_storage, null=True, blank=True, editable=False
+    )
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default=""
+    )
+    image_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Security Dashboard: รายการที่ยังอยู่ข้างนอก
+            models.Index(fields=["status", "request"], name="inout_status_request_idx"),
+            # รายงานการเข้า-ออก: กรองช่วงเวลาและแบ่งหน้าแบบ keyset ตาม (time_out, history_id)
+            models.Index(fields=["time_out", "history_id"], name="inout_timeout_id_idx"),
+            # image_worker: ภาพที่รอประมวลผล
+            models.Index(fields=["image_status", "image_updated_at"], name="inout_image_status_idx"),
+        ]
+
     def __str__(self):
         return f"InOut for {self.employee.name} on request {self.request.request_id}"
 
@@ -225,5 +294,349 @@ class VisitorLog(models.Model):
         limit_choices_to={"role__role_name__iexact": "security"},
     )
 
+    class Meta:
+        indexes = [
+            # Security Dashboard: บุคคลภายนอกที่ยังอยู่ในพื้นที่
+            models.Index(fields=["status", "time_in"], name="visitor_status_time_in_idx"),
+        ]
+
     def __str__(self):
         return f"Visitor: {self.visitor_name} (Contact: {self.contact_person})"
+
+
+# ==============================================================================
+# 6. Site Configuration Model (ค่าตั้งค่าเว็บไซต์ที่ใช้ร่วมกันทุกเครื่อง)
+# ==============================================================================
+
+
+class SiteConfiguration(models.Model):
+    """
+    เก็บค่าตั้งค่าเว็บไซต์ (แทนไฟล์ site_config.json) ไว้ในฐานข้อมูลแถวเดียว
+    - version จะเพิ่มขึ้นทุกครั้งที่บันทึก เพื่อให้ cache ของแต่ละ worker รู้ว่าต้องโหลดใหม่
+    """
+
+    config_id = models.AutoField(primary_key=True)
+    data = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Site Configuration (version {self.version})"
+
+
+# ==============================================================================
+# 7. Notification Outbox Model (คิวแจ้งเตือน Email/LINE สำหรับส่งเบื้องหลัง)
+# ==============================================================================
+
+
+class NotificationOutbox(models.Model):
+    """
+    แจ้งเตือนที่รอส่ง ถูกบันทึกใน transaction เดียวกับการเปลี่ยนสถานะคำขอ
+    แล้วถูกส่งจริงโดยคำสั่ง `python manage.py notification_worker`
+    """
+
+    CHANNEL_CHOICES = [("email", "Email"), ("line", "LINE")]
+    STATUS_CHOICES = [
+        ("Pending", "รอส่ง"),
+        ("Sending", "กำลังส่ง"),
+        ("Sent", "ส่งแล้ว"),
+        ("Dead", "ส่งไม่สำเร็จ (เลิกลองใหม่)"),
+    ]
+
+    outbox_id = models.BigAutoField(primary_key=True)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.ForeignKey(
+        Employee, on_delete=models.CASCADE, related_name="notifications"
+    )
+    request = models.ForeignKey(
+        LeaveRequest,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column="request_id",
+    )
+    subject = models.CharField(max_length=255, blank=True, default="")
+    message = models.TextField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    # X-Line-Retry-Key: ใช้ค่าเดิมทุกครั้งที่ลองส่งใหม่ LINE จึงไม่ส่งซ้ำถ้าครั้งก่อนสำเร็จไปแล้ว
+    retry_key = models.UUIDField(default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="outbox_status_due_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient.name} ({self.status})"
+
+
+# ==============================================================================
+# 8. Live Event Model (ตัวกลางส่ง event แบบ real-time ระหว่างหลายเครื่อง)
+# ==============================================================================
+
+
+class LiveEvent(models.Model):
+    """
+    event ที่ใช้กับ LIVE_EVENTS_BROKER = DatabaseBroker เท่านั้น
+    ทุกเครื่องจะอ่าน event ใหม่จากตารางนี้ แล้วส่งต่อให้ผู้ฟัง (SSE) ในเครื่องตัวเอง
+    รายการเก่าจะถูกลบอัตโนมัติตาม LIVE_EVENTS_RETENTION_SECONDS
+    """
+
+    event_id = models.BigAutoField(primary_key=True)
+    channel = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=50)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.event_type} -> {self.channel}"
+
+
+# ==============================================================================
+# 9. Report Job Model (สร้างไฟล์รายงานขนาดใหญ่เบื้องหลัง)
+# ==============================================================================
+
+
+class ReportJob(models.Model):
+    """
+    งานสร้างไฟล์รายงาน ทำโดยคำสั่ง `python manage.py report_worker`
+    ไฟล์ผลลัพธ์เก็บใน MEDIA_ROOT/reports/ และถูกใช้ซ้ำ (ตาม filter_hash) จนถึง expires_at
+    """
+
+    STATUS_CHOICES = [
+        ("Pending", "รอคิว"),
+        ("Running", "กำลังสร้าง"),
+        ("Done", "พร้อมดาวน์โหลด"),
+        ("Failed", "ไม่สำเร็จ"),
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    dataset = models.CharField(max_length=50)
+    file_format = models.CharField(max_length=10)
+    filters = models.JSONField(default=dict)
+    # hash ของ (dataset, file_format, filters) ใช้ค้นหางานเดิมที่ยังใช้ได้
+    filter_hash = models.CharField(max_length=64)
+    requested_by = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="report_jobs",
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
+    progress = models.PositiveSmallIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    file = models.FileField(upload_to="reports/", null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["filter_hash", "status"], name="reportjob_hash_status_idx"),
+            models.Index(fields=["status", "updated_at"], name="reportjob_status_upd_idx"),
+        ]
+
+    def __str__(self):
+        return f"Report {self.dataset}.{self.file_format} ({self.status})"
+
+
+# ==============================================================================
+# 10. Statistics Rollup Model (สรุปจำนวนคำขอรายวัน สำหรับหน้าสถิติ)
+# ==============================================================================
+
+
+class LeaveRequestDailyStat(models.Model):
+    """
+    จำนวนคำขอต่อ (วันที่ยื่นคำขอตามเวลาท้องถิ่น, แผนก, สถานะ, ระยะเวลา)
+    ถูกปรับทีละคำขอเมื่อมีการสร้าง/เปลี่ยนสถานะ/ลบ (ดู app/rollups.py)
+    สร้างใหม่ทั้งหมดได้ด้วย `python manage.py rebuild_statistics`
+    """
+
+    day = models.DateField()
+    department = models.ForeignKey(
+        Department, on_delete=models.CASCADE, db_column="department_id"
+    )
+    status = models.CharField(max_length=20)
+    leave_duration = models.CharField(max_length=10)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "department", "status", "leave_duration"],
+                name="leavestat_day_dept_status_dur_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.department_id} {self.status} {self.leave_duration}: {self.count}"
+
+
+class StatisticsVersion(models.Model):
+    """
+    version ของข้อมูลกราฟหน้าสถิติแยกตาม scope ("leave", "visitor") เพิ่มขึ้นเมื่อข้อมูลต้นทางเปลี่ยน
+    key ของ cache ข้อมูลกราฟมี version นี้อยู่ด้วย ทุก worker/ทุกเครื่องจึงเลิกใช้ข้อมูลเก่าพร้อมกัน
+    (ดู app/statistics_charts.py)
+    """
+
+    scope = models.CharField(max_length=20, unique=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} (version {self.version})"
+
+
+# ==============================================================================
+# 11. Approval Workflow Models (ลำดับขั้นการอนุมัติ แยกตามแผนก/ระยะเวลา)
+# ==============================================================================
+
+
+class ApprovalWorkflow(models.Model):
+    """
+    ลำดับขั้นการอนุมัติ เลือกใช้ตามแผนกและระยะเวลาของคำขอ (ดู app/workflow.py)
+    ลำดับการเลือก: (แผนก, ระยะเวลา) -> (แผนก, ทุกระยะเวลา) -> (ทุกแผนก, ระยะเวลา) -> (ทุกแผนก, ทุกระยะเวลา)
+    """
+
+    workflow_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column="department_id",
+        verbose_name="แผนก (ว่าง = ทุกแผนก)",
+    )
+    leave_duration = models.CharField(
+        max_length=10,
+        choices=LeaveRequest.DURATION_CHOICES,
+        blank=True,
+        default="",
+        verbose_name="ระยะเวลา (ว่าง = ทุกระยะเวลา)",
+    )
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["department", "leave_duration"], name="workflow_dept_duration_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ApprovalWorkflowStep(models.Model):
+    SCOPE_CHOICES = [
+        ("department", "ผู้มีบทบาทนี้ในแผนกเดียวกับผู้ขอ"),
+        ("all", "ผู้มีบทบาทนี้ทั้งหมด (คนใดคนหนึ่งอนุมัติ)"),
+    ]
+
+    workflow = models.ForeignKey(
+        ApprovalWorkflow, on_delete=models.CASCADE, related_name="steps"
+    )
+    step_order = models.PositiveSmallIntegerField()
+    # ค่าที่บันทึกใน LeaveRequest.current_approver_role ระหว่างรอขั้นนี้ (เช่น manager, hr_safety)
+    stage = models.CharField(max_length=20)
+    label = models.CharField(max_length=50, verbose_name="ชื่อที่แสดง (เช่น HR/Safety)")
+    # ชื่อ Role ของผู้อนุมัติ คั่นด้วยจุลภาค (เช่น "hr,safety")
+    roles = models.CharField(max_length=100)
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default="department")
+
+    class Meta:
+        ordering = ["workflow", "step_order"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workflow", "step_order"], name="workflowstep_order_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.workflow} #{self.step_order}: {self.label}"
+
+
+class ApprovalWorkflowVersion(models.Model):
+    """
+    version ของ workflow และข้อมูลผู้อนุมัติ (มีแถวเดียว) เพิ่มขึ้นทุกครั้งที่ข้อมูลเหล่านี้เปลี่ยน
+    ทุก worker/ทุกเครื่องเทียบกับค่านี้เพื่อรู้ว่าต้องโหลด workflow ใหม่ (ดู app/workflow.py)
+    """
+
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Approval workflow (version {self.version})"
+
+
+# ==============================================================================
+# 12. Stored Blob (ไฟล์แนบที่เก็บตามเนื้อหา + จำนวนการอ้างอิง ดู app/storage.py)
+# ==============================================================================
+
+
+class StoredBlob(models.Model):
+    blob_id = models.AutoField(primary_key=True)
+    # ชื่อไฟล์ใน storage: blobs/ab/cd/<sha256><นามสกุล>
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    # จำนวนแถว (LeaveRequest.attachment, InOutHistory.return_image) ที่อ้างอิงไฟล์นี้
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # dedupe_media: ไฟล์ที่ไม่มีการอ้างอิงและพ้นระยะเวลารอแล้ว
+            models.Index(fields=["ref_count", "updated_at"], name="blob_refcount_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+# ==============================================================================
+# 13. Chunked Upload (อัปโหลดไฟล์แนบทีละส่วน ต่อจากจุดเดิมได้ หรือตรงไปที่ object storage ดู app/uploads.py)
+# ==============================================================================
+
+
+class ChunkedUpload(models.Model):
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chunked_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # (object storage) Content-Type ที่ลงชื่อไว้ใน presigned URL
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    # (object storage) SHA-256 ของทั้งไฟล์ที่ browser คำนวณมา: ใช้ตั้งชื่อ object ใน blobs/
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    # จำนวน byte ที่ได้รับและตรวจ checksum แล้ว (chunk ถัดไปต้องเริ่มที่ตำแหน่งนี้)
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # dedupe_media: ลบการอัปโหลดที่ค้างไว้นานแล้ว
+            models.Index(fields=["updated_at"], name="chunkedupload_updated_idx"),
+        ]
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,211 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NotificationOutbox
+from .email_sender import EmailBatch
+from .line_client import get_line_client, recipient_chunks
+from .utils import line_target_id
+
+# ==============================================================================
+# 1. ฝั่ง View: บันทึกแจ้งเตือนลง Outbox (ไม่ต่อ SMTP/LINE ระหว่าง request)
+# ==============================================================================
+
+
+def queue_notification_email(subject, message_body, recipient, request_obj):
+    """
+    บันทึกอีเมลแจ้งเตือนลงคิว (ใช้ argument เดียวกับ send_notification_email)
+    ควรเรียกภายใน transaction เดียวกับการเปลี่ยนสถานะคำขอ
+    """
+    if not recipient:
+        return None
+    return NotificationOutbox.objects.create(
+        channel="email",
+        recipient=recipient,
+        request=request_obj,
+        subject=subject,
+        message=message_body,
+    )
+
+
+def queue_notification_line(message, recipient, request_obj=None):
+    """บันทึกข้อความ LINE ลงคิว (ใช้ argument เดียวกับ send_notification_line)"""
+    if not recipient:
+        return None
+    return NotificationOutbox.objects.create(
+        channel="line",
+        recipient=recipient,
+        request=request_obj,
+        message=message,
+    )
+
+
+# ==============================================================================
+# 2. ฝั่ง Worker: ดึงงานที่ถึงเวลา, ส่งจริง, ลองใหม่แบบ backoff
+# ==============================================================================
+
+
+def _max_attempts():
+    return getattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 5)
+
+
+def _backoff(attempts):
+    """ระยะเวลารอก่อนลองส่งใหม่: base * 2^(attempts-1) แต่ไม่เกิน max"""
+    base = getattr(settings, "NOTIFICATION_RETRY_BASE_SECONDS", 30)
+    cap = getattr(settings, "NOTIFICATION_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * (2 ** max(attempts - 1, 0)), cap))
+
+
+def _lease():
+    """ถ้า worker ค้าง/ตายระหว่างส่ง งานที่อยู่ในสถานะ Sending เกินเวลานี้จะถูกดึงไปส่งใหม่"""
+    return timedelta(seconds=getattr(settings, "NOTIFICATION_LEASE_SECONDS", 300))
+
+
+def due_notification_batches(limit):
+    """
+    ดึงงานที่ถึงเวลาส่ง (รวมงาน Sending ที่หมดเวลา lease แล้ว) แล้วจัดเป็นกลุ่ม
+    - LINE ที่ข้อความเหมือนกันทุกตัวอักษร จะอยู่กลุ่มเดียวกัน (ส่งด้วย multicast ครั้งเดียว)
+    - Email ทั้งหมดในรอบนี้อยู่กลุ่มเดียวกัน (ส่งผ่าน SMTP connection เดียว)
+    คืนค่าเป็น list ของ list ของ outbox_id
+    """
+    now = timezone.now()
+    rows = (
+        NotificationOutbox.objects.filter(
+            Q(status="Pending") | Q(status="Sending"), next_attempt_at__lte=now
+        )
+        .order_by("next_attempt_at")
+        .values_list("outbox_id", "channel", "message")[:limit]
+    )
+    batches = {}
+    for outbox_id, channel, message in rows:
+        key = ("line", message) if channel == "line" else (channel,)
+        batches.setdefault(key, []).append(outbox_id)
+    return list(batches.values())
+
+
+def claim_notifications(outbox_ids):
+    """
+    จองงานทีละรายการด้วย UPDATE แบบมีเงื่อนไข (compare-and-swap)
+    รายการที่ worker อื่นจองไปก่อนแล้วจะไม่ถูกคืนมา
+    """
+    now = timezone.now()
+    claimed_ids = [
+        outbox_id
+        for outbox_id in outbox_ids
+        if NotificationOutbox.objects.filter(
+            Q(status="Pending") | Q(status="Sending"),
+            outbox_id=outbox_id,
+            next_attempt_at__lte=now,
+        ).update(status="Sending", next_attempt_at=now + _lease())
+    ]
+    return list(
+        NotificationOutbox.objects.select_related(
+            "recipient__user", "request__employee"
+        )
+        .filter(outbox_id__in=claimed_ids)
+        .order_by("outbox_id")
+    )
+
+
+def deliver_notifications(outboxes):
+    """
+    ส่งแจ้งเตือนหนึ่งกลุ่ม
+    คืนค่า list ของ Error ตามลำดับของ outboxes (None = ส่งสำเร็จ)
+    """
+    channel = outboxes[0].channel
+    if channel == "email":
+        # ทุกฉบับในกลุ่มใช้ SMTP connection เดียวกัน
+        batch = EmailBatch(fail_silently=True)
+        for outbox in outboxes:
+            batch.add(outbox.subject, outbox.message, outbox.recipient, outbox.request)
+        return batch.flush()
+
+    if channel == "line":
+        return _deliver_line(outboxes)
+
+    error = ValueError(f"Unknown notification channel: {channel}")
+    return [error] * len(outboxes)
+
+
+def _chunk_retry_key(outboxes):
+    """
+    X-Line-Retry-Key ของการเรียก API หนึ่งครั้ง: retry_key ของแถวเอง (ผู้รับคนเดียว)
+    หรือ UUID ที่คำนวณจาก retry_key ของทุกแถวในชุด (ส่งชุดเดิมซ้ำจะได้ key เดิม)
+    """
+    keys = sorted(str(outbox.retry_key) for outbox in outboxes)
+    if len(keys) == 1:
+        return keys[0]
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, ",".join(keys)))
+
+
+def _deliver_line(outboxes):
+    """
+    ทุกรายการในกลุ่มมีข้อความเดียวกัน -> multicast ชุดละไม่เกิน 500 คน
+    บันทึกผลแยกตามชุด: ชุดที่ล้มเหลวเท่านั้นที่ถูกส่งใหม่ (ชุดที่สำเร็จแล้วไม่ได้รับข้อความซ้ำ)
+    """
+    errors = [None] * len(outboxes)
+    rows_by_target = {}  # LINE user id -> index ของ outbox (ผู้รับหลายคนอาจใช้ ID เดียวกันในโหมด DEBUG)
+    for i, outbox in enumerate(outboxes):
+        target = line_target_id(outbox.recipient)
+        if target:
+            rows_by_target.setdefault(target, []).append(i)
+
+    message = outboxes[0].message
+    for chunk in recipient_chunks(list(rows_by_target)):
+        indexes = [i for target in chunk for i in rows_by_target[target]]
+        try:
+            get_line_client().send_chunk(
+                chunk, message, _chunk_retry_key([outboxes[i] for i in indexes])
+            )
+            print(f"Line sent to: {len(chunk)} recipient(s)")
+        except Exception as e:
+            print(f"Error sending Line message: {e}")
+            for i in indexes:
+                errors[i] = e
+    return errors
+
+
+def _mark_failed(outbox, error):
+    attempts = outbox.attempts + 1
+    if attempts >= _max_attempts():
+        status = "Dead"
+        next_attempt_at = timezone.now()
+    else:
+        status = "Pending"
+        next_attempt_at = timezone.now() + _backoff(attempts)
+    NotificationOutbox.objects.filter(outbox_id=outbox.outbox_id).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+        last_error=str(error),
+    )
+    return status
+
+
+def process_notification_batch(outbox_ids):
+    """
+    จอง -> ส่ง -> บันทึกผล สำหรับงานหนึ่งกลุ่ม
+    คืนค่า list ของสถานะสุดท้าย ("Sent", "Pending" = รอลองใหม่, "Dead")
+    """
+    outboxes = claim_notifications(outbox_ids)
+    if not outboxes:
+        return []
+
+    errors = deliver_notifications(outboxes)
+
+    statuses = []
+    for outbox, error in zip(outboxes, errors):
+        if error is not None:
+            statuses.append(_mark_failed(outbox, error))
+            continue
+        NotificationOutbox.objects.filter(outbox_id=outbox.outbox_id).update(
+            status="Sent",
+            attempts=outbox.attempts + 1,
+            sent_at=timezone.now(),
+            last_error=None,
+        )
+        statuses.append("Sent")
+    return statuses
@@ -0,0 +1,375 @@
+import base64
+import hashlib
+import hmac
+import mimetypes
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlencode, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .storage import blob_name
+
+# ==============================================================================
+# ที่เก็บไฟล์แนบบน object storage แบบ S3 (AWS S3, MinIO, Ceph ฯลฯ)
+# ==============================================================================
+# ใช้เมื่อรันหลายเครื่อง: ไฟล์ที่อัปโหลดผ่านเครื่อง A ต้องเปิดได้จากเครื่อง B
+# ตั้งค่า ATTACHMENT_STORAGE = 'app.object_storage.DedupObjectStorage'
+# - ไฟล์ที่ server บันทึกเอง (ภาพย่อ, ไฟล์ที่ย้ายโดย dedupe_media) ตั้งชื่อตาม SHA-256 แบบเดียวกับ
+#   DedupFileSystemStorage (blobs/ab/cd/<sha256><นามสกุล>) และไม่อัปโหลดซ้ำถ้ามี object อยู่แล้ว
+# - browser อัปโหลดไฟล์แนบ/ภาพถ่ายตรงไปที่ bucket ด้วย presigned URL แล้วส่งเฉพาะ upload_id มากับฟอร์ม
+#   (ดู uploads.py) browser คำนวณ SHA-256 ของไฟล์มาก่อน URL จึงชี้ไปที่ชื่อใน blobs/ ได้เลย
+#   และลงชื่อ header x-amz-checksum-sha256 ไว้ (object storage ปฏิเสธข้อมูลที่ไม่ตรงกับ hash)
+#   ข้อมูลไฟล์ไม่ผ่าน app server เลย
+# - การเปิดไฟล์ให้ผู้ใช้ redirect ไปยัง presigned URL อายุสั้นหลังตรวจสิทธิ์แล้ว (ดู protected_media.py)
+# OBJECT_STORAGE_CLIENT เลือกตัวเชื่อมต่อ: S3Client (ใช้งานจริง) หรือ InMemoryObjectClient
+# (เก็บในหน่วยความจำของ process สำหรับทดสอบ/พัฒนาโดยไม่ต้องมี MinIO)
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# SHA-256 ของเนื้อหา (base64) ที่ object storage ตรวจตอนรับไฟล์
+CHECKSUM_HEADER = "x-amz-checksum-sha256"
+_SPOOL_SIZE = 5 * 1024 * 1024
+
+
+def _setting(name, default=None):
+    return getattr(settings, f"OBJECT_STORAGE_{name}", default)
+
+
+# ==============================================================================
+# 1. AWS Signature Version 4
+# ==============================================================================
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _uri_encode(value, safe="-_.~"):
+    return quote(value, safe=safe)
+
+
+def sign_v4(
+    method, host, path, query, headers, payload_hash, access_key, secret_key, region, now
+):
+    """
+    คืนค่า (signature, credential scope, signed headers) ตาม AWS SigV4 (service = s3)
+    query และ headers เป็น dict, header "host" ถูกรวมให้เอง
+    """
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    datestamp = now.strftime("%Y%m%d")
+    scope = f"{datestamp}/{region}/s3/aws4_request"
+
+    all_headers = {"host": host, **{k.lower(): str(v).strip() for k, v in headers.items()}}
+    signed_headers = ";".join(sorted(all_headers))
+    canonical_request = "\n".join(
+        [
+            method,
+            _uri_encode(path, safe="/-_.~"),
+            "&".join(
+                f"{_uri_encode(k)}={_uri_encode(str(v))}" for k, v in sorted(query.items())
+            ),
+            "".join(f"{k}:{all_headers[k]}\n" for k in sorted(all_headers)),
+            signed_headers,
+            payload_hash,
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ]
+    )
+    signing_key = _hmac(("AWS4" + secret_key).encode("utf-8"), datestamp)
+    for part in (region, "s3", "aws4_request"):
+        signing_key = _hmac(signing_key, part)
+    signature = hmac.new(
+        signing_key, string_to_sign.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return signature, scope, signed_headers
+
+
+# ==============================================================================
+# 2. ตัวเชื่อมต่อ (client)
+# ==============================================================================
+# ทุก client มีเมธอดเดียวกัน:
+#   head_object(key) -> {"size", "last_modified"} หรือ None
+#   get_object(key) -> iterator ของ bytes (ไม่พบ: FileNotFoundError)
+#   put_object(key, fileobj, size, content_type, sha256)
+#   delete_object(key)
+#   presigned_url(method, key, expires, headers=None) -> URL ที่ browser ใช้ได้โดยตรง
+
+
+class S3Client:
+    """เชื่อมต่อ S3 API ด้วย requests (ไม่ต้องติดตั้ง boto3)"""
+
+    def __init__(self):
+        self.endpoint = urlsplit(_setting("ENDPOINT_URL", "https://s3.amazonaws.com"))
+        self.bucket = _setting("BUCKET")
+        self.region = _setting("REGION", "us-east-1")
+        self.access_key = _setting("ACCESS_KEY")
+        self.secret_key = _setting("SECRET_KEY")
+        # 'path' = https://host/bucket/key (MinIO), 'virtual' = https://bucket.host/key
+        self.virtual_host = _setting("ADDRESSING_STYLE", "path") == "virtual"
+        self.timeout = (
+            getattr(settings, "OBJECT_STORAGE_CONNECT_TIMEOUT", 3.05),
+            getattr(settings, "OBJECT_STORAGE_READ_TIMEOUT", 30),
+        )
+        self.session = requests.Session()
+
+    def _location(self, key):
+        if self.virtual_host:
+            return f"{self.bucket}.{self.endpoint.netloc}", f"/{key}"
+        return self.endpoint.netloc, f"/{self.bucket}/{key}"
+
+    def _url(self, host, path, query=""):
+        url = f"{self.endpoint.scheme}://{host}{_uri_encode(path, safe='/-_.~')}"
+        return f"{url}?{query}" if query else url
+
+    def _request(self, method, key, headers=None, payload_hash=UNSIGNED_PAYLOAD, **kwargs):
+        host, path = self._location(key)
+        now = datetime.now(dt_timezone.utc)
+        headers = {
+            **(headers or {}),
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "x-amz-content-sha256": payload_hash,
+        }
+        signature, scope, signed_headers = sign_v4(
+            method, host, path, {}, headers, payload_hash,
+            self.access_key, self.secret_key, self.region, now,
+        )
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return self.session.request(
+            method, self._url(host, path), headers=headers, timeout=self.timeout, **kwargs
+        )
+
+    def head_object(self, key):
+        response = self._request("HEAD", key)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return {
+            "size": int(response.headers["Content-Length"]),
+            "last_modified": parsedate_to_datetime(response.headers["Last-Modified"]),
+        }
+
+    def get_object(self, key):
+        response = self._request("GET", key, stream=True)
+        if response.status_code == 404:
+            response.close()
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        with response:
+            yield from response.iter_content(64 * 1024)
+
+    def put_object(self, key, fileobj, size, content_type, sha256=UNSIGNED_PAYLOAD):
+        headers = {"Content-Type": content_type, "Content-Length": str(size)}
+        # sha256 ของเนื้อหาถูกคำนวณไว้แล้วตอนตั้งชื่อ (S3 ตรวจความถูกต้องของข้อมูลให้)
+        self._request(
+            "PUT", key, headers=headers, payload_hash=sha256, data=fileobj
+        ).raise_for_status()
+
+    def delete_object(self, key):
+        response = self._request("DELETE", key)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def presigned_url(self, method, key, expires, headers=None):
+        """URL ที่ลงชื่อไว้ใน query string (header ใน headers ต้องถูกส่งมาตรงกันทุกตัว)"""
+        host, path = self._location(key)
+        now = datetime.now(dt_timezone.utc)
+        signed = {k.lower(): v for k, v in (headers or {}).items()}
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{now:%Y%m%d}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "X-Amz-Expires": str(int(expires)),
+            "X-Amz-SignedHeaders": ";".join(sorted(["host", *signed])),
+        }
+        signature, _, _ = sign_v4(
+            method, host, path, query, signed, UNSIGNED_PAYLOAD,
+            self.access_key, self.secret_key, self.region, now,
+        )
+        query["X-Amz-Signature"] = signature
+        return self._url(host, path, urlencode(query, quote_via=quote, safe="-_.~"))
+
+
+class InMemoryObjectClient:
+    """
+    object storage จำลองในหน่วยความจำ (ข้อมูลหายเมื่อปิด process, ใช้ได้เฉพาะ process เดียว เช่น runserver)
+    presigned URL ชี้ไปที่ view object_store_fake ของ app นี้ ลงชื่อด้วย SECRET_KEY
+    """
+
+    _objects = {}
+    _lock = threading.Lock()
+
+    def head_object(self, key):
+        with self._lock:
+            item = self._objects.get(key)
+        return None if item is None else {"size": len(item[0]), "last_modified": item[2]}
+
+    def get_object(self, key):
+        with self._lock:
+            item = self._objects.get(key)
+        if item is None:
+            raise FileNotFoundError(key)
+        yield item[0]
+
+    def put_object(self, key, fileobj, size, content_type, sha256=UNSIGNED_PAYLOAD):
+        data = fileobj if isinstance(fileobj, bytes) else fileobj.read()
+        with self._lock:
+            self._objects[key] = (data, content_type, timezone.now())
+
+    def delete_object(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+    def content_type(self, key):
+        with self._lock:
+            return self._objects[key][1]
+
+    def presigned_url(self, method, key, expires, headers=None):
+        expires_at = int(timezone.now().timestamp()) + int(expires)
+        headers = headers or {}
+        length = headers.get("Content-Length", "")
+        checksum = headers.get(CHECKSUM_HEADER, "")
+        signature = self.signature(method, key, expires_at, length, checksum)
+        query = urlencode(
+            {
+                "expires": expires_at,
+                "length": length,
+                "checksum": checksum,
+                "signature": signature,
+            }
+        )
+        return f"{reverse('app:object-store-fake', args=[key])}?{query}"
+
+    @staticmethod
+    def signature(method, key, expires_at, length, checksum=""):
+        return Signer(salt="app.object_storage.fake").signature(
+            f"{method}:{key}:{expires_at}:{length}:{checksum}"
+        )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_object_client():
+    """คืนค่า client ตาม OBJECT_STORAGE_CLIENT (หนึ่งตัวต่อ process)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = import_string(
+                    _setting("CLIENT", "app.object_storage.S3Client")
+                )()
+    return _client
+
+
+# ==============================================================================
+# 3. Django Storage
+# ==============================================================================
+
+
+class DedupObjectStorage(Storage):
+    """
+    Storage บน object storage ที่ตั้งชื่อ object ตาม SHA-256 (เหมือน DedupFileSystemStorage)
+    เปิดไฟล์โดยดาวน์โหลดลงไฟล์ชั่วคราว (ภาพ/ไฟล์แนบมีขนาดไม่ใหญ่)
+    """
+
+    # browser อัปโหลดตรงไปที่ bucket ได้ (ดู uploads.direct_upload_enabled)
+    supports_direct_upload = True
+
+    @property
+    def client(self):
+        return get_object_client()
+
+    def get_available_name(self, name, max_length=None):
+        # ชื่อจริงถูกกำหนดจากเนื้อหาใน _save ไม่ต้องหาชื่อที่ว่าง
+        return name
+
+    def _open(self, name, mode="rb"):
+        tmp = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+        for chunk in self.client.get_object(name):
+            tmp.write(chunk)
+        tmp.seek(0)
+        return File(tmp, name)
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, "temporary_file_path"):
+            # ไฟล์บนดิสก์อยู่แล้ว: อ่านเพื่อ hash แล้วอัปโหลดจากไฟล์นั้นโดยตรง
+            source = open(content.temporary_file_path(), "rb")
+            for chunk in iter(lambda: source.read(64 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        else:
+            source = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+            for chunk in content.chunks():
+                digest.update(chunk)
+                source.write(chunk)
+                size += len(chunk)
+        with source:
+            name = blob_name(digest.hexdigest(), name)
+            if self.client.head_object(name) is not None:
+                # มี object เดียวกันแล้ว: เลื่อนเวลาของแถวไว้ ไม่ให้ dedupe_media ลบระหว่างที่ยังไม่ commit
+                # (แทนการแตะเวลาแก้ไขไฟล์ของ DedupFileSystemStorage)
+                from .models import StoredBlob
+
+                StoredBlob.objects.filter(name=name).update(updated_at=timezone.now())
+            else:
+                source.seek(0)
+                content_type = (
+                    getattr(content, "content_type", None) or _guess_type(name)
+                )
+                self.client.put_object(name, source, size, content_type, digest.hexdigest())
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(name)
+
+    def exists(self, name):
+        return self.client.head_object(name) is not None
+
+    def size(self, name):
+        head = self.client.head_object(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["size"]
+
+    def get_modified_time(self, name):
+        head = self.client.head_object(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["last_modified"]
+
+    def url(self, name):
+        """presigned URL อายุสั้นสำหรับดาวน์โหลด (ตรวจสิทธิ์ก่อนสร้างเสมอ)"""
+        return self.client.presigned_url(
+            "GET", name, _setting("PRESIGN_SECONDS", 300)
+        )
+
+
+def checksum_header_value(sha256):
+    """ค่า header x-amz-checksum-sha256 (base64 ของ digest) จาก SHA-256 แบบ hex"""
+    return base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+
+
+def _guess_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+
+from .models import ApprovalHistory, Employee
+
+APPROVER_ROLES = ["manager", "supervisor", "hr", "safety"]
+HR_ADMIN_ROLES = ["hr", "admin", "safety"]
+
+
+class Principal:
+    """
+    ข้อมูลผู้ใช้ปัจจุบันที่โหลดครั้งเดียวต่อ request (แนบไว้ที่ request.principal)
+    - employee ถูกโหลดพร้อม role, department, position ใน query เดียว
+    - สิทธิ์ต่างๆ คำนวณจาก role ที่โหลดมาแล้ว (ไม่ query ซ้ำ)
+    - approval_inbox_count จะ query เมื่อถูกใช้ครั้งแรกเท่านั้น แล้วจำค่าไว้
+    """
+
+    def __init__(self, user, employee=None):
+        self.user = user
+        self.employee = employee
+        self.role_name = employee.role.role_name.lower() if employee else ""
+
+    @property
+    def is_hr_or_admin(self):
+        if self.employee is None:
+            return self.user.is_superuser
+        return self.role_name in HR_ADMIN_ROLES
+
+    @property
+    def is_security(self):
+        return self.role_name == "security"
+
+    @property
+    def is_approver(self):
+        return self.role_name in APPROVER_ROLES
+
+    @property
+    def is_approver_or_admin(self):
+        return self.is_approver or self.is_hr_or_admin
+
+    @cached_property
+    def approval_inbox_count(self):
+        if self.employee is None:
+            return 0
+        return ApprovalHistory.objects.filter(
+            approver=self.employee, status="Pending"
+        ).count()
+
+
+def load_principal(user):
+    """
+    โหลด Principal ของผู้ใช้ และเก็บ employee ไว้ใน cache ของ user.employee
+    เพื่อให้โค้ดเดิมที่เรียก request.user.employee / employee.role ไม่ต้อง query ซ้ำ
+    """
+    if not user.is_authenticated:
+        return Principal(user)
+
+    employee = (
+        Employee.objects.select_related("role", "department", "position")
+        .filter(user_id=user.pk)
+        .first()
+    )
+    # (ถ้าไม่มีโปรไฟล์ จะเก็บ None ไว้ ทำให้ hasattr(user, "employee") เป็น False โดยไม่ query)
+    User.employee.related.set_cached_value(user, employee)
+    return Principal(user, employee)
@@ -0,0 +1,91 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+
+from .models import ApprovalHistory
+from .storage import is_blob, is_local_storage
+
+# ==============================================================================
+# ส่งไฟล์ media ที่ต้องตรวจสิทธิ์ก่อน (ไฟล์แนบ, ภาพถ่ายการกลับเข้า, ไฟล์รายงาน)
+# ==============================================================================
+# View ตรวจสิทธิ์แล้วให้ web server ส่งไฟล์เอง (Python ไม่ต้องอ่าน/ส่งข้อมูลไฟล์) ตาม MEDIA_SERVE_BACKEND
+# - "nginx"    : X-Accel-Redirect: MEDIA_ACCEL_REDIRECT_PREFIX + ชื่อไฟล์
+#                (nginx ต้องมี location แบบ internal ที่ alias ไปยัง MEDIA_ROOT ดู README)
+# - "sendfile" : X-Sendfile: path เต็มของไฟล์ (Apache mod_xsendfile / lighttpd)
+# - "django"   : FileResponse (ค่าเริ่มต้น สำหรับ runserver หรือไม่มี web server ด้านหน้า)
+# ไฟล์บน object storage (ATTACHMENT_STORAGE) redirect ไปยัง presigned URL แทนเสมอ
+# URL เป็นของแต่ละแถว (เช่น files/request/<id>/attachment/) ไฟล์เบื้องหลังเปลี่ยนได้
+# (แนบไฟล์ใหม่, ภาพย่อสร้างเสร็จ) จึงให้ browser ตรวจซ้ำทุกครั้ง (no-cache) ด้วย ETag = hash ของไฟล์ใน blobs/
+# ไฟล์เดิม = 304 ไม่ต้องส่งข้อมูลซ้ำ
+
+
+def can_view_attachment(principal, leave_request):
+    """เจ้าของคำขอ, ผู้อนุมัติที่ได้รับคำขอนี้ (รวมผู้รับมอบอำนาจแทน), HR/Admin"""
+    if principal.is_hr_or_admin:
+        return True
+    employee = principal.employee
+    if employee is None:
+        return False
+    if leave_request.employee_id == employee.pk:
+        return True
+    return ApprovalHistory.objects.filter(request=leave_request, approver=employee).exists()
+
+
+def can_view_return_image(principal, history):
+    """รปภ., HR/Admin และพนักงานเจ้าของรายการ"""
+    if principal.is_hr_or_admin or principal.is_security:
+        return True
+    return principal.employee is not None and history.employee_id == principal.employee.pk
+
+
+def _etag(name):
+    """ETag ของไฟล์ใน blobs/ (ชื่อไฟล์คือ SHA-256 ของเนื้อหา) หรือ None"""
+    if not is_blob(name):
+        return None
+    return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+
+
+def serve_media(request, fieldfile, as_attachment=False, filename=None):
+    """Response สำหรับไฟล์ใน FileField (สิทธิ์ต้องถูกตรวจก่อนเรียกฟังก์ชันนี้)"""
+    if not fieldfile:
+        raise Http404("ไม่พบไฟล์")
+    if not is_local_storage(fieldfile.storage):
+        # object storage: redirect ไปยัง presigned URL อายุสั้น (ข้อมูลไฟล์ไม่ผ่าน app server)
+        response = HttpResponseRedirect(fieldfile.url)
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+    etag = _etag(fieldfile.name)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        # browser มีไฟล์นี้อยู่แล้ว (304)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    content_type = (
+        mimetypes.guess_type(filename or fieldfile.name)[0] or "application/octet-stream"
+    )
+    backend = getattr(settings, "MEDIA_SERVE_BACKEND", "django")
+    if backend == "nginx":
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix + quote(fieldfile.name)
+    elif backend == "sendfile":
+        response = HttpResponse(content_type=content_type)
+        # header ต้องเป็น ASCII: mod_xsendfile ถอดรหัส %XX ให้เอง (XSendFileUnescape เปิดเป็นค่าเริ่มต้น)
+        response["X-Sendfile"] = quote(fieldfile.path)
+    else:
+        try:
+            response = FileResponse(fieldfile.open("rb"), content_type=content_type)
+        except FileNotFoundError:
+            raise Http404("ไม่พบไฟล์")
+
+    if as_attachment or filename:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    if etag:
+        response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .exports import (
+    CSV_DATASETS,
+    IN_OUT_HISTORY_HEADERS,
+    dataset_queryset,
+    dataset_rows,
+    filter_in_out_history,
+    gzip_stream,
+    in_out_history_rows,
+    stream_csv,
+    write_xlsx,
+)
+from .models import InOutHistory, ReportJob
+
+# รูปแบบไฟล์ที่รองรับ: xlsx (เฉพาะรายงานการเข้า-ออก), csv และ csv.gz (ทุกชุดข้อมูลใน CSV_DATASETS)
+REPORT_FORMATS = ["xlsx", "csv", "csv.gz"]
+
+# อัปเดตเปอร์เซ็นต์ความคืบหน้าทุกๆ กี่แถว
+PROGRESS_EVERY_ROWS = 2000
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, "REPORT_JOB_TTL_SECONDS", 3600))
+
+
+def _lease():
+    """งาน Running ที่ไม่มีความคืบหน้านานกว่านี้ (worker ตาย) จะถูกดึงไปทำใหม่"""
+    return timedelta(seconds=getattr(settings, "REPORT_JOB_LEASE_SECONDS", 600))
+
+
+def is_valid_report(dataset, file_format):
+    if file_format == "xlsx":
+        return dataset == "in-out-history"
+    return file_format in REPORT_FORMATS and dataset in CSV_DATASETS
+
+
+def filters_hash(dataset, file_format, filters):
+    key = json.dumps([dataset, file_format, filters], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+# ==============================================================================
+# 1. ฝั่ง View: ขอสร้างรายงาน (ใช้ไฟล์เดิมถ้ามีงานเดียวกันที่ยังไม่หมดอายุ)
+# ==============================================================================
+
+
+def request_report_job(dataset, file_format, filters, requested_by=None):
+    """
+    คืนค่า (job, created)
+    ถ้ามีงานที่ตัวกรองเหมือนกันทุกค่า ซึ่งยังรอคิว/กำลังสร้าง หรือสร้างเสร็จแล้วและยังไม่หมดอายุ จะคืนงานนั้นแทน
+    """
+    key = filters_hash(dataset, file_format, filters)
+    job = (
+        ReportJob.objects.filter(filter_hash=key)
+        .filter(
+            Q(status__in=["Pending", "Running"])
+            | Q(status="Done", expires_at__gt=timezone.now())
+        )
+        .order_by("-created_at")
+        .first()
+    )
+    if job is not None:
+        return job, False
+
+    job = ReportJob.objects.create(
+        dataset=dataset,
+        file_format=file_format,
+        filters=filters,
+        filter_hash=key,
+        requested_by=requested_by,
+    )
+    return job, True
+
+
+# ==============================================================================
+# 2. ฝั่ง Worker
+# ==============================================================================
+
+
+def claim_report_jobs(limit):
+    """จองงานที่รอคิว (รวมงาน Running ที่ค้างเกิน lease) ด้วย UPDATE แบบมีเงื่อนไข"""
+    now = timezone.now()
+    due = Q(status="Pending") | Q(status="Running", updated_at__lt=now - _lease())
+    candidate_ids = list(
+        ReportJob.objects.filter(due)
+        .order_by("created_at")
+        .values_list("job_id", flat=True)[:limit]
+    )
+    return [
+        job_id
+        for job_id in candidate_ids
+        if ReportJob.objects.filter(due, job_id=job_id).update(
+            status="Running", progress=0, updated_at=now
+        )
+    ]
+
+
+def _track_progress(job_id, rows, total):
+    """ส่งแถวต่อไปตามปกติ และบันทึกเปอร์เซ็นต์ความคืบหน้าเป็นระยะ (ใช้เป็น heartbeat ด้วย)"""
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % PROGRESS_EVERY_ROWS == 0:
+            ReportJob.objects.filter(job_id=job_id).update(
+                progress=min(99, done * 100 // max(total, 1)),
+                updated_at=timezone.now(),
+            )
+
+
+def _write_report(job, fileobj):
+    """เขียนไฟล์รายงานลง fileobj คืนค่าจำนวนแถว"""
+    if job.file_format == "xlsx":
+        queryset = filter_in_out_history(
+            InOutHistory.objects.all(), job.filters
+        )
+        total = queryset.count()
+        rows = _track_progress(job.job_id, in_out_history_rows(queryset), total)
+        write_xlsx(fileobj, "InOut History Report", IN_OUT_HISTORY_HEADERS, rows)
+        return total
+
+    spec = CSV_DATASETS[job.dataset]
+    queryset = dataset_queryset(spec, job.filters)
+    total = queryset.count()
+    headers, rows = dataset_rows(spec, queryset)
+    content = stream_csv(headers, _track_progress(job.job_id, rows, total))
+    if job.file_format == "csv.gz":
+        content = gzip_stream(content)
+    for chunk in content:
+        fileobj.write(chunk)
+    return total
+
+
+def run_report_job(job_id):
+    """
+    สร้างไฟล์ของงานหนึ่งงาน (รันใน process ของ pool) คืนค่าสถานะสุดท้าย
+    ไฟล์ถูกเขียนลงไฟล์ชั่วคราวก่อน แล้วจึงบันทึกเข้า storage (MEDIA_ROOT/reports/)
+    """
+    job = ReportJob.objects.get(job_id=job_id)
+    try:
+        with tempfile.TemporaryFile() as f:
+            total = _write_report(job, f)
+            f.seek(0)
+            filename = f"{job.dataset}_{job.job_id}.{job.file_format}"
+            job.file.save(filename, File(f), save=False)
+
+        now = timezone.now()
+        ReportJob.objects.filter(job_id=job_id).update(
+            status="Done",
+            progress=100,
+            total_rows=total,
+            file=job.file.name,
+            error=None,
+            updated_at=now,
+            finished_at=now,
+            expires_at=now + _ttl(),
+        )
+        return "Done"
+    except Exception as e:
+        print(f"Error generating report job {job_id}: {e}")
+        mark_report_job_failed(job_id, e)
+        return "Failed"
+    finally:
+        connection.close()
+
+
+def mark_report_job_failed(job_id, error):
+    now = timezone.now()
+    ReportJob.objects.filter(job_id=job_id).update(
+        status="Failed", error=str(error), updated_at=now, finished_at=now
+    )
+
+
+def prune_expired_report_jobs():
+    """ลบไฟล์และงานที่หมดอายุแล้ว คืนค่าจำนวนงานที่ลบ"""
+    expired = list(
+        ReportJob.objects.filter(
+            Q(status="Done", expires_at__lte=timezone.now())
+            | Q(status="Failed", finished_at__lte=timezone.now() - _ttl())
+        )
+    )
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+    return len(expired)
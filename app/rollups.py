@@ -0,0 +1,193 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .exports import keyset_values
+from .models import LeaveRequest, LeaveRequestDailyStat
+
+# ==============================================================================
+# ตารางสรุปสถิติคำขอรายวัน (LeaveRequestDailyStat)
+# ==============================================================================
+# หน้าสถิติอ่านจากตารางนี้อย่างเดียว จำนวนแถวขึ้นกับจำนวนวัน x แผนก x สถานะ x ระยะเวลา
+# ไม่ขึ้นกับจำนวนคำขอ ตารางถูกปรับทีละคำขอผ่าน signal (อยู่ใน transaction เดียวกับการบันทึกคำขอ)
+# แผนกคือแผนกปัจจุบันของพนักงาน: เมื่อย้ายแผนก คำขอทั้งหมดของพนักงานถูกย้ายไปนับในแผนกใหม่
+# (move_employee_rollups) ตรงกับผลของ rebuild_statistics
+# การแก้ไขผ่าน queryset.update()/bulk_update ไม่ส่ง signal ต้องรัน rebuild_statistics เอง
+
+
+def rollup_key(leave_request):
+    """(วันที่ยื่นคำขอ, แผนก, สถานะ, ระยะเวลา) ของคำขอ"""
+    return (
+        timezone.localdate(leave_request.request_datetime),
+        leave_request.employee.department_id,
+        leave_request.status,
+        leave_request.leave_duration,
+    )
+
+
+def stored_rollup_key(request_id):
+    """rollup_key ของคำขอตามที่บันทึกอยู่ในฐานข้อมูล (ก่อนบันทึกค่าใหม่) หรือ None ถ้ายังไม่มี"""
+    row = (
+        LeaveRequest.objects.filter(pk=request_id)
+        .values_list(
+            "request_datetime", "employee__department_id", "status", "leave_duration"
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    request_datetime, department_id, status, leave_duration = row
+    return (timezone.localdate(request_datetime), department_id, status, leave_duration)
+
+
+def _add(key, delta):
+    day, department_id, status, leave_duration = key
+    rows = LeaveRequestDailyStat.objects.filter(
+        day=day, department_id=department_id, status=status, leave_duration=leave_duration
+    )
+    if rows.update(count=F("count") + delta) or delta < 0:
+        # ลดจำนวนแต่ไม่พบแถว = แถวถูกลบไปพร้อมแผนกแล้ว (CASCADE) ไม่ต้องสร้างใหม่
+        return
+    try:
+        with transaction.atomic():
+            LeaveRequestDailyStat.objects.create(
+                day=day,
+                department_id=department_id,
+                status=status,
+                leave_duration=leave_duration,
+                count=delta,
+            )
+    except IntegrityError:
+        # อีก transaction สร้างแถวเดียวกันไปก่อนแล้ว
+        rows.update(count=F("count") + delta)
+
+
+def apply_rollup_change(old_key, new_key):
+    """ย้ายคำขอหนึ่งรายการจาก old_key ไป new_key (None = ไม่มี เช่น สร้างใหม่/ลบ)"""
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _add(old_key, -1)
+    if new_key is not None:
+        _add(new_key, 1)
+
+
+def apply_rollup_changes(changes):
+    """
+    apply_rollup_change สำหรับหลายคำขอ (ใช้คู่กับ bulk_update ซึ่งไม่ส่ง signal)
+    รวมจำนวนตาม key ก่อน จึง UPDATE หนึ่งครั้งต่อ key ไม่ใช่ต่อคำขอ คืนค่า True ถ้ามีการเปลี่ยนแปลง
+    """
+    deltas = Counter()
+    for old_key, new_key in changes:
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            deltas[old_key] -= 1
+        if new_key is not None:
+            deltas[new_key] += 1
+    # ลดก่อนเพิ่ม (เหมือน apply_rollup_change)
+    for key, delta in sorted(deltas.items(), key=lambda item: item[1]):
+        if delta:
+            _add(key, delta)
+    return any(deltas.values())
+
+
+def move_employee_rollups(employee_id, old_department_id, new_department_id):
+    """ย้ายคำขอทั้งหมดของพนักงานจากแผนกเดิมไปนับในแผนกใหม่ (เรียกเมื่อ Employee.department เปลี่ยน)"""
+    rows = LeaveRequest.objects.filter(employee_id=employee_id).values_list(
+        "request_datetime", "status", "leave_duration"
+    )
+    changes = []
+    for request_datetime, status, leave_duration in rows:
+        day = timezone.localdate(request_datetime)
+        changes.append(
+            (
+                (day, old_department_id, status, leave_duration),
+                (day, new_department_id, status, leave_duration),
+            )
+        )
+    return apply_rollup_changes(changes)
+
+
+@transaction.atomic
+def rebuild_leave_request_rollups():
+    """
+    คำนวณตารางสรุปใหม่ทั้งหมดจาก LeaveRequest คืนค่าจำนวนแถวในตารางสรุป
+    วันที่ตามเวลาท้องถิ่นคำนวณใน Python (เหมือน rollup_key) ไม่ใช้ TruncDate(tzinfo=...)
+    เพราะ MySQL แปลงด้วย CONVERT_TZ ซึ่งคืนค่า NULL ถ้า server ไม่ได้โหลดตาราง time zone ไว้
+    """
+    LeaveRequestDailyStat.objects.all().delete()
+    rows = keyset_values(
+        LeaveRequest.objects.all(),
+        ["request_datetime", "employee__department_id", "status", "leave_duration"],
+    )
+    totals = Counter(
+        (timezone.localdate(request_datetime), department_id, status, leave_duration)
+        for request_datetime, department_id, status, leave_duration in rows
+    )
+    stats = [
+        LeaveRequestDailyStat(
+            day=day,
+            department_id=department_id,
+            status=status,
+            leave_duration=leave_duration,
+            count=count,
+        )
+        for (day, department_id, status, leave_duration), count in totals.items()
+    ]
+    LeaveRequestDailyStat.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+# ==============================================================================
+# อ่านสถิติ (ใช้ใน API ของหน้าสถิติ)
+# ==============================================================================
+# filters: {"start_date": date|None, "end_date": date|None, "department_id": int|None}
+
+
+def _stats(filters=None):
+    queryset = LeaveRequestDailyStat.objects.all()
+    filters = filters or {}
+    if filters.get("start_date"):
+        queryset = queryset.filter(day__gte=filters["start_date"])
+    if filters.get("end_date"):
+        queryset = queryset.filter(day__lte=filters["end_date"])
+    if filters.get("department_id"):
+        queryset = queryset.filter(department_id=filters["department_id"])
+    return queryset
+
+
+def _totals(group_field, order_by, filters=None):
+    return list(
+        _stats(filters)
+        .values(group_field)
+        .annotate(count=Sum("count"))
+        .filter(count__gt=0)
+        .order_by(order_by)
+    )
+
+
+def status_totals(filters=None):
+    return _totals("status", "status", filters)
+
+
+def department_totals(filters=None):
+    return _totals("department__department_name", "-count", filters)
+
+
+def duration_totals(filters=None):
+    return _totals("leave_duration", "leave_duration", filters)
+
+
+def monthly_totals(filters=None):
+    return list(
+        _stats(filters)
+        .annotate(month=TruncMonth("day"))
+        .values("month")
+        .annotate(count=Sum("count"))
+        .filter(count__gt=0)
+        .order_by("month")
+    )
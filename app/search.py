@@ -0,0 +1,179 @@
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+# ==============================================================================
+# ค้นหารายชื่อพนักงานด้วยคอลัมน์ search_key (ชื่อ, username, แผนก, ตำแหน่ง รวมไว้ในคอลัมน์เดียว)
+# ==============================================================================
+# - เก็บค่าที่ normalize แล้ว ค้นหาได้โดยไม่ต้อง join และไม่ต้อง LOWER() ทุกแถว
+# - MySQL: FULLTEXT index (ngram parser ตัดคำภาษาไทยได้) ชื่อ EMPLOYEE_SEARCH_MYSQL_INDEX
+# - SQLite: ตาราง FTS5 (trigram) ชื่อ EMPLOYEE_SEARCH_SQLITE_TABLE ซิงก์ด้วย trigger
+# - ฐานข้อมูลอื่น: ค้นหาด้วย LIKE บนคอลัมน์เดียว
+# (index สร้างใน migration 0016_employee_search_key และตรวจซ้ำหลัง migrate ทุกครั้ง)
+
+EMPLOYEE_SEARCH_MYSQL_INDEX = "employee_search_key_ft"
+EMPLOYEE_SEARCH_SQLITE_TABLE = "app_employee_search"
+
+# ความยาวขั้นต่ำของคำค้นที่ใช้ index ได้ (ngram_token_size เริ่มต้นของ MySQL = 2, FTS5 trigram = 3)
+MYSQL_NGRAM_SIZE = 2
+SQLITE_TRIGRAM_SIZE = 3
+
+_THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+# อักขระที่มองไม่เห็น (เช่น zero-width space ที่มักติดมากับข้อความภาษาไทยที่คัดลอกมา)
+_INVISIBLE_CHARS = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+
+
+def normalize_search_text(value):
+    """
+    ทำให้ข้อความอยู่ในรูปแบบเดียวกันสำหรับการค้นหา
+    - NFKC: รวมรูปแบบอักขระที่ต่างกันแต่ความหมายเดียวกัน (เช่น "ำ" กับ "ํา", ตัวอักษรเต็มความกว้าง)
+      และจัดลำดับวรรณยุกต์/สระบน-ล่างให้เหมือนกัน ไม่ว่าจะพิมพ์ลำดับไหนก่อน
+    - เลขไทยเป็นเลขอารบิก, ตัดอักขระที่มองไม่เห็น, ตัวพิมพ์เล็ก (casefold)
+    - ช่องว่างหลายตัวติดกันเหลือช่องเดียว
+    """
+    value = unicodedata.normalize("NFKC", value or "")
+    value = value.translate(_THAI_DIGITS).translate(_INVISIBLE_CHARS).casefold()
+    return " ".join(value.split())
+
+
+def employee_search_key(employee):
+    """ค่าของ Employee.search_key (ถูกเรียกใน Employee.save())"""
+    parts = [
+        employee.name,
+        employee.user.username if employee.user_id else "",
+        employee.department.department_name if employee.department_id else "",
+        employee.position.position_name if employee.position_id else "",
+    ]
+    return normalize_search_text(" ".join(part or "" for part in parts))
+
+
+def refresh_employee_search_keys(queryset, batch_size=500):
+    """คำนวณ search_key ใหม่ (เช่น หลังเปลี่ยนชื่อแผนก/ตำแหน่ง หรือหลัง bulk_create) คืนค่าจำนวนแถวที่เปลี่ยน"""
+    changed = []
+    employees = queryset.select_related("user", "department", "position").iterator(
+        chunk_size=batch_size
+    )
+    for employee in employees:
+        key = employee_search_key(employee)
+        if employee.search_key != key:
+            employee.search_key = key
+            changed.append(employee)
+    queryset.model.objects.bulk_update(changed, ["search_key"], batch_size=batch_size)
+    return len(changed)
+
+
+# ==============================================================================
+# สร้าง index ตามชนิดฐานข้อมูล (เรียกจาก migration และทุกครั้งหลัง migrate)
+# ==============================================================================
+
+
+def _sqlite_triggers(table):
+    fts = EMPLOYEE_SEARCH_SQLITE_TABLE
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, search_key) "
+        f"VALUES ('delete', old.employee_id, old.search_key);"
+    )
+    insert_new = (
+        f"INSERT INTO {fts}(rowid, search_key) VALUES (new.employee_id, new.search_key);"
+    )
+    return {
+        f"{fts}_ai": f"AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"{fts}_ad": f"AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"{fts}_au": f"AFTER UPDATE OF search_key ON {table} BEGIN {delete_old} {insert_new} END",
+    }
+
+
+def install_employee_search_index(connection, table="app_employee"):
+    """
+    สร้าง full-text index ของ search_key ถ้ายังไม่มี (เรียกซ้ำได้)
+    SQLite: Django สร้างตารางใหม่ทั้งตารางเมื่อแก้ schema ทำให้ trigger หายไป
+    จึงต้องตรวจและสร้างใหม่ (พร้อม rebuild ข้อมูลใน FTS) หลัง migrate ทุกครั้ง
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            fts = EMPLOYEE_SEARCH_SQLITE_TABLE
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"search_key, content='{table}', content_rowid='employee_id', "
+                f"tokenize='trigram')"
+            )
+            triggers = _sqlite_triggers(table)
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                [table],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing >= set(triggers):
+                return
+            for name, body in triggers.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} {body}")
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT 1 FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                [table, EMPLOYEE_SEARCH_MYSQL_INDEX],
+            )
+            if cursor.fetchone():
+                return
+            # stopword ภาษาอังกฤษของ InnoDB จะทำให้ ngram บางตัว (เช่น "in", "at") ไม่ถูกเก็บ
+            cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+            cursor.execute(
+                f"ALTER TABLE {table} ADD FULLTEXT INDEX {EMPLOYEE_SEARCH_MYSQL_INDEX} "
+                f"(search_key) WITH PARSER ngram"
+            )
+
+
+def uninstall_employee_search_index(connection, table="app_employee"):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for name in _sqlite_triggers(table):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {EMPLOYEE_SEARCH_SQLITE_TABLE}")
+        elif connection.vendor == "mysql":
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {EMPLOYEE_SEARCH_MYSQL_INDEX}")
+
+
+# ==============================================================================
+# ค้นหา
+# ==============================================================================
+
+
+def _phrase(text):
+    # วลี (ตัวอักษรติดกันตามลำดับ) ใน syntax ของ MATCH
+    return '"' + text.replace('"', " ") + '"'
+
+
+def search_employees(queryset, query):
+    """กรอง queryset ของ Employee ตามคำค้น (ใช้ full-text index เมื่อฐานข้อมูลรองรับ)"""
+    query = normalize_search_text(query)
+    if not query:
+        return queryset
+
+    table = queryset.model._meta.db_table
+    if connection.vendor == "mysql":
+        # ngram ไม่ข้ามช่องว่าง จึงให้ทุกคำ (ที่ยาวพอ) ต้องปรากฏเป็นวลี
+        words = [word for word in query.split() if len(word) >= MYSQL_NGRAM_SIZE]
+        if words:
+            queryset = queryset.alias(
+                search_rank=RawSQL(
+                    f"MATCH ({table}.search_key) AGAINST (%s IN BOOLEAN MODE)",
+                    [" ".join(f"+{_phrase(word)}" for word in words)],
+                    output_field=FloatField(),
+                )
+            ).filter(search_rank__gt=0)
+    elif connection.vendor == "sqlite" and len(query) >= SQLITE_TRIGRAM_SIZE:
+        queryset = queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {EMPLOYEE_SEARCH_SQLITE_TABLE} "
+                f"WHERE {EMPLOYEE_SEARCH_SQLITE_TABLE} MATCH %s",
+                [_phrase(query)],
+            )
+        )
+
+    # index ใช้คัดแถวที่เป็นไปได้ ส่วน LIKE ยืนยันว่าคำค้นอยู่ติดกันจริง (และใช้แทนเมื่อคำค้นสั้นเกินไป)
+    return queryset.filter(search_key__contains=query)
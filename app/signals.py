@@ -0,0 +1,336 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import refresh_employee_count
+from .live_events import (
+    SECURITY_CHANNEL,
+    already_out_data,
+    publish_event,
+    publish_inbox_count,
+    ready_to_leave_data,
+    visitor_inside_data,
+)
+from .models import (
+    ApprovalHistory,
+    ApprovalWorkflow,
+    ApprovalWorkflowStep,
+    Department,
+    Employee,
+    InOutHistory,
+    LeaveRequest,
+    Position,
+    Role,
+    VisitorLog,
+)
+from .rollups import (
+    apply_rollup_change,
+    move_employee_rollups,
+    rollup_key,
+    stored_rollup_key,
+)
+from .search import install_employee_search_index, refresh_employee_search_keys
+from .statistics_charts import bump_statistics_version
+from .storage import add_blob_reference, release_blob_reference, stored_file_names
+from .workflow import invalidate_workflows
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def update_employee_count(sender, instance, created=True, **kwargs):
+    """
+    นับจำนวนพนักงานใหม่เมื่อมีการเพิ่ม/ลบพนักงาน (หลัง transaction commit แล้ว)
+    - post_delete ไม่มี argument `created` จึงใช้ค่าเริ่มต้น True
+    - การแก้ไขข้อมูลพนักงานเดิม (created=False) ไม่ทำให้จำนวนเปลี่ยน
+    """
+    if created:
+        transaction.on_commit(refresh_employee_count)
+
+
+# ==============================================================================
+# สถิติ: ปรับตารางสรุปรายวันตามการเปลี่ยนแปลงของคำขอ (ดู rollups.py)
+# ==============================================================================
+
+
+@receiver(pre_save, sender=LeaveRequest)
+def remember_leave_request_rollup_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stored_rollup_key = (
+            stored_rollup_key(instance.pk) if instance.pk else None
+        )
+
+
+@receiver(post_save, sender=LeaveRequest)
+def update_leave_request_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_key = getattr(instance, "_stored_rollup_key", None)
+    new_key = rollup_key(instance)
+    if old_key != new_key:
+        apply_rollup_change(old_key, new_key)
+        bump_statistics_version("leave")
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def remove_leave_request_rollup(sender, instance, **kwargs):
+    apply_rollup_change(rollup_key(instance), None)
+    bump_statistics_version("leave")
+
+
+# field ของ Employee ที่ต้องเทียบกับค่าเดิมหลังบันทึก (อ่านค่าเดิมใน query เดียว)
+# - department: ย้ายยอดสถิติไปแผนกใหม่
+# - role, department, delegate_*, name: ข้อมูลผู้อนุมัติที่ workflow เก็บไว้ใน memory
+#   (name ใช้ในข้อความ LINE ถึงผู้อนุมัติ) เปลี่ยนแล้วต้องโหลด workflow ใหม่
+TRACKED_EMPLOYEE_FIELDS = (
+    "role_id",
+    "department_id",
+    "delegate_approver_id",
+    "delegate_start_date",
+    "delegate_end_date",
+    "name",
+)
+_TRACKED_EMPLOYEE_UPDATE_FIELDS = set(TRACKED_EMPLOYEE_FIELDS) | {
+    "role",
+    "department",
+    "delegate_approver",
+}
+
+
+@receiver(pre_save, sender=Employee)
+def remember_stored_employee(sender, instance, raw=False, update_fields=None, **kwargs):
+    """จำค่าเดิมของ TRACKED_EMPLOYEE_FIELDS (None = พนักงานใหม่)"""
+    if raw:
+        return
+    if instance.pk is None:
+        instance._stored_fields = None
+    elif update_fields is not None and not (
+        _TRACKED_EMPLOYEE_UPDATE_FIELDS & set(update_fields)
+    ):
+        # บันทึกเฉพาะ field อื่น (เช่น search_key): ค่าที่ติดตามไม่เปลี่ยน ไม่ต้อง query
+        instance._stored_fields = {
+            field: getattr(instance, field) for field in TRACKED_EMPLOYEE_FIELDS
+        }
+    else:
+        instance._stored_fields = (
+            Employee.objects.filter(pk=instance.pk)
+            .values(*TRACKED_EMPLOYEE_FIELDS)
+            .first()
+        )
+
+
+def _employee_changed(instance, fields):
+    """field ใน fields เปลี่ยนจากค่าที่จำไว้ใน pre_save หรือไม่ (พนักงานใหม่ = เปลี่ยน)"""
+    stored = getattr(instance, "_stored_fields", None)
+    return stored is None or any(
+        stored[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=Employee)
+def move_employee_statistics(sender, instance, created, raw=False, **kwargs):
+    """ย้ายแผนกพนักงาน: คำขอเดิมถูกนับไว้ในแผนกเดิม ต้องย้ายไปนับในแผนกใหม่"""
+    stored = getattr(instance, "_stored_fields", None)
+    if raw or created or stored is None:
+        return
+    old_department_id = stored["department_id"]
+    if old_department_id == instance.department_id:
+        return
+    if move_employee_rollups(instance.pk, old_department_id, instance.department_id):
+        bump_statistics_version("leave")
+
+
+@receiver(post_save, sender=VisitorLog)
+@receiver(post_delete, sender=VisitorLog)
+def bump_visitor_statistics(sender, instance, **kwargs):
+    bump_statistics_version("visitor")
+
+
+# ==============================================================================
+# ค้นหาพนักงาน: ซิงก์ Employee.search_key เมื่อข้อมูลที่อยู่ในคีย์เปลี่ยน (ดู search.py)
+# ==============================================================================
+
+
+@receiver(post_save, sender=Department)
+def refresh_department_search_keys(sender, instance, **kwargs):
+    refresh_employee_search_keys(Employee.objects.filter(department=instance))
+    # ชื่อแผนกแสดงอยู่ในกราฟสถิติ
+    bump_statistics_version("leave")
+
+
+@receiver(post_save, sender=Position)
+def refresh_position_search_keys(sender, instance, **kwargs):
+    refresh_employee_search_keys(Employee.objects.filter(position=instance))
+
+
+@receiver(post_save, sender=User)
+def refresh_user_search_key(sender, instance, created, update_fields=None, **kwargs):
+    # ทุกการ login จะบันทึก User (update_fields=["last_login"]) ไม่ต้องคำนวณใหม่
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    refresh_employee_search_keys(Employee.objects.filter(user=instance))
+
+
+def ensure_employee_search_index(sender, using, apps=None, **kwargs):
+    """post_migrate: สร้าง full-text index คืน (เช่น trigger ของ SQLite ที่หายไปเมื่อสร้างตารางใหม่)"""
+    try:
+        apps.get_model("app", "Employee")._meta.get_field("search_key")
+    except (LookupError, FieldDoesNotExist):
+        # ยังไม่ได้ migrate ถึง 0016 (หรือย้อน migration กลับไปแล้ว)
+        return
+    install_employee_search_index(connections[using])
+
+
+@receiver(post_save, sender=ApprovalWorkflow)
+@receiver(post_delete, sender=ApprovalWorkflow)
+@receiver(post_save, sender=ApprovalWorkflowStep)
+@receiver(post_delete, sender=ApprovalWorkflowStep)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Role)
+def invalidate_approval_workflows(sender, instance, raw=False, **kwargs):
+    """workflow หรือข้อมูลผู้อนุมัติ (Role, แผนก, ผู้รับมอบอำนาจ) เปลี่ยน -> โหลด workflow ใหม่"""
+    if not raw:
+        invalidate_workflows()
+
+
+@receiver(post_save, sender=Employee)
+def invalidate_workflows_for_employee(sender, instance, raw=False, **kwargs):
+    # แก้ข้อมูลส่วนตัวอื่น ๆ (หรือคำนวณ search_key ใหม่) ไม่กระทบผู้อนุมัติ ไม่ต้องโหลดใหม่
+    if not raw and _employee_changed(instance, TRACKED_EMPLOYEE_FIELDS):
+        invalidate_workflows()
+
+
+@receiver(pre_save, sender=Role)
+def remember_stored_role_name(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stored_role_name = (
+            Role.objects.filter(pk=instance.pk).values_list("role_name", flat=True).first()
+            if instance.pk
+            else None
+        )
+
+
+@receiver(post_save, sender=Role)
+def invalidate_workflows_for_role(sender, instance, created, raw=False, **kwargs):
+    # Role ใหม่ยังไม่มีพนักงาน: โหลดใหม่เมื่อมีพนักงานถูกกำหนด Role นี้ (ดู invalidate_workflows_for_employee)
+    if not raw and not created and instance._stored_role_name != instance.role_name:
+        invalidate_workflows()
+
+
+# ==============================================================================
+# ไฟล์แนบ: นับการอ้างอิงไฟล์ใน blobs/ (ดู storage.py)
+# ==============================================================================
+# model -> field ที่ใช้ DedupFileSystemStorage
+BLOB_FIELDS = {
+    LeaveRequest: ("attachment",),
+    InOutHistory: ("return_image", "return_image_display", "return_image_thumb"),
+}
+_NOT_LOADED = object()
+
+
+@receiver(post_init, sender=LeaveRequest)
+@receiver(post_init, sender=InOutHistory)
+def remember_loaded_files(sender, instance, **kwargs):
+    """จำชื่อไฟล์ที่โหลดมาจากฐานข้อมูล (ไม่ต้อง query ชื่อเดิมก่อนบันทึกทุกครั้ง)"""
+    instance._stored_files = {}
+    for field in BLOB_FIELDS[sender]:
+        value = instance.__dict__.get(field, _NOT_LOADED)
+        # ค่าที่เป็นไฟล์ (ยังไม่ได้บันทึก) = สร้างใหม่ด้วยไฟล์ที่อัปโหลด
+        instance._stored_files[field] = value if value is _NOT_LOADED or isinstance(value, str) else None
+
+
+@receiver(pre_save, sender=LeaveRequest)
+@receiver(pre_save, sender=InOutHistory)
+def load_deferred_file_names(sender, instance, raw=False, **kwargs):
+    # field ที่ไม่ได้โหลดมา (เช่น .only()) ต้องอ่านชื่อเดิมจากฐานข้อมูล
+    deferred = [f for f, name in instance._stored_files.items() if name is _NOT_LOADED]
+    if deferred and not raw and instance.pk:
+        instance._stored_files.update(stored_file_names(sender, instance.pk, deferred))
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_save, sender=InOutHistory)
+def update_blob_references(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    for field in BLOB_FIELDS[sender]:
+        old_name = None if created else instance._stored_files.get(field)
+        new_name = getattr(instance, field).name or None
+        if old_name is _NOT_LOADED or old_name == new_name:
+            continue
+        add_blob_reference(new_name)
+        release_blob_reference(old_name)
+        instance._stored_files[field] = new_name
+
+
+@receiver(post_delete, sender=LeaveRequest)
+@receiver(post_delete, sender=InOutHistory)
+def release_blob_references(sender, instance, **kwargs):
+    for field in BLOB_FIELDS[sender]:
+        release_blob_reference(getattr(instance, field).name)
+
+
+# ==============================================================================
+# Live events: ส่งการเปลี่ยนแปลงไปยังหน้าจอที่เปิดค้างไว้ (ดู live_events.py)
+# ==============================================================================
+
+
+@receiver(post_save, sender=ApprovalHistory)
+@receiver(post_delete, sender=ApprovalHistory)
+def publish_approval_inbox_count(sender, instance, **kwargs):
+    publish_inbox_count(instance.approver_id)
+
+
+@receiver(post_save, sender=LeaveRequest)
+def publish_leave_request_ready(sender, instance, **kwargs):
+    """คำขอของวันนี้ที่อนุมัติครบแล้ว และยังไม่ได้บันทึกเวลาออก -> แสดงบน Security Dashboard"""
+    if instance.status != "Approved" or instance.leave_date != timezone.localdate():
+        return
+    if InOutHistory.objects.filter(request=instance).exists():
+        return
+    publish_event(SECURITY_CHANNEL, "leave.ready", ready_to_leave_data(instance))
+
+
+@receiver(pre_save, sender=InOutHistory)
+@receiver(pre_save, sender=VisitorLog)
+def remember_stored_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    สถานะก่อนบันทึก: ส่ง event เฉพาะเมื่อสถานะเปลี่ยน
+    (ไม่ส่งซ้ำเมื่อบันทึกแถวเดิมด้วยเหตุอื่น เช่น image_worker หรือแก้ไขใน admin)
+    """
+    if raw or instance._state.adding:
+        instance._stored_status = None
+    elif update_fields is not None and "status" not in update_fields:
+        instance._stored_status = instance.status
+    else:
+        instance._stored_status = (
+            sender._default_manager.filter(pk=instance.pk)
+            .values_list("status", flat=True)
+            .first()
+        )
+
+
+def _status_changed_to(instance, status):
+    return instance.status == status and getattr(instance, "_stored_status", None) != status
+
+
+@receiver(post_save, sender=InOutHistory)
+def publish_in_out_history(sender, instance, created, **kwargs):
+    if created and instance.status == "OUT":
+        publish_event(SECURITY_CHANNEL, "inout.out", already_out_data(instance))
+    elif _status_changed_to(instance, "COMPLETED"):
+        publish_event(
+            SECURITY_CHANNEL,
+            "inout.in",
+            {"history_id": instance.history_id, "request_id": instance.request_id},
+        )
+
+
+@receiver(post_save, sender=VisitorLog)
+def publish_visitor_log(sender, instance, created, **kwargs):
+    if created and instance.status == "IN":
+        publish_event(SECURITY_CHANNEL, "visitor.in", visitor_inside_data(instance))
+    elif _status_changed_to(instance, "OUT"):
+        publish_event(SECURITY_CHANNEL, "visitor.out", {"log_id": instance.log_id})
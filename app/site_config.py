@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+# ระบุตำแหน่งไฟล์ Config (ใช้ในโหมด file และใช้เป็นค่าตั้งต้นของโหมด db)
+CONFIG_FILE_PATH = os.path.join(settings.BASE_DIR, "site_config.json")
+
+# ค่าเริ่มต้น ถ้ายังไม่มีการตั้งค่า หรือไฟล์/ข้อมูลเสีย
+DEFAULT_SITE_CONFIG = {
+    "brand_name": "eLeave",
+    "footer_text": "&copy; 2025 ระบบขออนุญาตออกนอกสถานที่",
+    "force_password_change_enabled": True,
+    "color_primary": "#3498db",
+    "color_success": "#198754",
+    "color_warning": "#f39c12",
+    "color_danger": "#e74c3c",
+}
+
+# --- Cache ภายใน process (หนึ่งชุดต่อ worker) ---
+_lock = threading.Lock()
+_cache = {
+    "config": None,  # dict ที่ parse แล้ว
+    "version": None,  # version (โหมด db) หรือ mtime ของไฟล์ (โหมด file)
+    "checked_at": 0.0,  # เวลาที่ตรวจ version ล่าสุด (time.monotonic)
+}
+
+
+def _backend():
+    """'db' = เก็บในฐานข้อมูล (หลายเครื่อง), 'file' = อ่านจาก site_config.json (เครื่องเดียว)"""
+    return getattr(settings, "SITE_CONFIG_BACKEND", "db")
+
+
+def _check_interval():
+    """ระยะเวลา (วินาที) ที่จะตรวจ version ซ้ำ ระหว่างนี้จะใช้ค่าใน cache ได้เลย"""
+    return getattr(settings, "SITE_CONFIG_CHECK_INTERVAL", 5)
+
+
+def _read_file():
+    try:
+        with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
+            return {**DEFAULT_SITE_CONFIG, **json.load(f)}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return dict(DEFAULT_SITE_CONFIG)
+
+
+def _file_mtime():
+    try:
+        return os.stat(CONFIG_FILE_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_from_file():
+    mtime = _file_mtime()
+    if _cache["config"] is None or _cache["version"] != mtime:
+        _cache["config"] = _read_file()
+        _cache["version"] = mtime
+
+
+def _load_from_db():
+    from .models import SiteConfiguration
+
+    # ถาม version อย่างเดียว (query เล็กมาก) แล้วค่อยโหลด JSON เมื่อ version เปลี่ยน
+    version = (
+        SiteConfiguration.objects.order_by("config_id")
+        .values_list("version", flat=True)
+        .first()
+    )
+    if version is None:
+        # ยังไม่มีข้อมูลในฐานข้อมูล: นำค่าจากไฟล์เดิมมาตั้งต้น
+        data = _read_file()
+        row = SiteConfiguration.objects.create(data=data)
+        _cache["config"] = data
+        _cache["version"] = row.version
+        return
+
+    if _cache["config"] is None or _cache["version"] != version:
+        row = SiteConfiguration.objects.order_by("config_id").first()
+        _cache["config"] = {**DEFAULT_SITE_CONFIG, **row.data}
+        _cache["version"] = row.version
+
+
+def get_site_config():
+    """
+    คืนค่าตั้งค่าเว็บไซต์ (dict) จาก cache
+    จะ parse ข้อมูลใหม่ก็ต่อเมื่อ version (หรือ mtime ของไฟล์) เปลี่ยนเท่านั้น
+    """
+    now = time.monotonic()
+    # อ่านค่าใส่ตัวแปรก่อน (ไม่ล็อก): thread อื่นอาจล้าง _cache["config"] เป็น None ระหว่างนี้
+    config = _cache["config"]
+    if config is not None and now - _cache["checked_at"] < _check_interval():
+        return dict(config)
+
+    with _lock:
+        try:
+            if _backend() == "file":
+                _load_from_file()
+            else:
+                _load_from_db()
+        except DatabaseError as e:
+            # ถ้าฐานข้อมูลมีปัญหา (เช่น ยังไม่ได้ migrate) ให้ใช้ค่าเดิม/ค่าจากไฟล์ไปก่อน
+            print(f"Error loading site config from database: {e}")
+            if _cache["config"] is None:
+                _cache["config"] = _read_file()
+        _cache["checked_at"] = now
+        return dict(_cache["config"])
+
+
+def save_site_config(new_config):
+    """
+    บันทึกค่าตั้งค่าเว็บไซต์ใหม่ และเพิ่ม version เพื่อให้ทุก worker/ทุกเครื่องโหลดใหม่
+    (โหมด file จะเขียนทับ site_config.json เหมือนเดิม)
+    """
+    if _backend() == "file":
+        with open(CONFIG_FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(new_config, f, indent=4, ensure_ascii=False)
+    else:
+        from .models import SiteConfiguration
+
+        with transaction.atomic():
+            row = (
+                SiteConfiguration.objects.select_for_update()
+                .order_by("config_id")
+                .first()
+            )
+            if row is None:
+                SiteConfiguration.objects.create(data=new_config)
+            else:
+                SiteConfiguration.objects.filter(pk=row.pk).update(
+                    data=new_config, version=F("version") + 1
+                )
+
+    invalidate_site_config()
+
+
+def invalidate_site_config():
+    """ล้าง cache ของ worker นี้ (worker อื่นจะเห็น version ใหม่ในรอบตรวจถัดไป)"""
+    with _lock:
+        _cache["config"] = None
+        _cache["version"] = None
+        _cache["checked_at"] = 0.0
@@ -0,0 +1,133 @@
+import hashlib
+import json
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import keyset_values, local_day_start, parse_filter_date
+from .models import VisitorLog
+from .rollups import department_totals, duration_totals, monthly_totals, status_totals
+
+# ==============================================================================
+# ข้อมูลกราฟของหน้าสถิติ (JSON แยกต่อกราฟ) + cache แบบมี version
+# ==============================================================================
+# key ของ cache มี version ของข้อมูลต้นทางอยู่ด้วย เมื่อมีการบันทึกข้อมูลจะเพิ่ม version
+# (key เดิมทั้งหมดจึงไม่ถูกใช้อีก และหมดอายุไปเอง) โดยไม่ต้องไล่ลบ key ทีละตัว
+# version เก็บในฐานข้อมูล (StatisticsVersion) ไม่ใช่ใน cache: ถ้า CACHES เป็น LocMem (แยกต่อ worker)
+# การเพิ่ม version ใน cache จะเห็นเฉพาะ worker ที่บันทึกข้อมูล worker อื่นจะใช้ข้อมูลเก่าจนหมดอายุ
+# - "leave"   : คำขอ (เพิ่มเมื่อตารางสรุป LeaveRequestDailyStat เปลี่ยน)
+# - "visitor" : บุคคลภายนอก
+
+
+def _cache_timeout():
+    return getattr(settings, "STATISTICS_CACHE_TIMEOUT", 600)
+
+
+def statistics_version(scope):
+    """version ปัจจุบันของ scope (query เล็กหนึ่งครั้งต่อการขอข้อมูลกราฟ)"""
+    from .models import StatisticsVersion
+
+    version = (
+        StatisticsVersion.objects.filter(scope=scope)
+        .values_list("version", flat=True)
+        .first()
+    )
+    if version is None:
+        # ยังไม่มีแถว (ปกติ migration สร้างไว้แล้ว)
+        version = StatisticsVersion.objects.get_or_create(scope=scope)[0].version
+    return version
+
+
+def bump_statistics_version(scope):
+    """เรียกเมื่อข้อมูลเปลี่ยน (เพิ่ม version หลัง transaction commit เพื่อไม่ให้ cache ข้อมูลก่อน commit ด้วย version ใหม่)"""
+    from .models import StatisticsVersion
+
+    def bump():
+        rows = StatisticsVersion.objects.filter(scope=scope)
+        if not rows.update(version=F("version") + 1):
+            StatisticsVersion.objects.get_or_create(scope=scope)
+
+    transaction.on_commit(bump)
+
+
+# ------------------------------------------------------------------------------
+# ตัวกรอง
+# ------------------------------------------------------------------------------
+
+
+def get_statistics_filters(params):
+    """อ่านตัวกรองจาก request.GET: start_date, end_date (YYYY-MM-DD) และ department (id)"""
+    department = params.get("department", "")
+    return {
+        "start_date": parse_filter_date(params.get("start_date", "")),
+        "end_date": parse_filter_date(params.get("end_date", "")),
+        "department_id": int(department) if department.isdigit() else None,
+    }
+
+
+# ------------------------------------------------------------------------------
+# กราฟแต่ละแบบ: คืนค่า {"labels": [...], "data": [...]}
+# ------------------------------------------------------------------------------
+
+
+def _chart(rows, label_field, label=str):
+    return {
+        "labels": [label(row[label_field]) for row in rows],
+        "data": [row["count"] for row in rows],
+    }
+
+
+def _visitor_chart(filters):
+    """จำนวนบุคคลภายนอกรายเดือน (ไม่มีแผนก จึงไม่ใช้ตัวกรองแผนก)"""
+    queryset = VisitorLog.objects.all()
+    if filters["start_date"]:
+        queryset = queryset.filter(time_in__gte=local_day_start(filters["start_date"]))
+    if filters["end_date"]:
+        queryset = queryset.filter(
+            time_in__lt=local_day_start(filters["end_date"] + timedelta(days=1))
+        )
+    # เดือนตามเวลาท้องถิ่นคำนวณใน Python: TruncMonth ของ DateTimeField บน MySQL ใช้ CONVERT_TZ
+    # ซึ่งคืนค่า NULL ถ้า server ไม่ได้โหลดตาราง time zone ไว้ (ผลลัพธ์ถูก cache ตาม version อยู่แล้ว)
+    months = Counter(
+        timezone.localtime(time_in).strftime("%Y-%m")
+        for (time_in,) in keyset_values(queryset, ["time_in"])
+    )
+    rows = [{"month": month, "count": months[month]} for month in sorted(months)]
+    return _chart(rows, "month")
+
+
+# ชื่อกราฟ -> (scope ของ version, ฟังก์ชันสร้างข้อมูล)
+STATISTICS_CHARTS = {
+    "status": ("leave", lambda f: _chart(status_totals(f), "status")),
+    "department": (
+        "leave",
+        lambda f: _chart(department_totals(f), "department__department_name"),
+    ),
+    "duration": ("leave", lambda f: _chart(duration_totals(f), "leave_duration")),
+    "monthly": (
+        "leave",
+        lambda f: _chart(monthly_totals(f), "month", lambda m: m.strftime("%Y-%m")),
+    ),
+    "visitors": ("visitor", _visitor_chart),
+}
+
+
+def get_chart_data(chart, filters):
+    """ข้อมูลของกราฟตามตัวกรอง (อ่านจาก cache ถ้ามี) chart ต้องอยู่ใน STATISTICS_CHARTS"""
+    scope, build = STATISTICS_CHARTS[chart]
+    params = json.dumps(filters, sort_keys=True, default=str)
+    key = "app:statistics:{}:v{}:{}".format(
+        chart,
+        statistics_version(scope),
+        hashlib.md5(params.encode("utf-8")).hexdigest(),
+    )
+    data = cache.get(key)
+    if data is None:
+        data = build(filters)
+        cache.set(key, data, _cache_timeout())
+    return data
@@ -0,0 +1,258 @@
+import hashlib
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import LazyObject
+from django.utils.module_loading import import_string
+
+# ==============================================================================
+# ที่เก็บไฟล์แนบแบบไม่ซ้ำ (content-addressed)
+# ==============================================================================
+# ไฟล์ถูกเก็บตาม SHA-256 ของเนื้อหา: blobs/ab/cd/<sha256><นามสกุล>
+# ไฟล์เดียวกันที่อัปโหลดซ้ำ (แม้ชื่อต่างกัน) จึงใช้ไฟล์บนดิสก์ร่วมกัน
+# จำนวนการอ้างอิงเก็บใน StoredBlob.ref_count (ปรับผ่าน signal ของ model ที่ใช้ storage นี้)
+# ไฟล์ที่ไม่มีการอ้างอิงแล้วถูกลบโดย  python manage.py dedupe_media  (หลังพ้นระยะ BLOB_GRACE_SECONDS)
+
+BLOB_PREFIX = "blobs/"
+_TMP_DIR = BLOB_PREFIX + "tmp"
+
+
+def _grace():
+    """ระยะเวลา (วินาที) ก่อนลบไฟล์ที่ไม่มีการอ้างอิง (กันไม่ให้ลบไฟล์ของการอัปโหลดที่ยังไม่ commit)"""
+    return getattr(settings, "BLOB_GRACE_SECONDS", 24 * 3600)
+
+
+def blob_name(digest, original_name=""):
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+class DedupFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage ที่ตั้งชื่อไฟล์ตาม SHA-256 ของเนื้อหา
+    คำนวณ hash ระหว่างเขียนไฟล์ลงดิสก์ (อ่านไฟล์ที่อัปโหลดรอบเดียว) แล้วย้ายเข้าที่
+    ถ้ามีไฟล์เดียวกันอยู่แล้ว จะลบไฟล์ชั่วคราวทิ้งและคืนชื่อไฟล์เดิม
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # ชื่อจริงถูกกำหนดจากเนื้อหาใน _save ไม่ต้องหาชื่อที่ว่าง
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(_TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            if hasattr(content, "temporary_file_path"):
+                # ไฟล์ใหญ่ที่ Django พักไว้บนดิสก์แล้ว: อ่านเพื่อ hash แล้วย้ายไฟล์ (ไม่ต้องเขียนซ้ำ)
+                os.close(fd)
+                with open(content.temporary_file_path(), "rb") as source:
+                    for chunk in iter(lambda: source.read(64 * 1024), b""):
+                        digest.update(chunk)
+                file_move_safe(content.temporary_file_path(), tmp_path, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, "wb") as tmp:
+                    locks.lock(tmp, locks.LOCK_EX)
+                    for chunk in content.chunks():
+                        digest.update(chunk)
+                        tmp.write(chunk)
+
+            name = blob_name(digest.hexdigest(), name)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # มีไฟล์เดียวกันแล้ว: แตะเวลาแก้ไขไว้ ไม่ให้ถูกลบระหว่างที่คำขอนี้ยังไม่ commit
+                os.utime(full_path)
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+
+class ConfiguredDedupStorage(LazyObject):
+    """storage ตาม ATTACHMENT_STORAGE (path ของ class) สร้างเมื่อใช้งานครั้งแรก"""
+
+    def _setup(self):
+        self._wrapped = import_string(
+            getattr(settings, "ATTACHMENT_STORAGE", "app.storage.DedupFileSystemStorage")
+        )()
+
+
+dedup_storage = ConfiguredDedupStorage()
+
+
+def get_dedup_storage():
+    """ใช้เป็น storage= ของ FileField (migration อ้างอิงฟังก์ชันนี้แทนการเก็บ instance)"""
+    return dedup_storage
+
+
+def is_local_storage(storage):
+    """storage เก็บไฟล์บนดิสก์ของเครื่องนี้หรือไม่ (มี path())"""
+    try:
+        storage.path("")
+    except NotImplementedError:
+        return False
+    return True
+
+
+# ==============================================================================
+# จำนวนการอ้างอิง (StoredBlob)
+# ==============================================================================
+
+
+def add_blob_reference(name, count=1):
+    """
+    เพิ่มการอ้างอิงไฟล์ name จำนวน count ครั้ง
+    (ไม่ทำอะไรกับไฟล์ที่ไม่ได้อยู่ใน blobs/ เช่น ไฟล์เก่าก่อนใช้ storage นี้)
+    """
+    from .models import StoredBlob
+
+    if not is_blob(name) or count <= 0:
+        return
+    rows = StoredBlob.objects.filter(name=name)
+    if rows.update(ref_count=F("ref_count") + count, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(
+                name=name, size=dedup_storage.size(name), ref_count=count
+            )
+    except IntegrityError:
+        # อีก transaction สร้างแถวเดียวกันไปก่อนแล้ว
+        rows.update(ref_count=F("ref_count") + count, updated_at=timezone.now())
+
+
+def reserve_blob(name, size):
+    """
+    แถว StoredBlob ของไฟล์ที่กำลังจะถูกอ้างอิง (เช่น ไฟล์ที่ browser อัปโหลดตรงไปที่ object storage)
+    ถ้าไม่มีใครอ้างอิงภายใน BLOB_GRACE_SECONDS จะถูกลบโดย prune_blobs เหมือนไฟล์อื่น
+    """
+    from .models import StoredBlob
+
+    rows = StoredBlob.objects.filter(name=name)
+    if rows.update(updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(name=name, size=size, ref_count=0)
+    except IntegrityError:
+        rows.update(updated_at=timezone.now())
+
+
+def release_blob_reference(name):
+    """
+    ลดการอ้างอิงไฟล์ name (ไฟล์ถูกลบภายหลังโดย dedupe_media เมื่อไม่มีการอ้างอิงแล้ว)
+    ไฟล์เก่าที่ไม่ได้อยู่ใน blobs/ มีผู้อ้างอิงเพียงรายเดียว จึงลบทิ้งทันทีหลัง commit
+    """
+    from .models import StoredBlob
+
+    if not name:
+        return
+    if is_blob(name):
+        StoredBlob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1, updated_at=timezone.now()
+        )
+    else:
+        transaction.on_commit(lambda: dedup_storage.delete(name))
+
+
+def stored_file_names(model, pk, fields):
+    """ชื่อไฟล์ที่บันทึกอยู่ในฐานข้อมูล (ก่อนบันทึกค่าใหม่) ของ fields {field: name}"""
+    row = model._default_manager.filter(pk=pk).values(*fields).first()
+    return row or {}
+
+
+# ==============================================================================
+# ย้ายไฟล์เก่าเข้า blobs/ และลบไฟล์ที่ไม่มีการอ้างอิง (คำสั่ง dedupe_media)
+# ==============================================================================
+
+
+def import_legacy_files(model, field_name):
+    """
+    ย้ายไฟล์ของ field ที่ยังเป็นชื่อแบบเดิม (เช่น attachments/xxx.png) เข้า blobs/
+    ไฟล์ที่เนื้อหาซ้ำกันจะเหลือเพียงไฟล์เดียว คืนค่าจำนวนแถวที่ย้าย
+    แถวที่อ้างอิงไฟล์เดิมชื่อเดียวกันถูกย้ายพร้อมกัน แล้วจึงลบไฟล์เดิมครั้งเดียวหลัง commit
+    """
+    rows = (
+        model._default_manager.exclude(**{f"{field_name}__startswith": BLOB_PREFIX})
+        .exclude(**{f"{field_name}__isnull": True})
+        .exclude(**{field_name: ""})
+        .values_list("pk", field_name)
+    )
+    pks_by_name = {}
+    for pk, old_name in rows:
+        pks_by_name.setdefault(old_name, []).append(pk)
+
+    moved = 0
+    for old_name, pks in pks_by_name.items():
+        if not dedup_storage.exists(old_name):
+            continue
+        with dedup_storage.open(old_name) as source:
+            name = dedup_storage.save(old_name, source)
+        with transaction.atomic():
+            updated = model._default_manager.filter(
+                pk__in=pks, **{field_name: old_name}
+            ).update(**{field_name: name})
+            add_blob_reference(name, updated)
+        moved += updated
+        # แถวที่เพิ่งอ้างอิงไฟล์เดิมระหว่างนี้ (หรือแถวที่ยังไม่ได้ย้าย) ยังต้องใช้ไฟล์อยู่
+        if not model._default_manager.filter(**{field_name: old_name}).exists():
+            dedup_storage.delete(old_name)
+    return moved
+
+
+def prune_blobs():
+    """ลบ blob ที่ไม่มีการอ้างอิงเกิน BLOB_GRACE_SECONDS และไฟล์ค้างที่ไม่มีแถวใน StoredBlob"""
+    from .models import StoredBlob
+
+    cutoff = timezone.now() - timedelta(seconds=_grace())
+    cutoff_ts = time.time() - _grace()
+    removed = 0
+    for name in StoredBlob.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list(
+        "name", flat=True
+    ):
+        # อัปโหลดไฟล์เดียวกันเมื่อไม่นานนี้ (_save แตะเวลาแก้ไขไว้) แต่ยังไม่ commit: ยังไม่ลบ
+        if dedup_storage.exists(name) and dedup_storage.get_modified_time(name) >= cutoff:
+            continue
+        # ลบแถวแบบมีเงื่อนไข: ถ้ามีการอ้างอิงใหม่เข้ามาระหว่างนี้ จะไม่ถูกลบ
+        if StoredBlob.objects.filter(name=name, ref_count=0).delete()[0]:
+            dedup_storage.delete(name)
+            removed += 1
+
+    # ไฟล์ที่เขียนแล้วแต่ transaction ถูก rollback (ไม่มีแถวใน StoredBlob) และไฟล์ชั่วคราวที่ค้าง
+    # (object storage: ใช้ lifecycle rule ของ bucket แทน เพราะการไล่รายการ object ทั้งหมดมีค่าใช้จ่ายสูง)
+    if not is_local_storage(dedup_storage):
+        return removed
+    known = set(StoredBlob.objects.values_list("name", flat=True))
+    root = dedup_storage.path(BLOB_PREFIX)
+    for dirpath, _, filenames in os.walk(root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, dedup_storage.location).replace(os.sep, "/")
+            if name not in known and os.path.getmtime(path) < cutoff_ts:
+                os.remove(path)
+                removed += 1
+        # โฟลเดอร์ย่อย (ab/cd) ที่ว่างแล้ว
+        if dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
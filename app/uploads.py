@@ -0,0 +1,292 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChunkedUpload
+from .object_storage import CHECKSUM_HEADER, checksum_header_value
+from .storage import blob_name, dedup_storage, reserve_blob
+
+# ==============================================================================
+# อัปโหลดไฟล์แนบทีละส่วน (chunked, resumable)
+# ==============================================================================
+# 1. POST /uploads/                  (filename, size)  -> upload_id
+# 2. POST /uploads/<upload_id>/      body = ข้อมูล chunk
+#    header X-Upload-Offset = ตำแหน่งเริ่มของ chunk, X-Chunk-SHA256 = checksum ของ chunk
+#    GET  /uploads/<upload_id>/      -> offset ปัจจุบัน (สำหรับอัปโหลดต่อหลังสัญญาณหลุด)
+# 3. ฟอร์มส่ง <field>_upload_id แทนไฟล์ (ดู uploaded_file)
+# chunk ถูกต่อกันบนดิสก์ที่ CHUNKED_UPLOAD_DIR/<upload_id>.part
+# แต่ละ request ใช้เวลาเท่ากับการส่ง chunk เดียว worker จึงไม่ถูกยึดตลอดการอัปโหลดไฟล์ใหญ่
+#
+# เมื่อ ATTACHMENT_STORAGE เป็น object storage (supports_direct_upload) ขั้นที่ 1 ต้องส่ง sha256 ของทั้งไฟล์มาด้วย
+# และขั้นที่ 2 เปลี่ยนเป็น browser PUT ทั้งไฟล์ไปที่ presigned URL (upload_state()["direct"])
+# ที่ชื่อใน blobs/ ตาม sha256 โดยตรง (object storage ตรวจ hash ให้) ถ้ามีไฟล์นี้อยู่แล้วไม่ต้องอัปโหลด
+# ขั้นที่ 3 เหมือนเดิม: แถว ChunkedUpload ใช้ยืนยันเจ้าของและใช้ได้ครั้งเดียว
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _max_size():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 20 * 1024 * 1024)
+
+
+def chunk_size():
+    """ขนาด chunk ที่ให้ browser ส่ง (server รับได้ไม่เกินค่านี้ต่อ request)"""
+    return getattr(settings, "CHUNKED_UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
+
+def _upload_dir():
+    # ควรอยู่บนดิสก์เดียวกับ MEDIA_ROOT: ไฟล์ที่ประกอบเสร็จจะถูกย้าย (rename) ไม่ต้องคัดลอก
+    path = getattr(settings, "CHUNKED_UPLOAD_DIR", None) or os.path.join(
+        settings.MEDIA_ROOT, "uploads"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return os.path.join(_upload_dir(), f"{upload.upload_id}.part")
+
+
+def direct_upload_enabled():
+    return getattr(dedup_storage, "supports_direct_upload", False)
+
+
+def direct_key(upload):
+    """ชื่อใน blobs/ ของไฟล์ที่ browser อัปโหลดตรง (ตาม sha256 ที่แจ้งไว้ตอนเริ่มอัปโหลด)"""
+    return blob_name(upload.sha256, upload.filename)
+
+
+def _direct_exists(upload):
+    head = dedup_storage.client.head_object(direct_key(upload))
+    return head is not None and head["size"] == upload.size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def upload_state(upload):
+    """ข้อมูลที่ส่งกลับให้ browser หลังทุกขั้นตอน"""
+    complete = upload.is_complete
+    direct = None
+    if direct_upload_enabled():
+        direct = _direct_target(upload)
+        complete = direct is None
+    return {
+        "upload_id": str(upload.upload_id),
+        "offset": upload.offset,
+        "size": upload.size,
+        "chunk_size": chunk_size(),
+        "complete": complete,
+        "direct": direct,
+    }
+
+
+def _direct_target(upload):
+    """presigned PUT ของไฟล์ หรือ None ถ้ามีไฟล์เดียวกันใน storage แล้ว (ไม่ต้องอัปโหลด)"""
+    if _direct_exists(upload):
+        return None
+    # header ที่ลงชื่อไว้ต้องถูกส่งมาตรงกัน: object storage ปฏิเสธไฟล์ที่ขนาดหรือ hash ไม่ตรงกับที่แจ้งไว้
+    headers = {
+        "Content-Type": upload.content_type,
+        "Content-Length": str(upload.size),
+        CHECKSUM_HEADER: checksum_header_value(upload.sha256),
+    }
+    url = dedup_storage.client.presigned_url(
+        "PUT",
+        direct_key(upload),
+        getattr(settings, "OBJECT_STORAGE_PRESIGN_SECONDS", 300),
+        headers=headers,
+    )
+    # browser กำหนด Content-Length เองจากขนาดไฟล์
+    del headers["Content-Length"]
+    return {"url": url, "method": "PUT", "headers": headers}
+
+
+# ==============================================================================
+# 1. เริ่มอัปโหลด / รับ chunk
+# ==============================================================================
+
+
+def start_upload(user, filename, size, content_type="", sha256=""):
+    filename = os.path.basename(filename or "").strip()[:255]
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("ขนาดไฟล์ไม่ถูกต้อง")
+    if not filename or size <= 0:
+        raise UploadError("ข้อมูลไฟล์ไม่ถูกต้อง")
+    if size > _max_size():
+        raise UploadError("ไฟล์มีขนาดใหญ่เกินกำหนด", status=413)
+    sha256 = (sha256 or "").strip().lower()
+    direct = direct_upload_enabled()
+    if direct and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256)):
+        raise UploadError("ต้องระบุ sha256 ของไฟล์")
+
+    upload = ChunkedUpload.objects.create(
+        owner=user,
+        filename=filename,
+        size=size,
+        content_type=(content_type or "application/octet-stream")[:100],
+        sha256=sha256 if direct else "",
+    )
+    if direct:
+        # ไฟล์ที่อัปโหลดแล้วไม่ได้ส่งฟอร์ม ถูกลบโดย prune_blobs (ไม่มีการอ้างอิงเกิน BLOB_GRACE_SECONDS)
+        reserve_blob(direct_key(upload), size)
+    else:
+        open(part_path(upload), "wb").close()
+    return upload
+
+
+def append_chunk(upload, offset, checksum, stream, length):
+    """
+    รับ chunk ที่เริ่มที่ตำแหน่ง offset แล้วต่อท้ายไฟล์ (ถ้า checksum ตรง)
+    อ่านข้อมูลจากเครือข่ายลงไฟล์ชั่วคราวก่อน (ช้า) แล้วจึงล็อกแถวสั้น ๆ เพื่อต่อไฟล์
+    ส่ง chunk เดิมซ้ำ (เช่น ไม่ได้รับคำตอบเพราะสัญญาณหลุด) จะได้ 409 พร้อม offset ปัจจุบัน
+    """
+    if direct_upload_enabled():
+        raise UploadError("ให้อัปโหลดไฟล์ไปที่ object storage โดยตรง (upload_state()['direct'])")
+    try:
+        offset = int(offset)
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadError("ต้องระบุ X-Upload-Offset และ Content-Length")
+    if offset != upload.offset:
+        raise UploadError("ตำแหน่งไม่ตรงกับข้อมูลที่ได้รับแล้ว", status=409)
+    if length <= 0 or length > chunk_size():
+        raise UploadError("ขนาด chunk ไม่ถูกต้อง", status=413)
+    if offset + length > upload.size:
+        raise UploadError("ข้อมูลเกินขนาดไฟล์ที่ระบุไว้")
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=_upload_dir(), suffix=".chunk")
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as tmp:
+            while received < length:
+                data = stream.read(min(64 * 1024, length - received))
+                if not data:
+                    break
+                digest.update(data)
+                tmp.write(data)
+                received += len(data)
+        if received != length:
+            raise UploadError("ได้รับข้อมูลไม่ครบ")
+        if digest.hexdigest() != (checksum or "").strip().lower():
+            raise UploadError("checksum ไม่ถูกต้อง กรุณาส่ง chunk นี้ใหม่")
+
+        with transaction.atomic():
+            locked = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+            if locked.offset != offset:
+                upload.offset = locked.offset
+                raise UploadError("ตำแหน่งไม่ตรงกับข้อมูลที่ได้รับแล้ว", status=409)
+            with open(part_path(locked), "r+b") as part, open(tmp_path, "rb") as source:
+                # ตัดข้อมูลส่วนเกินที่อาจค้างจากครั้งก่อน (เขียนไฟล์แล้วแต่บันทึกแถวไม่สำเร็จ)
+                part.seek(offset)
+                part.truncate()
+                shutil.copyfileobj(source, part)
+            locked.offset = offset + length
+            locked.updated_at = timezone.now()
+            locked.save(update_fields=["offset", "updated_at"])
+        upload.offset = locked.offset
+        return upload
+    finally:
+        _remove(tmp_path)
+
+
+# ==============================================================================
+# 2. ใช้ไฟล์ที่อัปโหลดเสร็จแล้วในฟอร์ม
+# ==============================================================================
+
+
+class ChunkedUploadFile(File):
+    """
+    ไฟล์ที่ประกอบจาก chunk แล้ว ใช้แทน UploadedFile ใน FileField
+    มี temporary_file_path() เหมือน TemporaryUploadedFile: storage ย้ายไฟล์แทนการคัดลอก
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(None, name)
+        self.path = path
+        self.size = size
+
+    def temporary_file_path(self):
+        return self.path
+
+    def chunks(self, chunk_size=None):
+        with open(self.path, "rb") as f:
+            while data := f.read(chunk_size or self.DEFAULT_CHUNK_SIZE):
+                yield data
+
+
+def uploaded_file(request, field):
+    """
+    ไฟล์ของ field จากฟอร์ม: ไฟล์ที่ส่งมาตามปกติ (request.FILES)
+    หรือไฟล์ที่อัปโหลดทีละส่วนไว้แล้ว (<field>_upload_id) คืนค่า None ถ้าไม่มีไฟล์
+    """
+    if field in request.FILES:
+        return request.FILES[field]
+    upload_id = request.POST.get(f"{field}_upload_id")
+    if not upload_id:
+        return None
+    try:
+        upload = ChunkedUpload.objects.get(upload_id=upload_id, owner=request.user)
+    except (ChunkedUpload.DoesNotExist, ValidationError):
+        raise UploadError("ไม่พบไฟล์ที่อัปโหลดไว้ (อาจหมดอายุแล้ว) กรุณาแนบไฟล์ใหม่", status=404)
+    if direct_upload_enabled():
+        # อัปโหลดตรงไปที่ object storage: ตรวจว่ามี object ขนาดตรงตามที่แจ้งไว้ แล้วบันทึกเพียงชื่อใน blobs/
+        # (signal ของ model นับการอ้างอิงเหมือนไฟล์อื่น)
+        if not _direct_exists(upload):
+            raise UploadError("ไฟล์ยังอัปโหลดไม่เสร็จ กรุณารอสักครู่แล้วลองใหม่", status=409)
+        upload.delete()
+        return direct_key(upload)
+
+    if not upload.is_complete:
+        raise UploadError("ไฟล์ยังอัปโหลดไม่เสร็จ กรุณารอสักครู่แล้วลองใหม่", status=409)
+
+    path = part_path(upload)
+    upload.delete()
+    # storage ย้ายไฟล์ออกไปตอนบันทึก model (ไฟล์ที่เหลือค้างถูกลบโดย prune_stale_uploads)
+    return ChunkedUploadFile(path, upload.filename, upload.size)
+
+
+# ==============================================================================
+# 3. ลบการอัปโหลดที่ค้าง (คำสั่ง dedupe_media)
+# ==============================================================================
+
+
+def prune_stale_uploads():
+    """
+    ลบการอัปโหลดที่ไม่มีความคืบหน้าเกิน CHUNKED_UPLOAD_EXPIRE_SECONDS
+    และไฟล์ค้างที่ไม่มีแถวแล้ว (chunk ชั่วคราว, ไฟล์ที่ storage คัดลอกไปแทนการย้าย) คืนค่าจำนวนที่ลบ
+    """
+    expire = getattr(settings, "CHUNKED_UPLOAD_EXPIRE_SECONDS", 24 * 3600)
+    # ไฟล์ที่อัปโหลดตรงไปที่ object storage อยู่ใน blobs/ แล้ว (อาจใช้ร่วมกับคำขออื่น) ถูกลบโดย prune_blobs
+    stale = ChunkedUpload.objects.filter(
+        updated_at__lt=timezone.now() - timedelta(seconds=expire)
+    )
+    removed, _ = stale.delete()
+
+    known = {f"{pk}.part" for pk in ChunkedUpload.objects.values_list("upload_id", flat=True)}
+    cutoff_ts = time.time() - expire
+    with os.scandir(_upload_dir()) as entries:
+        for entry in entries:
+            if entry.name not in known and entry.stat().st_mtime < cutoff_ts:
+                _remove(entry.path)
+    return removed
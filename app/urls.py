@@ -23,15 +23,29 @@ urlpatterns = [
     path('request/<int:request_id>/cancel/', views.cancel_leave_request, name='cancel-request'),
     path('request/<int:request_id>/print/', views.print_leave_request, name='print-request'),
 
+    # --- ไฟล์แนบ/ภาพถ่าย (ตรวจสิทธิ์) ---
+    path('files/request/<int:request_id>/attachment/', views.leave_request_attachment, name='request-attachment'),
+    path('files/in-out/<int:history_id>/<slug:variant>/', views.return_image_view, name='return-image'),
+
+    # --- อัปโหลดไฟล์แนบทีละส่วน ---
+    path('uploads/', views.start_chunked_upload, name='chunked-upload-start'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload_view, name='chunked-upload'),
+    # (OBJECT_STORAGE_CLIENT = InMemoryObjectClient เท่านั้น) ปลายทางของ presigned URL
+    path('object-store/<path:key>', views.object_store_fake, name='object-store-fake'),
+
     # --- URL สำหรับผู้อนุมัติ ---
     path('approval-inbox/', views.approval_inbox, name='approval-inbox'),
     path('approval/process/<int:history_id>/', views.process_approval, name='process-approval'),
+    path('approval/bulk/', views.bulk_approval, name='bulk-approval'),
     
     # --- URL สำหรับ รปภ. ---
     path('security/dashboard/', views.security_dashboard, name='security-dashboard'),
     path('security/record-out/<int:request_id>/', views.record_time_out, name='record-time-out'),
     path('security/record-in/<int:history_id>/', views.record_time_in, name='record-time-in'),
 
+    # --- Real-time events (Server-Sent Events, ต้องรันผ่าน ASGI) ---
+    path('events/', views.live_events_stream, name='live-events'),
+
     # --- START: Visitor Log ---
     path('security/visitor-log-in/', views.visitor_log_in, name='visitor-log-in'),
     path('security/visitor-log-out/<int:log_id>/', views.visitor_log_out, name='visitor-log-out'),
@@ -39,7 +53,13 @@ urlpatterns = [
     # --- URL สำหรับรายงาน (HR/Admin) ---
     path('reports/in-out-history/', views.in_out_history_report, name='in-out-history-report'),
     path('reports/in-out-history/export/', views.export_in_out_history_excel, name='export-in-out-history-excel'),
+    path('reports/export/<slug:dataset>.csv', views.export_report_csv, name='export-report-csv'),
+    path('reports/export/<slug:dataset>.csv.gz', views.export_report_csv, {'compress': True}, name='export-report-csv-gz'),
+    path('reports/jobs/new/', views.create_report_job, name='create-report-job'),
+    path('reports/jobs/<int:job_id>/', views.report_job_view, name='report-job'),
+    path('reports/jobs/<int:job_id>/download/', views.download_report_job, name='download-report-job'),
     path('reports/statistics/', views.statistics_view, name='statistics-view'),
+    path('reports/statistics/<slug:chart>.json', views.statistics_chart_api, name='statistics-chart'),
 
     # --- URL สำหรับการจัดการพนักงาน (สำหรับ HR/Admin) ---
     path('users/', views.employee_list_view, name='employee-list'),
@@ -1,85 +1,68 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
 import requests
 
-def send_notification_email(subject, message_body, recipient, request_obj):
+from .email_sender import EmailBatch
+from .line_client import get_line_client
+
+def send_notification_email(subject, message_body, recipient, request_obj, fail_silently=True):
     """
     ฟังก์ชันสำหรับส่งอีเมลแจ้งเตือน (เวอร์ชันอัปเดต)
     - recipient: รับเป็น Employee object
     - request_obj: รับเป็น LeaveRequest object
+    - fail_silently: ถ้าเป็น False จะโยน Error ออกไป (ให้ notification worker ลองส่งใหม่)
+    ถ้าต้องส่งหลายฉบับพร้อมกัน ให้ใช้ EmailBatch (app/email_sender.py) แทน
+    เพื่อใช้ SMTP connection เดียวกันทั้งหมด
     """
-    try:
-        # ตรวจสอบว่าผู้รับมีอีเมลที่ถูกต้องหรือไม่
-        if not recipient or not recipient.user or not recipient.user.email:
-            print(f"Email not sent: Recipient '{recipient.name}' has no valid email.")
-            return
+    with EmailBatch(fail_silently=fail_silently) as batch:
+        batch.add(subject, message_body, recipient, request_obj)
 
-        # สร้าง context เพื่อส่งไปยัง template
-        context = {
-            'recipient_name': recipient.name,
-            'message_body': message_body,
-            'request_obj': request_obj
-        }
-        
-        # ใช้ template ในการสร้างเนื้อหาอีเมล (เป็น plain text)
-        email_content = render_to_string('app/email/notification_email.txt', context)
-        
-        send_mail(
-            subject=subject,
-            message=email_content, # เนื้อหาหลักตอนนี้คือ plain text
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient.user.email],
-            fail_silently=False,
-        )
-        print(f"Email sent to: {recipient.name} ({recipient.user.email})")
 
-    except Exception as e:
-        print(f"Error sending email: {e}")
+def line_target_id(recipient):
+    """หา LINE User ID ปลายทางของผู้รับ (โหมด DEBUG จะส่งไปที่ LINE_TEST_USER_ID แทน)"""
+    # --- ส่วนที่แก้ไข: ตรวจสอบโหมด DEBUG ---
+    # ถ้า DEBUG = True และมีการตั้งค่า LINE_TEST_USER_ID, ให้ส่งไปที่ ID นั้นแทน
+    if settings.DEBUG and hasattr(settings, 'LINE_TEST_USER_ID') and settings.LINE_TEST_USER_ID:
+        print(f"--- DEBUG MODE: Redirecting Line message for '{recipient.name}' to TEST_USER_ID ---")
+        return settings.LINE_TEST_USER_ID
+    # ------------------------------------
+    # การทำงานปกติ
+    if not recipient or not recipient.line_user_id:
+        print(f"Line not sent: Recipient '{recipient.name}' has no Line User ID.")
+        return None
+    return recipient.line_user_id
 
-def send_notification_line(message, recipient):
+
+def send_notification_line(message, recipient, fail_silently=True):
     """
     ฟังก์ชันสำหรับส่งข้อความแจ้งเตือนไปยัง Line
     - message: ข้อความที่ต้องการส่ง (String)
     - recipient: Employee object ของผู้รับ
+    - fail_silently: ถ้าเป็น False จะโยน Error ออกไป (ให้ notification worker ลองส่งใหม่)
     """
-    target_line_id = None
+    send_notification_line_multicast(message, [recipient], fail_silently=fail_silently)
 
-    # --- ส่วนที่แก้ไข: ตรวจสอบโหมด DEBUG ---
-    # ถ้า DEBUG = True และมีการตั้งค่า LINE_TEST_USER_ID, ให้ส่งไปที่ ID นั้นแทน
-    if settings.DEBUG and hasattr(settings, 'LINE_TEST_USER_ID') and settings.LINE_TEST_USER_ID:
-        target_line_id = settings.LINE_TEST_USER_ID
-        print(f"--- DEBUG MODE: Redirecting Line message for '{recipient.name}' to TEST_USER_ID ---")
-    # ------------------------------------
-    else:
-        # การทำงานปกติ
-        if not recipient or not recipient.line_user_id:
-            print(f"Line not sent: Recipient '{recipient.name}' has no Line User ID.")
-            return
-        target_line_id = recipient.line_user_id
 
-    if not target_line_id:
+def send_notification_line_multicast(message, recipients, fail_silently=True):
+    """
+    ส่งข้อความ Line เดียวกันไปยังผู้รับหลายคน
+    - ผู้รับคนเดียวจะใช้ push, หลายคนจะรวมเป็น multicast (ครั้งละไม่เกิน 500 คน)
+    - ใช้ connection pool เดียวกันทั้ง process (ไม่ต้อง TLS handshake ใหม่ทุกข้อความ)
+    """
+    target_line_ids = [uid for uid in (line_target_id(r) for r in recipients) if uid]
+    if not target_line_ids:
         print("Line not sent: No target user ID found.")
         return
 
     try:
-        url = 'https://api.line.me/v2/bot/message/push'
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {settings.LINE_CHANNEL_ACCESS_TOKEN}'
-        }
-        data = {
-            'to': target_line_id, # <-- ใช้ target_line_id ที่กำหนดไว้
-            'messages': [{'type': 'text', 'text': message}]
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status() # ทำให้เกิด Error ถ้าหาก status code ไม่ใช่ 2xx
-        
-        print(f"Line sent to: {target_line_id}, Status: {response.status_code}")
+        calls = get_line_client().send_text(target_line_ids, message)
+        print(f"Line sent to: {len(set(target_line_ids))} recipient(s) in {calls} call(s)")
 
     except requests.exceptions.RequestException as e:
         print(f"Error sending Line message: {e}")
         # สามารถเพิ่มการ log error ที่ละเอียดขึ้นได้ตามต้องการ
+        if not fail_silently:
+            raise
     except Exception as e:
-        print(f"An unexpected error occurred during Line notification: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred during Line notification: {e}")
+        if not fail_silently:
+            raise
@@ -1,21 +1,45 @@
 # --- Library ---
+import hashlib
 import json
-import os
 from datetime import date
 
-import openpyxl
-
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Q, Count, DateField
-from django.db.models.functions import TruncMonth, Cast
-from django.http import HttpResponse
+from django.db import DatabaseError, transaction
+from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef, Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.middleware.csrf import get_token
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
 
 # --- 4. Local Application Imports ---
+from .counters import employee_dashboard_counters, get_employee_count
+from .exports import (
+    CSV_DATASETS,
+    IN_OUT_HISTORY_HEADERS,
+    XLSX_CONTENT_TYPE,
+    dataset_queryset,
+    dataset_rows,
+    filter_in_out_history,
+    get_report_filters,
+    gzip_stream,
+    in_out_history_page,
+    in_out_history_rows,
+    stream_csv,
+    stream_xlsx,
+    xlsx_too_large,
+)
+from .images import set_return_image
 from .forms import (
     EmployeeCreationForm,
     EmployeeUpdateForm,
@@ -24,8 +48,49 @@ from .forms import (
     CustomPasswordChangeForm,
     DelegationForm,
 )
-from .models import LeaveRequest, Employee, ApprovalHistory, InOutHistory, VisitorLog
-from .utils import send_notification_email, send_notification_line
+from .models import (
+    ChunkedUpload,
+    Department,
+    LeaveRequest,
+    Employee,
+    ApprovalHistory,
+    InOutHistory,
+    ReportJob,
+    VisitorLog,
+)
+from .principal import HR_ADMIN_ROLES
+from .protected_media import can_view_attachment, can_view_return_image, serve_media
+from .site_config import get_site_config, save_site_config
+from .notifications import queue_notification_email, queue_notification_line
+from .live_events import SECURITY_CHANNEL, inbox_channel, stream_events
+from .report_jobs import is_valid_report, request_report_job
+from .statistics_charts import STATISTICS_CHARTS, get_chart_data, get_statistics_filters
+from .search import search_employees
+from .object_storage import (
+    CHECKSUM_HEADER,
+    InMemoryObjectClient,
+    checksum_header_value,
+    get_object_client,
+)
+from .uploads import (
+    UploadError,
+    append_chunk,
+    direct_upload_enabled,
+    start_upload,
+    upload_state,
+    uploaded_file,
+)
+from .workflow import (
+    BULK_DECISIONS,
+    NoApproverError,
+    advance_workflow,
+    claim_request,
+    close_other_tasks,
+    decide_approvals,
+    notify_request_approved,
+    notify_request_rejected,
+    start_workflow,
+)
 
 
 # --- ฟังก์ชันสำหรับตรวจสอบสิทธิ์ ---
@@ -33,7 +98,7 @@ def is_hr_or_admin(user):
     """ตรวจสอบว่าผู้ใช้เป็น HR, Admin, หรือ Superuser หรือไม่"""
     if not hasattr(user, "employee"):
         return user.is_superuser
-    return user.employee.role.role_name.lower() in ["hr", "admin", "safety"]
+    return user.employee.role.role_name.lower() in HR_ADMIN_ROLES
 
 
 def is_security(user):
@@ -55,45 +120,27 @@ def dashboard(request):
     จะแสดงข้อมูลสรุปที่แตกต่างกันไปตามโปรไฟล์และสิทธิ์ของผู้ใช้
     """
     # --- ⬇️ ให้เพิ่ม 2 บรรทัดนี้เข้าไปครับ ⬇️ ---
-    if is_security(request.user):
+    if request.principal.is_security:
         return redirect("app:security-dashboard")
     # --- ⬆️ สิ้นสุดโค้ดที่เพิ่ม ⬆️ ---
 
     if not hasattr(request.user, "employee"):
         messages.error(request, "บัญชีผู้ใช้ของคุณยังไม่ได้ผูกกับโปรไฟล์พนักงาน กรุณาติดต่อฝ่ายบุคคล")
-        is_admin_or_superuser = request.user.is_superuser
-        return render(
-            request,
-            "app/dashboard.html",
-            {
-                "is_approver_or_admin": is_admin_or_superuser,
-                "is_hr_or_admin": is_admin_or_superuser,
-            },
-        )
+        return render(request, "app/dashboard.html")
 
-    employee = request.user.employee
-    my_requests = LeaveRequest.objects.filter(employee=employee)
-    pending_my_approval = ApprovalHistory.objects.filter(
-        approver=employee, status="Pending"
-    )
-    is_approver = employee.role.role_name.lower() in [
-        "manager",
-        "supervisor",
-        "hr",
-        "safety",
-    ]
+    # ตัวนับทั้งหมด (คำขอของฉัน, กล่องงานอนุมัติ) ใน query เดียว
+    # (สิทธิ์สำหรับ Navbar มาจาก request.principal ที่โหลดไว้แล้ว)
+    counters = employee_dashboard_counters(request.user.employee.pk)
 
     context = {
-        "pending_requests_count": my_requests.filter(
-            status__in=["Pending", "Info Requested"]
-        ).count(),
-        "approved_requests_count": my_requests.filter(status="Approved").count(),
-        "rejected_requests_count": my_requests.filter(status="Rejected").count(),
-        "total_employees_count": Employee.objects.count(),
-        "is_approver_or_admin": is_approver or is_hr_or_admin(request.user),
-        "is_hr_or_admin": is_hr_or_admin(request.user),
-        "is_security": is_security(request.user),  # เพิ่ม context สำหรับ security
-        "approval_inbox_count": pending_my_approval.count(),
+        "pending_requests_count": counters.pending_requests_count,
+        "approved_requests_count": counters.approved_requests_count,
+        "rejected_requests_count": counters.rejected_requests_count,
+        # จำนวนพนักงานทั้งหมดอ่านจาก cache (นับใหม่เมื่อมีการเพิ่ม/ลบพนักงาน)
+        "total_employees_count": (
+            get_employee_count() if request.principal.is_hr_or_admin else 0
+        ),
+        "approval_inbox_count": counters.approval_inbox_count,
     }
     return render(request, "app/dashboard.html", context)
 
@@ -102,6 +149,7 @@ def dashboard(request):
 
 
 @login_required
+@transaction.atomic
 def create_leave_request(request):
     """View สำหรับหน้าสร้างคำขออนุญาตออกนอกสถานที่"""
     if not hasattr(request.user, "employee"):
@@ -110,6 +158,11 @@ def create_leave_request(request):
 
     if request.method == "POST":
         employee = request.user.employee
+        try:
+            attachment = uploaded_file(request, "attachment")
+        except UploadError as e:
+            messages.error(request, str(e))
+            return redirect("app:create-request")
 
         leave_request = LeaveRequest.objects.create(
             employee=employee,
@@ -118,76 +171,33 @@ def create_leave_request(request):
             leave_duration=request.POST.get("leave_duration"),
             status="Pending",
             current_approver_role="manager",
-            attachment=request.FILES.get("attachment"),
+            attachment=attachment,
         )
 
         leave_request.refresh_from_db()
 
+        # ส่งไปยังขั้นแรกของ workflow (ผู้รับมอบอำนาจแทนจะได้รับแทนถ้าอยู่ในช่วงมอบอำนาจ)
         try:
-            # 1. ค้นหา Manager (เหมือนเดิม)
-            manager = Employee.objects.get(
-                department=employee.department, role__role_name__iexact="Manager"
-            )
-
-            # --- ⬇️ (เพิ่มตรรกะ Delegation) ⬇️ ---
-            approver_to_assign = manager  # 2. ตั้งค่าผู้อนุมัติตัวจริงไว้ก่อน
-
-            # 3. ตรวจสอบว่า Manager ลาหยุด และ ได้ตั้งค่าตัวแทนไว้หรือไม่
-            today = timezone.now().date()
-
-            if (
-                manager.delegate_approver
-                and manager.delegate_start_date
-                and manager.delegate_end_date
-                and manager.delegate_start_date <= today <= manager.delegate_end_date
-            ):
-                approver_to_assign = manager.delegate_approver
-            # 4. สร้าง History โดยใช้ "ผู้อนุมัติ" ที่ถูกต้อง (approver_to_assign)
-            ApprovalHistory.objects.create(
-                request=leave_request,
-                approver=approver_to_assign,  # ⬅️ (แก้ไข)
-                approval_order=1,
-                status="Pending",
-            )
-            messages.success(
-                request, f"ส่งคำขอสำเร็จ กำลังรอการอนุมัติจาก {approver_to_assign.name}"
-            )  # ⬅️ (แก้ไข)
-
-            # 5. ส่ง Email/Line ไปยัง "ผู้อนุมัติ" ที่ถูกต้อง (approver_to_assign)
-            send_notification_email(
-                subject=f"คำขอใหม่ [{leave_request.request_id}] จากคุณ {employee.name}",
-                message_body=f"มีคำขอออกนอกสถานที่ใหม่จากคุณ {employee.name} รอการอนุมัติจากคุณ",
-                recipient=approver_to_assign,  # ⬅️ (แก้ไข)
-                request_obj=leave_request,
-            )
-
-            # --- (แก้ไข) ---
-            line_message = (
-                f"สวัสดีคุณ {approver_to_assign.name}\n\n"  # ⬅️ (แก้ไข)
-                f"มีคำขอจากคุณ {leave_request.employee.name} รอการอนุมัติจากคุณ\n\n"
-                f"---\n"
-                f"รายละเอียดคำขอ:\n"
-                f"  รหัสคำขอ: {leave_request.request_id}\n"
-                f"  พนักงาน: {leave_request.employee.name}\n"
-                f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
-                f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
-                f"  เหตุผล: {leave_request.reason}\n"
-                f"---"
-            )
-            send_notification_line(line_message, approver_to_assign)  # ⬅️ (แก้ไข)
-            # -----------------
-
-        except Employee.DoesNotExist:
+            step, approvers = start_workflow(leave_request)
+            if leave_request.current_approver_role != "manager":
+                leave_request.save(update_fields=["current_approver_role"])
+            approver_name = approvers[0].name if len(approvers) == 1 else step.label
+            messages.success(request, f"ส่งคำขอสำเร็จ กำลังรอการอนุมัติจาก {approver_name}")
+        except NoApproverError as e:
             leave_request.status = "Rejected"
-            leave_request.reason += "\n[System: ไม่พบผู้จัดการในแผนกนี้]"
+            leave_request.current_approver_role = "completed"
+            leave_request.reason += f"\n[System: ไม่พบ{e.step.label}ในแผนกนี้]"
             leave_request.save()
-            messages.error(request, "ไม่สามารถส่งคำขอได้: ไม่พบผู้จัดการสำหรับแผนกของคุณ")
+            messages.error(
+                request, f"ไม่สามารถส่งคำขอได้: ไม่พบ{e.step.label}สำหรับแผนกของคุณ"
+            )
         return redirect("app:dashboard")
 
     return render(request, "app/create_request_form.html")
 
 
 @login_required
+@transaction.atomic
 def provide_info_view(request, request_id):
     """View สำหรับให้พนักงานส่งข้อมูลเพิ่มเติมตามที่ถูกร้องขอ"""
     leave_request = get_object_or_404(
@@ -199,10 +209,21 @@ def provide_info_view(request, request_id):
         return redirect("app:dashboard")
 
     if request.method == "POST":
+        # จองสิทธิ์ก่อนใช้ไฟล์ที่อัปโหลดไว้ (uploaded_file ลบแถว ChunkedUpload)
+        # ถ้าจองไม่ได้ ไฟล์ยังอยู่ให้ส่งใหม่ได้ และถ้าไฟล์ใช้ไม่ได้ ให้ยกเลิกการจองด้วย
+        if not claim_request(leave_request):
+            messages.error(request, "คำขอนี้ถูกเปลี่ยนแปลงไปแล้ว กรุณาตรวจสอบสถานะอีกครั้ง")
+            return redirect("app:requests-pending")
+        try:
+            attachment = uploaded_file(request, "attachment")
+        except UploadError as e:
+            transaction.set_rollback(True)
+            messages.error(request, str(e))
+            return redirect("app:provide-info", request_id=request_id)
         leave_request.reason = request.POST.get("reason", leave_request.reason)
 
-        if "attachment" in request.FILES:
-            leave_request.attachment = request.FILES["attachment"]
+        if attachment:
+            leave_request.attachment = attachment
 
         leave_request.status = "Pending"
         leave_request.info_request_comment = None
@@ -212,7 +233,7 @@ def provide_info_view(request, request_id):
             request=leave_request, status="Pending"
         ).first()
         if history:
-            send_notification_email(
+            queue_notification_email(
                 subject=f"มีการให้ข้อมูลเพิ่มเติมสำหรับคำขอ [{leave_request.request_id}]",
                 message_body=f"คุณ {leave_request.employee.name} ได้ให้ข้อมูลเพิ่มเติมสำหรับคำขอที่คุณร้องขอแล้ว",
                 recipient=history.approver,
@@ -223,7 +244,7 @@ def provide_info_view(request, request_id):
                 f"สวัสดีคุณ {history.approver.name}\n\n"
                 f"คุณ {leave_request.employee.name} ได้ให้ข้อมูลเพิ่มเติมสำหรับคำขอ [{leave_request.request_id}] แล้ว"
             )
-            send_notification_line(line_message, history.approver)
+            queue_notification_line(line_message, history.approver)
             # -----------------
 
         messages.success(
@@ -236,6 +257,7 @@ def provide_info_view(request, request_id):
 
 
 @login_required
+@transaction.atomic
 def cancel_leave_request(request, request_id):
     """
     View สำหรับให้พนักงาน 'ยกเลิก' คำขอของตนเอง
@@ -258,18 +280,23 @@ def cancel_leave_request(request, request_id):
             messages.error(request, "กรุณาระบุเหตุผลในการยกเลิก")
             return redirect("app:requests-pending")
 
-        # 4. ค้นหาประวัติการอนุมัติ(งาน) ที่ค้างอยู่
-        pending_history = ApprovalHistory.objects.filter(
-            request=leave_request, status="Pending"
-        ).first()  # ค้นหางานที่ค้างอยู่ (อาจจะเป็นของ Manager หรือ Supervisor)
+        # 4. จองสิทธิ์เปลี่ยนคำขอก่อน (ผู้อนุมัติอาจกำลังอนุมัติ/ปฏิเสธคำขอเดียวกันอยู่)
+        if not claim_request(leave_request):
+            messages.error(
+                request, "คำขอนี้ถูกดำเนินการไปแล้วระหว่างที่คุณยกเลิก กรุณาตรวจสอบสถานะอีกครั้ง"
+            )
+            return redirect("app:requests-pending")
 
-        # 5. อัปเดตสถานะ (นี่คือส่วนที่สำคัญที่สุด)
-        if pending_history:
+        # 5. ปิดงานที่ค้างอยู่ (ขั้นที่มีผู้อนุมัติหลายคน เช่น HR/Safety จะมีงานค้างหลายรายการ)
+        now = timezone.now()
+        for pending_history in ApprovalHistory.objects.select_related("approver").filter(
+            request=leave_request, status="Pending"
+        ):
             # 5.1 อัปเดตประวัติที่ค้างอยู่ ให้เป็น 'Rejected'
             pending_history.status = "Rejected"
             pending_history.comment = f"ยกเลิกโดยพนักงาน: {cancel_reason}"
-            pending_history.approval_date = timezone.now().date()
-            pending_history.approval_time = timezone.now().time()
+            pending_history.approval_date = now.date()
+            pending_history.approval_time = now.time()
             pending_history.save()
 
             # 5.2 ส่งแจ้งเตือน (LINE/Email) ไปยังผู้อนุมัติที่ "เคย" ถืองานนั้นอยู่
@@ -279,8 +306,8 @@ def cancel_leave_request(request, request_id):
                 f"จากคุณ {leave_request.employee.name} ได้ถูก 'ยกเลิก' โดยพนักงานแล้ว\n\n"
                 f"เหตุผล: {cancel_reason}"
             )
-            send_notification_line(line_message, pending_history.approver)
-            send_notification_email(
+            queue_notification_line(line_message, pending_history.approver)
+            queue_notification_email(
                 subject=f"คำขอ [{leave_request.request_id}] ถูกยกเลิกโดยพนักงาน",
                 message_body=f"คำขอ [{leave_request.request_id}] จากคุณ {leave_request.employee.name} ได้ถูกยกเลิกแล้ว\nเหตุผล: {cancel_reason}",
                 recipient=pending_history.approver,
@@ -288,9 +315,10 @@ def cancel_leave_request(request, request_id):
             )
 
         # 5.3 อัปเดตคำขอหลัก (LeaveRequest) ให้เป็น 'Rejected'
+        # (ไม่บันทึก version ทับ: claim_request เพิ่ม version ในฐานข้อมูลไปแล้ว)
         leave_request.status = "Rejected"
         leave_request.current_approver_role = "completed"  # ปิดกระบวนการ
-        leave_request.save()
+        leave_request.save(update_fields=["status", "current_approver_role"])
 
         messages.success(
             request, f"คำขอ # {leave_request.request_id} ได้ถูกยกเลิกเรียบร้อยแล้ว"
@@ -366,6 +394,7 @@ def rejected_requests_view(request):
 
 
 # --- ส่วนของผู้อนุมัติ (Approvers) ---
+APPROVAL_INBOX_PAGE_SIZE = 25
 
 
 @login_required
@@ -373,24 +402,65 @@ def approval_inbox(request):
     if not hasattr(request.user, "employee"):
         messages.error(request, "คุณไม่มีโปรไฟล์พนักงานสำหรับเข้าถึงหน้านี้")
         return redirect("app:dashboard")
-    pending_list = ApprovalHistory.objects.filter(
-        approver=request.user.employee, status="Pending"
-    ).order_by("request__request_datetime")
-    context = {"pending_list": pending_list}
+    # โหลดคำขอ, พนักงาน, แผนก และประวัติการอนุมัติ (พร้อมผู้อนุมัติ) ล่วงหน้า
+    # จำนวน query ต่อหน้าจึงคงที่ ไม่ว่าจะมีรายการในกล่องงานมากแค่ไหน
+    pending_list = (
+        ApprovalHistory.objects.filter(approver=request.user.employee, status="Pending")
+        .select_related("request__employee__department")
+        .prefetch_related(
+            Prefetch(
+                "request__approvalhistory_set",
+                queryset=ApprovalHistory.objects.select_related("approver__role").order_by(
+                    "approval_order", "approval_date"
+                ),
+                to_attr="prefetched_approval_history",
+            )
+        )
+        # เรียงแบบคงที่ (request_datetime ซ้ำกันได้ จึงใช้ history_id ต่อท้าย)
+        .order_by("request__request_datetime", "history_id")
+    )
+    paginator = Paginator(pending_list, APPROVAL_INBOX_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    # ใช้จำนวนจาก paginator เป็นตัวเลข badge บน Navbar (ไม่ต้อง COUNT ซ้ำ)
+    request.principal.approval_inbox_count = paginator.count
+
+    context = {
+        "pending_list": page_obj.object_list,
+        "page_obj": page_obj,
+    }
     return render(request, "app/approval_inbox.html", context)
 
 
 @login_required
+@transaction.atomic
 def process_approval(request, history_id):
-    history = get_object_or_404(
-        ApprovalHistory, history_id=history_id, approver=request.user.employee
+    # อ่านงานและคำขอ (รวม version) ใน query เดียว เพื่อให้ version ตรงกับสถานะของงานที่อ่านมา
+    history = (
+        ApprovalHistory.objects.select_related("request")
+        .filter(history_id=history_id, approver=request.user.employee)
+        .first()
     )
-    leave_request = history.request
 
     if request.method == "POST":
         decision = request.POST.get("decision")
         comment = request.POST.get("comment", "")
 
+        # version ที่ผู้อนุมัติเห็นตอนเปิดหน้า (ถ้าไม่ส่งมา ใช้ค่าที่เพิ่งอ่าน)
+        version = request.POST.get("version", "")
+        if (
+            history is None
+            or history.status != "Pending"
+            or not claim_request(history.request, int(version) if version.isdigit() else None)
+        ):
+            # งานถูกลบ/ตัดสินไปแล้ว หรือคำขอถูกเปลี่ยนโดยผู้อื่นหลังจากเปิดหน้า (เช่น HR กับ Safety กดพร้อมกัน)
+            messages.warning(
+                request,
+                "คำขอนี้ถูกดำเนินการไปแล้ว (อาจโดยผู้อนุมัติท่านอื่น) กรุณาตรวจสอบกล่องงานอีกครั้ง",
+            )
+            return redirect("app:approval-inbox")
+        leave_request = history.request
+
         if decision == "request_info":
             leave_request.status = "Info Requested"
             leave_request.info_request_comment = comment
@@ -405,7 +475,7 @@ def process_approval(request, history_id):
             email_message_body = (
                 f"ผู้อนุมัติของคุณต้องการข้อมูลเพิ่มเติมสำหรับคำขอของคุณ เหตุผล: {comment}"
             )
-            send_notification_email(
+            queue_notification_email(
                 subject=f"ต้องการข้อมูลเพิ่มเติมสำหรับคำขอ [{leave_request.request_id}]",
                 message_body=email_message_body,
                 recipient=leave_request.employee,
@@ -417,7 +487,7 @@ def process_approval(request, history_id):
                 f"ผู้อนุมัติต้องการข้อมูลเพิ่มเติมสำหรับคำขอ [{leave_request.request_id}]\n"
                 f"เหตุผล: {comment}"
             )
-            send_notification_line(line_message, leave_request.employee)
+            queue_notification_line(line_message, leave_request.employee)
             # -----------------
 
             return redirect("app:approval-inbox")
@@ -428,171 +498,87 @@ def process_approval(request, history_id):
 
         if decision == "approve":
             history.status = "Approved"
-            if history.approval_order == 1:  # Manager
-                try:
-                    # 1. ค้นหา Supervisor (เหมือนเดิม)
-                    supervisor = Employee.objects.get(
-                        department=leave_request.employee.department,
-                        role__role_name__iexact="Supervisor",
-                    )
-
-                    # --- ⬇️ (เพิ่มตรรกะ Delegation) ⬇️ ---
-                    approver_to_assign = supervisor  # 2. ตั้งค่าตัวจริง
-
-                    # (สันนิษฐานว่าคุณได้เพิ่มฟิลด์ is_on_leave และ delegate_approver ใน Model แล้ว)
-                    if supervisor.is_on_leave and supervisor.delegate_approver:
-                        approver_to_assign = supervisor.delegate_approver
-                    # --- ⬆️ (สิ้นสุดตรรกะ) ⬆️ ---
-
-                    leave_request.current_approver_role = "supervisor"
-
-                    # 3. สร้าง History และส่งแจ้งเตือนไปยัง approver_to_assign
-                    ApprovalHistory.objects.create(
-                        request=leave_request,
-                        approver=approver_to_assign,  # ⬅️ (แก้ไข)
-                        approval_order=2,
-                        status="Pending",
-                    )
+            try:
+                step, approvers = advance_workflow(leave_request, history)
+            except NoApproverError as e:
+                leave_request.status = "Rejected"
+                leave_request.current_approver_role = "completed"
+                messages.error(request, f"ไม่พบ {e.step.label} คำขอจึงถูกยกเลิก")
+            else:
+                if step is not None:
+                    approver_name = approvers[0].name if len(approvers) == 1 else step.label
                     messages.success(
                         request,
-                        f"อนุมัติคำขอ ID: {leave_request.request_id} สำเร็จ ส่งต่อไปยัง {approver_to_assign.name}",  # ⬅️ (แก้ไข)
-                    )
-
-                    email_message_body = (
-                        f"มีคำขอจากคุณ {leave_request.employee.name} รอการอนุมัติจากคุณ"
+                        f"อนุมัติคำขอ ID: {leave_request.request_id} สำเร็จ ส่งต่อไปยัง {approver_name}",
                     )
-                    send_notification_email(
-                        subject=f"คำขอ [{leave_request.request_id}] รอการอนุมัติจากคุณ",
-                        message_body=email_message_body,
-                        recipient=approver_to_assign,  # ⬅️ (แก้ไข)
-                        request_obj=leave_request,
-                    )
-                    # --- (แก้ไข) ---
-                    line_message = (
-                        f"สวัสดีคุณ {approver_to_assign.name}\n\n"  # ⬅️ (แก้ไข)
-                        f"มีคำขอจากคุณ {leave_request.employee.name} รอการอนุมัติจากคุณ\n\n"
-                        f"---\n"
-                        f"รายละเอียดคำขอ:\n"
-                        f"  รหัสคำขอ: {leave_request.request_id}\n"
-                        f"  พนักงาน: {leave_request.employee.name}\n"
-                        f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
-                        f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
-                        f"  เหตุผล: {leave_request.reason}\n"
-                        f"---"
-                    )
-                    send_notification_line(line_message, approver_to_assign)  # ⬅️ (แก้ไข)
-                    # -----------------
-                except Employee.DoesNotExist:
-                    leave_request.status = "Rejected"
-                    leave_request.current_approver_role = "completed"
-                    messages.error(request, "ไม่พบ Supervisor ในแผนก คำขอจึงถูกยกเลิก")
-
-            elif history.approval_order == 2:  # Supervisor
-                hr_and_safety = Employee.objects.filter(
-                    Q(role__role_name__iexact="hr")
-                    | Q(role__role_name__iexact="safety")
-                )
-                if hr_and_safety.exists():
-                    leave_request.current_approver_role = "hr_safety"
+                else:
                     messages.success(
                         request,
-                        f"อนุมัติคำขอ ID: {leave_request.request_id} สำเร็จ ส่งต่อไปยัง HR/Safety",
+                        f"การอนุมัติสำหรับคำขอ ID: {leave_request.request_id} เสร็จสมบูรณ์",
                     )
-                    for approver in hr_and_safety:
-                        ApprovalHistory.objects.create(
-                            request=leave_request,
-                            approver=approver,
-                            approval_order=3,
-                            status="Pending",
-                        )
-                        email_message_body = f"มีคำขอจากคุณ {leave_request.employee.name} รอการอนุมัติจากแผนกของท่าน"
-                        send_notification_email(
-                            subject=f"คำขอ [{leave_request.request_id}] รอการอนุมัติจาก HR/Safety",
-                            message_body=email_message_body,
-                            recipient=approver,
-                            request_obj=leave_request,
-                        )
-                        # --- Send Line ---
-                        line_message = (
-                            f"สวัสดีคุณ {approver.name}\n\n"
-                            f"มีคำขอจากคุณ {leave_request.employee.name} รอการอนุมัติจากแผนกของท่าน\n\n"
-                            f"---\n"
-                            f"รายละเอียดคำขอ:\n"
-                            f"  รหัสคำขอ: {leave_request.request_id}\n"
-                            f"  พนักงาน: {leave_request.employee.name}\n"
-                            f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
-                            f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
-                            f"  เหตุผล: {leave_request.reason}\n"
-                            f"---"
-                        )
-                        send_notification_line(line_message, approver)
-                        # -----------------
-                else:
-                    leave_request.status = "Rejected"
-                    leave_request.current_approver_role = "completed"
-                    messages.error(request, "ไม่พบตำแหน่ง HR หรือ Safety คำขอจึงถูกยกเลิก")
-
-            elif history.approval_order == 3:  # HR or Safety
-                leave_request.status = "Approved"
-                leave_request.current_approver_role = "completed"
-                ApprovalHistory.objects.filter(
-                    request=leave_request, status="Pending"
-                ).delete()
-                messages.success(
-                    request,
-                    f"การอนุมัติสำหรับคำขอ ID: {leave_request.request_id} เสร็จสมบูรณ์",
-                )
-                send_notification_email(
-                    subject=f"คำขอ [{leave_request.request_id}] ของคุณได้รับการอนุมัติแล้ว",
-                    message_body="ยินดีด้วย! คำขอออกนอกสถานที่ของคุณได้รับการอนุมัติอย่างสมบูรณ์แล้ว",
-                    recipient=leave_request.employee,
-                    request_obj=leave_request,
-                )
-                # --- Send Line ---
-                line_message = (
-                    f"สวัสดีคุณ {leave_request.employee.name}\n\n"
-                    f"ยินดีด้วย! คำขอออกนอกสถานที่ของคุณได้รับการอนุมัติแล้ว\n\n"
-                    f"---\n"
-                    f"รายละเอียดคำขอ:\n"
-                    f"  รหัสคำขอ: {leave_request.request_id}\n"
-                    f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
-                    f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
-                    f"---"
-                )
-                send_notification_line(line_message, leave_request.employee)
-                # -----------------
+                    notify_request_approved(leave_request)
 
         elif decision == "reject":
             history.status = "Rejected"
             leave_request.status = "Rejected"
             leave_request.current_approver_role = "completed"
             messages.warning(request, f"คุณได้ปฏิเสธคำขอ ID: {leave_request.request_id}")
-            email_message_body = f"คำขอออกนอกสถานที่ของคุณถูกปฏิเสธโดยผู้อนุมัติ เหตุผล: {comment}"
-            send_notification_email(
-                subject=f"คำขอ [{leave_request.request_id}] ของคุณถูกปฏิเสธ",
-                message_body=email_message_body,
-                recipient=leave_request.employee,
-                request_obj=leave_request,
-            )
-            # --- Send Line ---
-            line_message = (
-                f"สวัสดีคุณ {leave_request.employee.name}\n\n"
-                f"คำขอออกนอกสถานที่ของคุณถูกปฏิเสธ\n\n"
-                f"---\n"
-                f"รายละเอียดคำขอ:\n"
-                f"  รหัสคำขอ: {leave_request.request_id}\n"
-                f"  ผู้ปฏิเสธ: คุณ {history.approver.name}\n"
-                f"  เหตุผล: {comment if comment else 'ไม่ได้ระบุ'}\n"
-                f"---"
-            )
-            send_notification_line(line_message, leave_request.employee)
-            # -----------------
+            close_other_tasks(leave_request, history)
+            notify_request_rejected(leave_request, history.approver, comment)
 
         leave_request.save()
         history.save()
     return redirect("app:approval-inbox")
 
 
+@login_required
+def bulk_approval(request):
+    """
+    อนุมัติ/ปฏิเสธหลายรายการจากกล่องงานในครั้งเดียว
+    - history_ids: รายการที่เลือก (หรือ scope=all = ทุกรายการที่รอการอนุมัติจากผู้ใช้)
+    - decision: approve / reject, comment ใช้กับทุกรายการ
+    """
+    if request.method != "POST" or not hasattr(request.user, "employee"):
+        return redirect("app:approval-inbox")
+
+    decision = request.POST.get("decision")
+    if decision not in BULK_DECISIONS:
+        messages.error(request, "ไม่รองรับการดำเนินการที่เลือก")
+        return redirect("app:approval-inbox")
+
+    approver = request.user.employee
+    if request.POST.get("scope") == "all":
+        history_ids = ApprovalHistory.objects.filter(
+            approver=approver, status="Pending"
+        ).values_list("history_id", flat=True)
+    else:
+        history_ids = [
+            int(value) for value in request.POST.getlist("history_ids") if value.isdigit()
+        ]
+    if not history_ids:
+        messages.warning(request, "กรุณาเลือกรายการที่ต้องการดำเนินการ")
+        return redirect("app:approval-inbox")
+
+    result = decide_approvals(
+        approver, history_ids, decision, request.POST.get("comment", "")
+    )
+    if decision == "approve":
+        messages.success(
+            request,
+            f"อนุมัติแล้ว {result['forwarded'] + result['completed']} รายการ "
+            f"(ส่งต่อ {result['forwarded']}, เสร็จสมบูรณ์ {result['completed']})",
+        )
+    else:
+        messages.warning(request, f"ปฏิเสธแล้ว {result['rejected']} รายการ")
+    if result["cancelled"]:
+        messages.error(
+            request, f"ยกเลิก {result['cancelled']} รายการ เนื่องจากไม่พบผู้อนุมัติขั้นถัดไป"
+        )
+    if result["skipped"]:
+        messages.info(request, f"ข้าม {result['skipped']} รายการที่ถูกดำเนินการไปแล้ว")
+    return redirect("app:approval-inbox")
+
+
 @login_required
 def profile_edit_view(request):
     """
@@ -617,29 +603,8 @@ def profile_edit_view(request):
         # ส่ง instance ของ employee เข้าไป เพื่อให้ฟอร์มดึงข้อมูลปัจจุบันมาแสดง
         form = UserProfileForm(instance=employee)
 
-    # Context ที่จำเป็นสำหรับ base.html (Navbar)
-    # (จำเป็นต้องมีเพื่อให้เมนูแสดงผลถูกต้อง)
-    try:
-        is_approver = employee.role.role_name.lower() in [
-            "manager",
-            "supervisor",
-            "hr",
-            "safety",
-        ]
-        approval_inbox_count = ApprovalHistory.objects.filter(
-            approver=employee, status="Pending"
-        ).count()
-    except Exception:
-        is_approver = False
-        approval_inbox_count = 0
-
-    context = {
-        "form": form,
-        "is_hr_or_admin": is_hr_or_admin(request.user),
-        "is_security": is_security(request.user),
-        "is_approver_or_admin": is_approver or is_hr_or_admin(request.user),
-        "approval_inbox_count": approval_inbox_count,
-    }
+    # (Context ของ Navbar มาจาก context processor load_principal_flags)
+    context = {"form": form}
     return render(request, "app/profile_edit.html", context)
 
 
@@ -740,28 +705,10 @@ def profile_edit_view(request):
                 # ตัวฟอร์ม `password_form` จะแสดง error ของมันเอง (เช่น รหัสเก่าผิด, รหัสใหม่ไม่ตรงกัน)
                 pass
 
-    # Context ที่จำเป็นสำหรับ base.html (Navbar)
-    try:
-        is_approver = employee.role.role_name.lower() in [
-            "manager",
-            "supervisor",
-            "hr",
-            "safety",
-        ]
-        approval_inbox_count = ApprovalHistory.objects.filter(
-            approver=employee, status="Pending"
-        ).count()
-    except Exception:
-        is_approver = False
-        approval_inbox_count = 0
-
+    # (Context ของ Navbar มาจาก context processor load_principal_flags)
     context = {
         "profile_form": profile_form,  # ⬅️ ส่งฟอร์มที่ 1
         "password_form": password_form,  # ⬅️ ส่งฟอร์มที่ 2
-        "is_hr_or_admin": is_hr_or_admin(request.user),
-        "is_security": is_security(request.user),
-        "is_approver_or_admin": is_approver or is_hr_or_admin(request.user),
-        "approval_inbox_count": approval_inbox_count,
     }
     return render(request, "app/profile_edit.html", context)
 
@@ -774,18 +721,24 @@ def security_dashboard(request):
     View สำหรับ Security Dashboard
     (อัปเดต: เพิ่มการดึงข้อมูล Visitor Log)
     """
-    today = timezone.now().date()
+    # ใช้วันที่ตามเวลาท้องถิ่น (Asia/Bangkok) ไม่ใช่วันที่ UTC
+    today = timezone.localdate()
 
-    recorded_request_ids = InOutHistory.objects.values_list("request_id", flat=True)
+    # คำขอที่อนุมัติแล้วของวันนี้ และยังไม่มีการบันทึกเวลาออก (NOT EXISTS)
+    # - ใช้ index (leave_date, status) เลือกเฉพาะคำขอของวันนี้
+    # - ตรวจ InOutHistory ผ่าน index ของ request_id ทีละคำขอ ไม่ต้องโหลดประวัติทั้งตาราง
     ready_to_leave_requests = (
         LeaveRequest.objects.filter(leave_date=today, status="Approved")
-        .exclude(request_id__in=recorded_request_ids)
+        .filter(~Exists(InOutHistory.objects.filter(request=OuterRef("pk"))))
+        .select_related("employee__department")
         .order_by("employee__name")
     )
 
-    already_out_list = InOutHistory.objects.filter(
-        request__leave_date=today, status="OUT"
-    ).order_by("time_out")
+    already_out_list = (
+        InOutHistory.objects.filter(request__leave_date=today, status="OUT")
+        .select_related("employee", "request")
+        .order_by("time_out")
+    )
 
     # --- START: ส่วนที่เพิ่มเข้ามา ---
     # ดึงรายชื่อบุคคลภายนอกที่ยังอยู่ในพื้นที่ (ยังไม่ time_out)
@@ -796,7 +749,6 @@ def security_dashboard(request):
         "ready_to_leave_requests": ready_to_leave_requests,
         "already_out_list": already_out_list,
         "today_date": today,
-        "is_security": True,
         "visitors_inside": visitors_inside,  # <-- ส่งข้อมูลใหม่ไปที่ Template
     }
     return render(request, "app/security_dashboard.html", context)
@@ -820,6 +772,46 @@ def record_time_out(request, request_id):
     return redirect("app:security-dashboard")
 
 
+async def live_events_stream(request):
+    """
+    ช่องทาง Server-Sent Events (text/event-stream) สำหรับอัปเดตหน้าจอแบบ real-time
+    - รปภ. ได้รับ event ของ Security Dashboard
+    - ผู้อนุมัติได้รับจำนวนงานรออนุมัติล่าสุดสำหรับ badge ใน Navbar
+    ต้องรันผ่าน ASGI (leave/asgi.py) เท่านั้น ถ้ารันแบบ WSGI จะตอบ 204 ให้ browser เลิกเชื่อมต่อ
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        # WSGI ต้องใช้ thread หนึ่งตัวค้างไว้ต่อหนึ่ง connection ตลอดเวลา จึงไม่เปิดให้ใช้
+        return HttpResponse(status=204)
+
+    principal = request.principal
+    channels = []
+    if principal.is_security:
+        channels.append(SECURITY_CHANNEL)
+    if principal.employee is not None and principal.is_approver_or_admin:
+        channels.append(inbox_channel(principal.employee.employee_id))
+    if not channels:
+        return HttpResponse(status=204)
+
+    async def initial_events():
+        if principal.employee is None or not principal.is_approver_or_admin:
+            return []
+        count = await ApprovalHistory.objects.filter(
+            approver=principal.employee, status="Pending"
+        ).acount()
+        return [{"type": "inbox.count", "data": {"count": count}}]
+
+    response = StreamingHttpResponse(
+        stream_events(channels, csrf_token=get_token(request), initial=initial_events),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # ไม่ให้ nginx พัก (buffer) ข้อมูลไว้
+    return response
+
+
 # --- START: เพิ่ม 2 ฟังก์ชันใหม่สำหรับ Visitor Log ---
 
 
@@ -872,11 +864,17 @@ def visitor_log_out(request, log_id):
 def record_time_in(request, history_id):
     if request.method == "POST":
         history = get_object_or_404(InOutHistory, history_id=history_id)
+        try:
+            return_image = uploaded_file(request, "return_image")
+        except UploadError as e:
+            messages.error(request, str(e))
+            return redirect("app:security-dashboard")
         history.time_in = timezone.now()
         history.status = "COMPLETED"
 
-        if "return_image" in request.FILES:
-            history.return_image = request.FILES["return_image"]
+        if return_image:
+            # ย่อภาพ/ตัด EXIF ภายหลังโดย image_worker (ตอบกลับทันที ไม่ประมวลผลภาพใน request)
+            set_return_image(history, return_image)
 
         history.save()
         messages.success(
@@ -885,26 +883,139 @@ def record_time_in(request, history_id):
     return redirect("app:security-dashboard")
 
 
+# --- ไฟล์แนบ / ภาพถ่าย (ตรวจสิทธิ์ก่อนส่งไฟล์ ดู app/protected_media.py) ---
+# <variant> ใน URL ของภาพถ่ายการกลับเข้า -> field
+RETURN_IMAGE_VARIANTS = {
+    "original": "return_image",
+    "display": "return_image_display",
+    "thumb": "return_image_thumb",
+}
+
+
+@login_required
+def leave_request_attachment(request, request_id):
+    leave_request = get_object_or_404(LeaveRequest, request_id=request_id)
+    # ไม่มีสิทธิ์ -> 404 (ไม่บอกว่ามีคำขอนี้อยู่)
+    if not can_view_attachment(request.principal, leave_request):
+        raise Http404("ไม่พบไฟล์")
+    return serve_media(request, leave_request.attachment)
+
+
+@login_required
+def return_image_view(request, history_id, variant):
+    if variant not in RETURN_IMAGE_VARIANTS:
+        raise Http404("ไม่พบไฟล์")
+    history = get_object_or_404(InOutHistory, history_id=history_id)
+    if not can_view_return_image(request.principal, history):
+        raise Http404("ไม่พบไฟล์")
+    # ภาพย่อยังไม่ถูกสร้าง (image_worker ยังไม่ทำ/ไม่สำเร็จ): ส่งภาพต้นฉบับแทน
+    return serve_media(
+        request, getattr(history, RETURN_IMAGE_VARIANTS[variant]) or history.return_image
+    )
+
+
+# --- อัปโหลดไฟล์แนบทีละส่วน (ดู app/uploads.py) ---
+
+
+@login_required
+def start_chunked_upload(request):
+    """เริ่มอัปโหลดไฟล์ (filename, size) คืนค่า upload_id สำหรับส่ง chunk"""
+    if request.method != "POST":
+        return JsonResponse({"error": "method not allowed"}, status=405)
+    try:
+        upload = start_upload(
+            request.user,
+            request.POST.get("filename"),
+            request.POST.get("size"),
+            request.POST.get("content_type"),
+            request.POST.get("sha256"),
+        )
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(upload_state(upload), status=201)
+
+
+@login_required
+def chunked_upload_view(request, upload_id):
+    """GET: ตำแหน่งที่ได้รับแล้ว (สำหรับอัปโหลดต่อ), POST: รับ chunk ถัดไป"""
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, owner=request.user)
+    if request.method == "POST":
+        try:
+            # อ่านข้อมูลจาก request โดยตรง (ไม่โหลดทั้ง body เข้าหน่วยความจำ)
+            append_chunk(
+                upload,
+                request.headers.get("X-Upload-Offset"),
+                request.headers.get("X-Chunk-SHA256"),
+                request,
+                request.headers.get("Content-Length"),
+            )
+        except UploadError as e:
+            return JsonResponse({"error": str(e), **upload_state(upload)}, status=e.status)
+    return JsonResponse(upload_state(upload))
+
+
+@csrf_exempt
+def object_store_fake(request, key):
+    """
+    ปลายทางของ presigned URL เมื่อใช้ InMemoryObjectClient (ทดสอบ/พัฒนาเท่านั้น)
+    ตรวจลายเซ็นใน URL แทนการ login เหมือน object storage จริง
+    """
+    client = get_object_client() if direct_upload_enabled() else None
+    if not isinstance(client, InMemoryObjectClient):
+        raise Http404()
+    expires_at = request.GET.get("expires", "")
+    length = request.GET.get("length", "")
+    checksum = request.GET.get("checksum", "")
+    signature = InMemoryObjectClient.signature(
+        request.method, key, expires_at, length, checksum
+    )
+    if (
+        not constant_time_compare(signature, request.GET.get("signature", ""))
+        or int(expires_at or 0) < timezone.now().timestamp()
+        or request.headers.get(CHECKSUM_HEADER, "") != checksum
+    ):
+        return HttpResponse(status=403)
+
+    if request.method == "PUT":
+        data = request.read()
+        if length and len(data) != int(length):
+            return HttpResponse(status=400)
+        # เหมือน S3 (BadDigest): เนื้อหาต้องตรงกับ SHA-256 ที่ลงชื่อไว้
+        if checksum and checksum_header_value(hashlib.sha256(data).hexdigest()) != checksum:
+            return HttpResponse(status=400)
+        client.put_object(
+            key, data, len(data), request.content_type or "application/octet-stream"
+        )
+        return HttpResponse(status=200)
+    try:
+        data = b"".join(client.get_object(key))
+    except FileNotFoundError:
+        raise Http404()
+    return HttpResponse(data, content_type=client.content_type(key))
+
+
 # --- ส่วนของรายงาน (HR/Admin) ---
+IN_OUT_HISTORY_PAGE_SIZE = 50
+
+
 @login_required
 @user_passes_test(is_hr_or_admin, login_url="/")
 def in_out_history_report(request):
-    history_list = InOutHistory.objects.all().order_by("-time_out")
-    search_query = request.GET.get("search_query", "")
-    start_date = request.GET.get("start_date", "")
-    end_date = request.GET.get("end_date", "")
-    if search_query:
-        history_list = history_list.filter(employee__name__icontains=search_query)
-    if start_date:
-        history_list = history_list.filter(time_out__date__gte=start_date)
-    if end_date:
-        history_list = history_list.filter(time_out__date__lte=end_date)
+    filters = get_report_filters(request.GET)
+    history_list = filter_in_out_history(
+        InOutHistory.objects.select_related("employee__department", "guard"), filters
+    )
+    page = in_out_history_page(
+        history_list,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        page_size=IN_OUT_HISTORY_PAGE_SIZE,
+    )
     context = {
-        "history_list": history_list,
-        "search_query": search_query,
-        "start_date": start_date,
-        "end_date": end_date,
-        "is_hr_or_admin": True,
+        "history_list": page["rows"],
+        "next_cursor": page["next_cursor"],
+        "previous_cursor": page["previous_cursor"],
+        **filters,
     }
     return render(request, "app/in_out_history_report.html", context)
 
@@ -912,87 +1023,168 @@ def in_out_history_report(request):
 @login_required
 @user_passes_test(is_hr_or_admin, login_url="/")
 def export_in_out_history_excel(request):
-    history_list = InOutHistory.objects.all().order_by("-time_out")
-    search_query = request.GET.get("search_query", "")
-    start_date = request.GET.get("start_date", "")
-    end_date = request.GET.get("end_date", "")
-
-    if search_query:
-        history_list = history_list.filter(employee__name__icontains=search_query)
-    if start_date:
-        history_list = history_list.filter(time_out__date__gte=start_date)
-    if end_date:
-        history_list = history_list.filter(time_out__date__lte=end_date)
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "InOut History Report"
-
-    headers = ["ชื่อพนักงาน", "แผนก", "วันที่", "เวลาออก", "เวลากลับ", "ผู้บันทึก (รปภ.)"]
-    ws.append(headers)
-
-    for history in history_list:
-        time_in_str = (
-            history.time_in.strftime("%H:%M:%S") if history.time_in else "ยังไม่กลับ"
+    """
+    Export รายงานการเข้า-ออกเป็น Excel
+    ไฟล์ต้องสร้างเสร็จทั้งไฟล์ก่อนจึงเริ่มส่งได้ (ดู app/exports.py)
+    ถ้าจำนวนแถวเกิน EXPORT_XLSX_MAX_ROWS จะส่งไปสร้างเบื้องหลังแล้วพาไปหน้าติดตามสถานะแทน
+    """
+    filters = get_report_filters(request.GET)
+    history_list = filter_in_out_history(
+        InOutHistory.objects.all(), filters
+    )
+    if xlsx_too_large(history_list):
+        job, _ = request_report_job(
+            "in-out-history", "xlsx", filters,
+            requested_by=request.principal.employee,
         )
-        row = [
-            history.employee.name,
-            history.employee.department.department_name,
-            history.time_out.strftime("%d/%m/%Y"),
-            history.time_out.strftime("%H:%M:%S"),
-            time_in_str,
-            history.guard.name,
-        ]
-        ws.append(row)
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        messages.info(request, "ข้อมูลมีจำนวนมาก ระบบจะสร้างไฟล์ Excel เบื้องหลังแล้วให้ดาวน์โหลดเมื่อเสร็จ")
+        return redirect("app:report-job", job_id=job.job_id)
+
+    response = StreamingHttpResponse(
+        stream_xlsx(
+            "InOut History Report",
+            IN_OUT_HISTORY_HEADERS,
+            in_out_history_rows(history_list),
+        ),
+        content_type=XLSX_CONTENT_TYPE,
     )
     response["Content-Disposition"] = (
         'attachment; filename="in_out_history_report.xlsx"'
     )
-    wb.save(response)
     return response
 
 
+@login_required
+@user_passes_test(is_hr_or_admin, login_url="/")
+def export_report_csv(request, dataset, compress=False):
+    """
+    Export ข้อมูล (in-out-history, visitor-log, leave-requests, approval-history)
+    เป็น CSV หรือ CSV.GZ แบบ streaming ใช้ตัวกรองเดียวกับหน้ารายงาน
+    """
+    if dataset not in CSV_DATASETS:
+        raise Http404("ไม่พบชุดข้อมูลที่ต้องการ Export")
+
+    spec = CSV_DATASETS[dataset]
+    headers, rows = dataset_rows(
+        spec, dataset_queryset(spec, get_report_filters(request.GET))
+    )
+    content = stream_csv(headers, rows)
+    filename = f"{dataset.replace('-', '_')}.csv"
+    if compress:
+        content = gzip_stream(content)
+        filename += ".gz"
+        content_type = "application/gzip"
+    else:
+        content_type = "text/csv; charset=utf-8"
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@user_passes_test(is_hr_or_admin, login_url="/")
+def create_report_job(request):
+    """
+    ขอสร้างไฟล์รายงานเบื้องหลัง (ใช้ตัวกรองเดียวกับหน้ารายงาน) แล้วพาไปหน้าติดตามสถานะ
+    ถ้ามีไฟล์ที่ตัวกรองเหมือนกันและยังไม่หมดอายุ จะใช้ไฟล์นั้นทันที
+    """
+    if request.method != "POST":
+        return redirect("app:in-out-history-report")
+
+    dataset = request.POST.get("dataset", "in-out-history")
+    file_format = request.POST.get("file_format", "xlsx")
+    if not is_valid_report(dataset, file_format):
+        messages.error(request, "ไม่รองรับรูปแบบรายงานที่เลือก")
+        return redirect("app:in-out-history-report")
+
+    job, created = request_report_job(
+        dataset,
+        file_format,
+        get_report_filters(request.POST),
+        requested_by=request.principal.employee,
+    )
+    if not created:
+        messages.info(request, "มีรายงานที่ใช้ตัวกรองเดียวกันอยู่แล้ว ระบบจะใช้รายงานนั้นแทน")
+    return redirect("app:report-job", job_id=job.job_id)
+
+
+@login_required
+@user_passes_test(is_hr_or_admin, login_url="/")
+def report_job_view(request, job_id):
+    """หน้าแสดงความคืบหน้า และลิงก์ดาวน์โหลดเมื่อรายงานพร้อม"""
+    job = get_object_or_404(ReportJob, job_id=job_id)
+    context = {
+        "job": job,
+        "recent_jobs": ReportJob.objects.select_related("requested_by").order_by(
+            "-created_at"
+        )[:10],
+    }
+    return render(request, "app/report_job.html", context)
+
+
+@login_required
+@user_passes_test(is_hr_or_admin, login_url="/")
+def download_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, job_id=job_id, status="Done")
+    if not job.file:
+        raise Http404("ไม่พบไฟล์รายงาน")
+    return serve_media(
+        request,
+        job.file,
+        as_attachment=True,
+        filename=f"{job.dataset.replace('-', '_')}.{job.file_format}",
+    )
+
+
 # --- ส่วนของการจัดการพนักงาน (HR/Admin) ---
+EMPLOYEE_LIST_PAGE_SIZE = 50
+# ค่า ?sort= ที่อนุญาต -> field ที่ใช้เรียง
+EMPLOYEE_SORT_FIELDS = {
+    "employee_id": "employee_id",
+    "user__username": "user__username",
+    "name": "name",
+}
 
 
 @login_required
 @user_passes_test(is_hr_or_admin, login_url="/")
 def employee_list_view(request):
-    # --- START: ส่วนที่อัปเดต ---
-
     # 1. รับค่า GET parameters สำหรับการค้นหาและเรียงลำดับ
     search_query = request.GET.get("search_query", "")
     sort_by_param = request.GET.get("sort", "employee_id")  # ค่าเริ่มต้นเรียงตาม ID
     order_param = request.GET.get("order", "asc")  # ค่าเริ่มต้นเรียงจากน้อยไปมาก
 
-    # 2. เริ่มต้น Queryset
-    employees = Employee.objects.all()
+    # รับเฉพาะคอลัมน์ที่อนุญาต (ค่าอื่นจาก URL ใช้ค่าเริ่มต้น)
+    if sort_by_param not in EMPLOYEE_SORT_FIELDS:
+        sort_by_param = "employee_id"
+    if order_param not in ("asc", "desc"):
+        order_param = "asc"
 
-    # 3. ใช้ Q object ในการกรองข้อมูล (ค้นหาจากหลาย field)
-    if search_query:
-        employees = employees.filter(
-            Q(name__icontains=search_query)
-            | Q(user__username__icontains=search_query)
-            | Q(department__department_name__icontains=search_query)
-            | Q(position__position_name__icontains=search_query)
-        )
+    # 2. เริ่มต้น Queryset (ดึงข้อมูลที่แสดงในตารางมาพร้อมกันใน query เดียว)
+    employees = Employee.objects.select_related("user", "department", "position", "role")
 
-    # 4. กำหนดการเรียงลำดับ
+    # 3. ค้นหาจากคอลัมน์ search_key (ชื่อ, Username, แผนก, ตำแหน่ง) ดู app/search.py
+    employees = search_employees(employees, search_query)
+
+    # 4. กำหนดการเรียงลำดับ (เรียงด้วย employee_id ต่อท้ายเพื่อให้แต่ละหน้าไม่ซ้ำกัน)
     order_prefix = "-" if order_param == "desc" else ""
-    employees = employees.order_by(f"{order_prefix}{sort_by_param}")
+    employees = employees.order_by(
+        f"{order_prefix}{EMPLOYEE_SORT_FIELDS[sort_by_param]}", "employee_id"
+    )
+
+    paginator = Paginator(employees, EMPLOYEE_LIST_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page"))
 
     # 5. ส่งค่ากลับไปที่ Template
     context = {
-        "employees": employees,
+        "employees": page_obj.object_list,
+        "page_obj": page_obj,
         "search_query": search_query,
         "current_sort": sort_by_param,
         "current_order": order_param,
     }
     return render(request, "app/members_list.html", context)
-    # --- END: ส่วนที่อัปเดต ---
 
 
 @login_required
@@ -1000,112 +1192,33 @@ def employee_list_view(request):
 def statistics_view(request):
     """
     View สำหรับแสดงผล Dashboard สรุปสถิติ (สำหรับ HR/Admin)
+    หน้านี้ส่งเฉพาะโครงหน้าและตัวกรอง ข้อมูลของแต่ละกราฟโหลดภายหลังจาก statistics_chart_api
     """
 
-    # --- START: เพิ่มโค้ดสำหรับ Navbar (ที่ขาดหายไป) ---
-    # (จำเป็นต้องดึงข้อมูลเหล่านี้เพื่อให้เมนูใน base.html แสดงผลถูกต้อง)
-    navbar_context = {}
-    try:
-        employee = request.user.employee
-        pending_my_approval = ApprovalHistory.objects.filter(
-            approver=employee, status="Pending"
-        )
-        is_approver = employee.role.role_name.lower() in [
-            "manager",
-            "supervisor",
-            "hr",
-            "safety",
-        ]
-
-        navbar_context = {
-            "is_approver_or_admin": is_approver or is_hr_or_admin(request.user),
-            "is_hr_or_admin": is_hr_or_admin(request.user),
-            "is_security": is_security(request.user),
-            "approval_inbox_count": pending_my_approval.count(),
-        }
-    except Employee.DoesNotExist:
-        # กรณี Superuser ที่ไม่มีโปรไฟล์ Employee (แบบเดียวกับหน้า Dashboard)
-        is_admin_or_superuser = request.user.is_superuser
-        navbar_context = {
-            "is_approver_or_admin": is_admin_or_superuser,
-            "is_hr_or_admin": is_admin_or_superuser,
-            "is_security": False,
-            "approval_inbox_count": 0,
-        }
-    # --- END: เพิ่มโค้ดสำหรับ Navbar ---
-
-    # 1. สถิติ: จำนวนคำขอแยกตามสถานะ (โค้ดเดิม)
-    status_counts = (
-        LeaveRequest.objects.values("status")
-        .annotate(count=Count("status"))
-        .order_by("status")
-    )
-
-    # 2. สถิติ: จำนวนคำขอแยกตามแผนก (โค้ดเดิม)
-    department_counts = (
-        LeaveRequest.objects.values("employee__department__department_name")
-        .annotate(count=Count("request_id"))
-        .order_by("-count")
-    )
-
-    # 3. สถิติ: จำนวนคำขอแยกตามระยะเวลา (โค้ดเดิม)
-    duration_counts = (
-        LeaveRequest.objects.values("leave_duration")
-        .annotate(count=Count("leave_duration"))
-        .order_by("leave_duration")
-    )
-
-    # 4. สถิติ: จำนวนคำขอรายเดือน (โค้ดเดิมที่แก้ไข Timezone แล้ว)
-    requests_per_month = (
-        LeaveRequest.objects.annotate(
-            request_date=Cast("request_datetime", output_field=DateField())
-        )
-        .annotate(month=TruncMonth("request_date"))
-        .values("month")
-        .annotate(count=Count("request_id"))
-        .order_by("month")
-    )
-
-    # 5. จัดเตรียมข้อมูลสำหรับ Chart.js (โค้ดเดิม)
-    import json
-
-    status_data = {
-        "labels": [s["status"] for s in status_counts],
-        "data": [s["count"] for s in status_counts],
-    }
-
-    department_data = {
-        "labels": [
-            d["employee__department__department_name"] for d in department_counts
-        ],
-        "data": [d["count"] for d in department_counts],
-    }
-
-    duration_data = {
-        "labels": [d["leave_duration"] for d in duration_counts],
-        "data": [d["count"] for d in duration_counts],
-    }
-
-    month_labels = [m["month"].strftime("%Y-%m") for m in requests_per_month]
-    month_data = [m["count"] for m in requests_per_month]
-
+    # (Context ของ Navbar มาจาก context processor load_principal_flags)
     context = {
-        "status_data_json": json.dumps(status_data),
-        "department_data_json": json.dumps(department_data),
-        "duration_data_json": json.dumps(duration_data),
-        "month_labels_json": json.dumps(month_labels),
-        "month_data_json": json.dumps(month_data),
-        "total_requests": LeaveRequest.objects.count(),
-        "total_visitors": VisitorLog.objects.count(),
+        "departments": Department.objects.order_by("department_name"),
+        "start_date": request.GET.get("start_date", ""),
+        "end_date": request.GET.get("end_date", ""),
+        "department": request.GET.get("department", ""),
     }
 
-    # --- START: เพิ่ม Navbar context เข้าไปใน context หลัก ---
-    context.update(navbar_context)
-    # --- END: เพิ่ม Navbar context ---
-
     return render(request, "app/statistics.html", context)
 
 
+@login_required
+@user_passes_test(is_hr_or_admin, login_url="/")
+def statistics_chart_api(request, chart):
+    """
+    ข้อมูลของกราฟหนึ่งกราฟ (JSON) ตามตัวกรอง start_date, end_date, department
+    ผลลัพธ์ถูก cache ไว้จนกว่าข้อมูลต้นทางจะเปลี่ยน (ดู app/statistics_charts.py)
+    """
+    if chart not in STATISTICS_CHARTS:
+        raise Http404
+    data = get_chart_data(chart, get_statistics_filters(request.GET))
+    return JsonResponse(data)
+
+
 @login_required
 @user_passes_test(is_hr_or_admin, login_url="/")
 def create_user_view(request):
@@ -1174,25 +1287,9 @@ def test_email_view(request, request_id):
     return render(request, "app/test_email.html", context)
 
 
-# ระบุตำแหน่งไฟล์ Config
-CONFIG_FILE_PATH = os.path.join(settings.BASE_DIR, "site_config.json")
-
-
 def get_config_data():
-    """ฟังก์ชันช่วยอ่านค่าจาก JSON (ใช้ซ้ำได้)"""
-    try:
-        with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # ถ้าไฟล์ไม่มี หรือเสีย ให้ใช้ค่าเริ่มต้น
-        return {
-            "brand_name": "eLeave",
-            "footer_text": "&copy; 2025 ระบบขออนุญาตออกนอกสถานที่",
-            "color_primary": "#3498db",
-            "color_success": "#198754",
-            "color_warning": "#f39c12",
-            "color_danger": "#e74c3c",
-        }
+    """ฟังก์ชันช่วยอ่านค่าตั้งค่าเว็บไซต์ (ใช้ซ้ำได้) - อ่านผ่าน cache ใน site_config.py"""
+    return get_site_config()
 
 
 @login_required
@@ -1203,12 +1300,11 @@ def site_settings_view(request):
         if form.is_valid():
             new_config = form.cleaned_data
             try:
-                # เขียนข้อมูลใหม่ทับลงไฟล์ JSON
-                with open(CONFIG_FILE_PATH, "w", encoding="utf-8") as f:
-                    json.dump(new_config, f, indent=4, ensure_ascii=False)
+                # บันทึกค่าใหม่ (เพิ่ม version เพื่อให้ทุก worker/ทุกเครื่องโหลดใหม่)
+                save_site_config(new_config)
                 messages.success(request, "บันทึกการตั้งค่าเว็บไซต์เรียบร้อยแล้ว")
-            except IOError as e:
-                messages.error(request, f"เกิดข้อผิดพลาดในการบันทึกไฟล์: {e}")
+            except (IOError, DatabaseError) as e:
+                messages.error(request, f"เกิดข้อผิดพลาดในการบันทึกการตั้งค่า: {e}")
             return redirect("app:site-settings")
     else:
         # อ่านค่าปัจจุบันจากไฟล์มาแสดงในฟอร์ม
@@ -1252,31 +1348,11 @@ def force_change_password_view(request):
     else:
         password_form = CustomPasswordChangeForm(user=request.user)
 
-    # เราต้องดึง Context ที่ Navbar (base.html) ต้องใช้
-    try:
-        is_approver = employee.role.role_name.lower() in [
-            "manager",
-            "supervisor",
-            "hr",
-            "safety",
-        ]
-        approval_inbox_count = ApprovalHistory.objects.filter(
-            approver=employee, status="Pending"
-        ).count()
-    except Exception:
-        is_approver = False
-        approval_inbox_count = 0
-
+    # (Context ของ Navbar และ site_config มาจาก context processors)
     context = {
         "password_form": password_form,
         # --- Flag สำหรับ base.html ---
         "must_change_password_page": True,
-        # --- Context สำหรับ Navbar ---
-        "is_hr_or_admin": is_hr_or_admin(request.user),
-        "is_security": is_security(request.user),
-        "is_approver_or_admin": is_approver or is_hr_or_admin(request.user),
-        "approval_inbox_count": approval_inbox_count,
-        "site_config": get_config_data(),  # (ต้องมี get_config_data() ใน views.py ด้วย)
     }
 
     return render(request, "app/force_change_password.html", context)
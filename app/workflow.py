@@ -0,0 +1,578 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .live_events import (
+    SECURITY_CHANNEL,
+    publish_event,
+    publish_inbox_count,
+    ready_to_leave_data,
+)
+from .notifications import queue_notification_email, queue_notification_line
+from .rollups import apply_rollup_changes, rollup_key
+from .statistics_charts import bump_statistics_version
+
+# ==============================================================================
+# Workflow การอนุมัติคำขอ
+# ==============================================================================
+# ลำดับขั้นเก็บในตาราง ApprovalWorkflow/ApprovalWorkflowStep แล้วถูกแปลง (compile) เป็น
+# CompiledWorkflow ที่เก็บไว้ใน memory ของแต่ละ process พร้อมรายชื่อผู้อนุมัติแยกตาม (Role, แผนก)
+# การหาขั้นถัดไปและผู้อนุมัติจึงเป็นการเปิด dict ไม่ต้อง query ทุกครั้งที่อนุมัติ
+# ข้อมูลใน memory ถูกโหลดใหม่เมื่อ ApprovalWorkflowVersion ในฐานข้อมูลเปลี่ยน (แก้ workflow หรือข้อมูลพนักงาน)
+# (เก็บ version ในฐานข้อมูลเหมือน site_config: ทุก worker/ทุกเครื่องเห็นค่าเดียวกัน ไม่ขึ้นกับ CACHES)
+
+WorkflowStep = namedtuple("WorkflowStep", ["order", "stage", "label", "roles", "scope"])
+
+# ใช้เมื่อยังไม่มี workflow ในฐานข้อมูล (ลำดับเดิมของระบบ: Manager -> Supervisor -> HR/Safety)
+DEFAULT_WORKFLOW_STEPS = (
+    WorkflowStep(1, "manager", "ผู้จัดการ", ("manager",), "department"),
+    WorkflowStep(2, "supervisor", "Supervisor", ("supervisor",), "department"),
+    WorkflowStep(3, "hr_safety", "HR/Safety", ("hr", "safety"), "all"),
+)
+
+
+class NoApproverError(Exception):
+    """ไม่พบผู้อนุมัติของขั้นที่ต้องส่งต่อ"""
+
+    def __init__(self, step):
+        super().__init__(f"No approver for step {step.order} ({step.label})")
+        self.step = step
+
+
+class CompiledWorkflow:
+    def __init__(self, steps):
+        steps = sorted(steps, key=lambda step: step.order)
+        self.first_step = steps[0]
+        self._next = {a.order: b for a, b in zip(steps, steps[1:])}
+
+    def next_step(self, order):
+        """ขั้นถัดจากขั้นที่ order หรือ None ถ้าเป็นขั้นสุดท้ายแล้ว"""
+        return self._next.get(order)
+
+
+class _WorkflowState:
+    """workflow ที่ compile แล้ว + รายชื่อผู้อนุมัติ (หนึ่งชุดต่อ process)"""
+
+    def __init__(self, workflows, approvers):
+        self.workflows = workflows  # {(department_id|None, leave_duration|""): CompiledWorkflow}
+        self.approvers = approvers  # {(role, department_id): [Employee]} และ {(role, None): [...]}
+
+    def workflow_for(self, department_id, leave_duration):
+        for key in (
+            (department_id, leave_duration),
+            (department_id, ""),
+            (None, leave_duration),
+            (None, ""),
+        ):
+            workflow = self.workflows.get(key)
+            if workflow is not None:
+                return workflow
+        return _DEFAULT_WORKFLOW
+
+    def approvers_for(self, step, department_id):
+        department_id = department_id if step.scope == "department" else None
+        found = []
+        for role in step.roles:
+            found.extend(self.approvers.get((role, department_id), ()))
+        return found
+
+
+_DEFAULT_WORKFLOW = CompiledWorkflow(DEFAULT_WORKFLOW_STEPS)
+
+_lock = threading.Lock()
+_cache = {"state": None, "version": None, "checked_at": 0.0}
+
+
+def _check_interval():
+    """ระยะเวลา (วินาที) ที่จะตรวจ version ซ้ำ ระหว่างนี้จะใช้ข้อมูลใน memory ได้เลย"""
+    return getattr(settings, "WORKFLOW_CHECK_INTERVAL", 5)
+
+
+def invalidate_workflows():
+    """
+    เรียกเมื่อ workflow หรือข้อมูลผู้อนุมัติเปลี่ยน: เพิ่ม version ใน transaction เดียวกับการแก้ไข
+    (ทุก process จะเห็น version ใหม่พร้อมข้อมูลที่ commit แล้ว และโหลดใหม่ในรอบตรวจถัดไป)
+    """
+    from .models import ApprovalWorkflowVersion
+
+    if not ApprovalWorkflowVersion.objects.update(version=F("version") + 1):
+        # ยังไม่มีแถว (ปกติ migration สร้างไว้แล้ว): process ที่เคยอ่านได้ None จะเห็นค่าใหม่
+        ApprovalWorkflowVersion.objects.create()
+
+    def clear():
+        with _lock:
+            _cache["state"] = None
+
+    transaction.on_commit(clear)
+
+
+def _stored_version():
+    from .models import ApprovalWorkflowVersion
+
+    return ApprovalWorkflowVersion.objects.values_list("version", flat=True).first()
+
+
+def _load_state():
+    from .models import ApprovalWorkflow, Employee
+
+    workflows = {}
+    roles = {role for step in DEFAULT_WORKFLOW_STEPS for role in step.roles}
+    for workflow in ApprovalWorkflow.objects.filter(is_active=True).prefetch_related(
+        "steps"
+    ).order_by("-workflow_id"):
+        steps = [
+            WorkflowStep(
+                step.step_order,
+                step.stage,
+                step.label,
+                tuple(r.strip().lower() for r in step.roles.split(",") if r.strip()),
+                step.scope,
+            )
+            for step in workflow.steps.all()
+        ]
+        if steps:
+            workflows[(workflow.department_id, workflow.leave_duration)] = (
+                CompiledWorkflow(steps)
+            )
+            roles.update(role for step in steps for role in step.roles)
+
+    # ผู้อนุมัติทุกคนของทุก Role ที่ workflow ใช้ (รวมผู้รับมอบอำนาจแทน) ใน query เดียว
+    approvers = {}
+    role_filter = Q()
+    for role in sorted(roles):
+        role_filter |= Q(role__role_name__iexact=role)
+    employees = (
+        Employee.objects.select_related("role", "delegate_approver")
+        .filter(role_filter)
+        .order_by("employee_id")
+    )
+    for employee in employees:
+        role = employee.role.role_name.lower()
+        approvers.setdefault((role, employee.department_id), []).append(employee)
+        approvers.setdefault((role, None), []).append(employee)
+    return _WorkflowState(workflows, approvers)
+
+
+def _get_state():
+    now = time.monotonic()
+    with _lock:
+        if _cache["state"] is not None and now - _cache["checked_at"] < _check_interval():
+            return _cache["state"]
+        # อ่าน version ก่อนโหลดข้อมูล: ถ้ามีการแก้ไขระหว่างโหลด รอบถัดไปจะเห็น version ใหม่และโหลดซ้ำ
+        version = _stored_version()
+        if _cache["state"] is None or _cache["version"] != version:
+            _cache["state"] = _load_state()
+            _cache["version"] = version
+        _cache["checked_at"] = now
+        return _cache["state"]
+
+
+# ==============================================================================
+# การส่งต่อคำขอ
+# ==============================================================================
+
+
+def _delegate(approver, today):
+    """ผู้อนุมัติตัวจริง หรือผู้รับมอบอำนาจแทน ถ้าวันนี้อยู่ในช่วงมอบอำนาจ"""
+    if (
+        approver.delegate_approver
+        and approver.delegate_start_date
+        and approver.delegate_end_date
+        and approver.delegate_start_date <= today <= approver.delegate_end_date
+    ):
+        return approver.delegate_approver
+    return approver
+
+
+def _step_approvers(state, step, department_id, today):
+    """ผู้อนุมัติของขั้น step (แทนด้วยผู้รับมอบอำนาจถ้ามี, ไม่ซ้ำกัน)"""
+    approvers = []
+    for approver in state.approvers_for(step, department_id):
+        approver = _delegate(approver, today)
+        if approver not in approvers:
+            approvers.append(approver)
+    if not approvers:
+        raise NoApproverError(step)
+    return approvers
+
+
+def _request_details(leave_request):
+    return (
+        f"---\n"
+        f"รายละเอียดคำขอ:\n"
+        f"  รหัสคำขอ: {leave_request.request_id}\n"
+        f"  พนักงาน: {leave_request.employee.name}\n"
+        f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
+        f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
+        f"  เหตุผล: {leave_request.reason}\n"
+        f"---"
+    )
+
+
+def _assign_step(leave_request, step, is_new_request):
+    """สร้างงานอนุมัติของขั้น step ให้ผู้อนุมัติทุกคน แล้วส่งแจ้งเตือน คืนค่ารายชื่อผู้อนุมัติ"""
+    from .models import ApprovalHistory
+
+    approvers = _step_approvers(
+        _get_state(), step, leave_request.employee.department_id, timezone.localdate()
+    )
+    leave_request.current_approver_role = step.stage
+    ApprovalHistory.objects.bulk_create(
+        [
+            ApprovalHistory(
+                request=leave_request,
+                approver=approver,
+                approval_order=step.order,
+                status="Pending",
+            )
+            for approver in approvers
+        ]
+    )
+    # bulk_create ไม่ส่ง post_save จึงต้องอัปเดต badge งานรออนุมัติเอง
+    for approver in approvers:
+        publish_inbox_count(approver.pk)
+
+    employee_name = leave_request.employee.name
+    if is_new_request:
+        subject = f"คำขอใหม่ [{leave_request.request_id}] จากคุณ {employee_name}"
+        body = f"มีคำขอออกนอกสถานที่ใหม่จากคุณ {employee_name} รอการอนุมัติจากคุณ"
+    elif len(approvers) > 1:
+        subject = f"คำขอ [{leave_request.request_id}] รอการอนุมัติจาก {step.label}"
+        body = f"มีคำขอจากคุณ {employee_name} รอการอนุมัติจากแผนกของท่าน"
+    else:
+        subject = f"คำขอ [{leave_request.request_id}] รอการอนุมัติจากคุณ"
+        body = f"มีคำขอจากคุณ {employee_name} รอการอนุมัติจากคุณ"
+
+    # ผู้อนุมัติหลายคน: ใช้ข้อความ LINE เดียวกันทุกคน เพื่อให้ worker รวมส่งแบบ multicast ครั้งเดียว
+    group_line_message = (
+        f"เรียน {step.label}\n\n"
+        f"มีคำขอจากคุณ {employee_name} รอการอนุมัติจากแผนกของท่าน\n\n"
+        f"{_request_details(leave_request)}"
+    )
+    for approver in approvers:
+        queue_notification_email(
+            subject=subject,
+            message_body=body,
+            recipient=approver,
+            request_obj=leave_request,
+        )
+        if len(approvers) > 1:
+            line_message = group_line_message
+        else:
+            line_message = (
+                f"สวัสดีคุณ {approver.name}\n\n"
+                f"มีคำขอจากคุณ {employee_name} รอการอนุมัติจากคุณ\n\n"
+                f"{_request_details(leave_request)}"
+            )
+        queue_notification_line(line_message, approver)
+    return approvers
+
+
+def _workflow_for(leave_request):
+    return _get_state().workflow_for(
+        leave_request.employee.department_id, leave_request.leave_duration
+    )
+
+
+def start_workflow(leave_request):
+    """
+    ส่งคำขอใหม่ไปยังขั้นแรก คืนค่า (step, รายชื่อผู้อนุมัติ)
+    ถ้าไม่พบผู้อนุมัติจะ raise NoApproverError (ผู้เรียกเป็นผู้ตัดสินใจว่าจะทำอย่างไรกับคำขอ)
+    """
+    step = _workflow_for(leave_request).first_step
+    return step, _assign_step(leave_request, step, is_new_request=True)
+
+
+def claim_request(leave_request, expected_version=None):
+    """
+    จองสิทธิ์ตัดสินคำขอแบบ optimistic: เพิ่ม LeaveRequest.version เฉพาะเมื่อค่าในฐานข้อมูล
+    ยังเท่ากับ expected_version (ค่าเริ่มต้น = version ที่อ่านมาพร้อม leave_request)
+    คืนค่า False ถ้ามีผู้อื่นเปลี่ยนคำขอไปก่อนแล้ว (เช่น HR และ Safety กดอนุมัติพร้อมกัน)
+    ต้องเรียกก่อนเขียนข้อมูลอื่นของคำขอ ภายใน transaction เดียวกับการเปลี่ยนสถานะ
+    (ไม่ใช้ select_for_update: ผู้ที่แพ้จะรอเพียงจน transaction ของผู้ชนะ commit แล้วได้ False ทันที)
+    """
+    from .models import LeaveRequest
+
+    if expected_version is None:
+        expected_version = leave_request.version
+    claimed = LeaveRequest.objects.filter(
+        pk=leave_request.pk, version=expected_version
+    ).update(version=F("version") + 1)
+    if claimed:
+        leave_request.version = expected_version + 1
+    return bool(claimed)
+
+
+def close_other_tasks(leave_request, history):
+    """
+    ลบงานรออนุมัติของคำขอที่ผู้อนุมัติคนอื่นในขั้นเดียวกันยังค้างอยู่ (เช่น HR อนุมัติ/ปฏิเสธแล้ว
+    งานของ Safety ไม่ต้องทำต่อ) เรียกเมื่อ history ถูกตัดสินแล้ว ก่อนสร้างงานของขั้นถัดไป
+    """
+    from .models import ApprovalHistory
+
+    ApprovalHistory.objects.filter(request=leave_request, status="Pending").exclude(
+        pk=history.pk
+    ).delete()
+
+
+def advance_workflow(leave_request, history):
+    """
+    ส่งคำขอต่อหลังจาก history (งานของขั้นปัจจุบัน) ถูกอนุมัติ
+    คืนค่า (step ถัดไป, รายชื่อผู้อนุมัติ) หรือ (None, []) ถ้าอนุมัติครบทุกขั้นแล้ว
+    งานที่ยังค้างของขั้นเดียวกัน (ผู้อนุมัติคนอื่นในขั้นที่มีหลายคน) จะถูกลบ
+    """
+    close_other_tasks(leave_request, history)
+    step = _workflow_for(leave_request).next_step(history.approval_order)
+    if step is None:
+        leave_request.status = "Approved"
+        leave_request.current_approver_role = "completed"
+        return None, []
+    return step, _assign_step(leave_request, step, is_new_request=False)
+
+
+# ==============================================================================
+# แจ้งผลให้ผู้ยื่นคำขอ
+# ==============================================================================
+
+
+def notify_request_approved(leave_request):
+    """แจ้งพนักงานว่าคำขออนุมัติครบทุกขั้นแล้ว"""
+    queue_notification_email(
+        subject=f"คำขอ [{leave_request.request_id}] ของคุณได้รับการอนุมัติแล้ว",
+        message_body="ยินดีด้วย! คำขอออกนอกสถานที่ของคุณได้รับการอนุมัติอย่างสมบูรณ์แล้ว",
+        recipient=leave_request.employee,
+        request_obj=leave_request,
+    )
+    line_message = (
+        f"สวัสดีคุณ {leave_request.employee.name}\n\n"
+        f"ยินดีด้วย! คำขอออกนอกสถานที่ของคุณได้รับการอนุมัติแล้ว\n\n"
+        f"---\n"
+        f"รายละเอียดคำขอ:\n"
+        f"  รหัสคำขอ: {leave_request.request_id}\n"
+        f"  วันที่: {leave_request.leave_date.strftime('%d/%m/%Y')}\n"
+        f"  ระยะเวลา: {leave_request.get_leave_duration_display()}\n"
+        f"---"
+    )
+    queue_notification_line(line_message, leave_request.employee)
+
+
+def notify_request_rejected(leave_request, approver, comment):
+    """แจ้งพนักงานว่าคำขอถูกปฏิเสธโดย approver"""
+    queue_notification_email(
+        subject=f"คำขอ [{leave_request.request_id}] ของคุณถูกปฏิเสธ",
+        message_body=f"คำขอออกนอกสถานที่ของคุณถูกปฏิเสธโดยผู้อนุมัติ เหตุผล: {comment}",
+        recipient=leave_request.employee,
+        request_obj=leave_request,
+    )
+    line_message = (
+        f"สวัสดีคุณ {leave_request.employee.name}\n\n"
+        f"คำขอออกนอกสถานที่ของคุณถูกปฏิเสธ\n\n"
+        f"---\n"
+        f"รายละเอียดคำขอ:\n"
+        f"  รหัสคำขอ: {leave_request.request_id}\n"
+        f"  ผู้ปฏิเสธ: คุณ {approver.name}\n"
+        f"  เหตุผล: {comment if comment else 'ไม่ได้ระบุ'}\n"
+        f"---"
+    )
+    queue_notification_line(line_message, leave_request.employee)
+
+
+# ==============================================================================
+# อนุมัติ/ปฏิเสธหลายรายการพร้อมกัน (กล่องงานอนุมัติ)
+# ==============================================================================
+# ทำงานใน transaction เดียว: bulk_update ประวัติและสถานะคำขอ, bulk_create งานของขั้นถัดไป
+# และรวมแจ้งเตือนเป็นหนึ่งข้อความต่อผู้รับ (bulk_update/bulk_create ไม่ส่ง signal
+# จึงปรับตารางสรุปสถิติและส่ง live event ในฟังก์ชันนี้เอง)
+
+BULK_DECISIONS = ("approve", "reject")
+
+
+def _request_line(leave_request):
+    return (
+        f"  [{leave_request.request_id}] {leave_request.employee.name} "
+        f"{leave_request.leave_date.strftime('%d/%m/%Y')} "
+        f"({leave_request.get_leave_duration_display()})"
+    )
+
+
+def _notify_forwarded(approver, leave_requests):
+    """แจ้งผู้อนุมัติของขั้นถัดไปครั้งเดียว สำหรับทุกคำขอที่ส่งต่อมาให้"""
+    if len(leave_requests) == 1:
+        leave_request = leave_requests[0]
+        employee_name = leave_request.employee.name
+        subject = f"คำขอ [{leave_request.request_id}] รอการอนุมัติจากคุณ"
+        body = f"มีคำขอจากคุณ {employee_name} รอการอนุมัติจากคุณ"
+        line_message = f"{body}\n\n{_request_details(leave_request)}"
+        request_obj = leave_request
+    else:
+        subject = f"มีคำขอ {len(leave_requests)} รายการรอการอนุมัติจากคุณ"
+        body = f"{subject}\n\n" + "\n".join(_request_line(lr) for lr in leave_requests)
+        line_message = body
+        request_obj = None
+    # ข้อความไม่มีชื่อผู้รับ: ผู้อนุมัติที่ได้รับชุดคำขอเดียวกัน (เช่น HR/Safety) จะถูกรวมส่งแบบ multicast
+    queue_notification_email(
+        subject=subject, message_body=body, recipient=approver, request_obj=request_obj
+    )
+    queue_notification_line(line_message, approver)
+
+
+def _notify_decided(employee, decided, approver, comment):
+    """แจ้งผลให้พนักงานครั้งเดียว สำหรับทุกคำขอของพนักงานที่อนุมัติครบหรือถูกปฏิเสธในครั้งนี้"""
+    if len(decided) == 1:
+        leave_request = decided[0]
+        if leave_request.status == "Approved":
+            notify_request_approved(leave_request)
+        else:
+            notify_request_rejected(leave_request, approver, comment)
+        return
+
+    lines = [
+        f"{_request_line(lr)}: "
+        + ("ได้รับการอนุมัติแล้ว" if lr.status == "Approved" else "ถูกปฏิเสธ")
+        for lr in decided
+    ]
+    if any(lr.status == "Rejected" for lr in decided):
+        lines.append(f"เหตุผลการปฏิเสธ: {comment if comment else 'ไม่ได้ระบุ'}")
+    subject = f"ผลการพิจารณาคำขอของคุณ {len(decided)} รายการ"
+    body = "\n".join(lines)
+    queue_notification_email(
+        subject=subject, message_body=body, recipient=employee, request_obj=None
+    )
+    queue_notification_line(f"สวัสดีคุณ {employee.name}\n\n{subject}\n\n{body}", employee)
+
+
+@transaction.atomic
+def decide_approvals(approver, history_ids, decision, comment=""):
+    """
+    อนุมัติ/ปฏิเสธงานรออนุมัติ (ApprovalHistory) หลายรายการของ approver
+    decision: "approve" หรือ "reject" คืนค่า dict จำนวนคำขอ:
+      forwarded = ส่งต่อขั้นถัดไป, completed = อนุมัติครบแล้ว, rejected = ปฏิเสธ,
+      cancelled = ยกเลิกเพราะไม่พบผู้อนุมัติขั้นถัดไป, skipped = ไม่พบ/ถูกดำเนินการไปแล้ว
+    """
+    from .models import ApprovalHistory, InOutHistory, LeaveRequest
+
+    if decision not in BULK_DECISIONS:
+        raise ValueError(f"Unknown decision: {decision}")
+
+    history_ids = set(history_ids)
+    histories = [
+        history
+        for history in ApprovalHistory.objects.select_related(
+            "request__employee__department"
+        )
+        .filter(approver=approver, status="Pending", pk__in=history_ids)
+        .order_by("history_id")
+        # คำขอที่ผู้อื่นตัดสินไปแล้วหลังจากอ่าน (version เปลี่ยน) จะถูกข้าม
+        if claim_request(history.request)
+    ]
+    result = {
+        "forwarded": 0,
+        "completed": 0,
+        "rejected": 0,
+        "cancelled": 0,
+        "skipped": len(history_ids) - len(histories),
+    }
+    if not histories:
+        return result
+
+    state = _get_state()
+    now = timezone.localtime()
+    today = now.date()
+    rollup_changes = []
+    new_histories = []
+    forwarded = {}  # approver_id -> (ผู้อนุมัติขั้นถัดไป, [คำขอ])
+    decided = {}  # employee_id -> (พนักงาน, [คำขอที่อนุมัติครบ/ถูกปฏิเสธ])
+
+    for history in histories:
+        leave_request = history.request
+        old_key = rollup_key(leave_request)
+        history.comment = comment
+        history.approval_date = today
+        history.approval_time = now.time()
+
+        if decision == "reject":
+            history.status = "Rejected"
+            leave_request.status = "Rejected"
+            leave_request.current_approver_role = "completed"
+            result["rejected"] += 1
+        else:
+            history.status = "Approved"
+            step = state.workflow_for(
+                leave_request.employee.department_id, leave_request.leave_duration
+            ).next_step(history.approval_order)
+            if step is None:
+                leave_request.status = "Approved"
+                leave_request.current_approver_role = "completed"
+                result["completed"] += 1
+            else:
+                try:
+                    next_approvers = _step_approvers(
+                        state, step, leave_request.employee.department_id, today
+                    )
+                except NoApproverError:
+                    leave_request.status = "Rejected"
+                    leave_request.current_approver_role = "completed"
+                    result["cancelled"] += 1
+                else:
+                    leave_request.current_approver_role = step.stage
+                    result["forwarded"] += 1
+                    for next_approver in next_approvers:
+                        new_histories.append(
+                            ApprovalHistory(
+                                request=leave_request,
+                                approver=next_approver,
+                                approval_order=step.order,
+                                status="Pending",
+                            )
+                        )
+                        forwarded.setdefault(next_approver.pk, (next_approver, []))[
+                            1
+                        ].append(leave_request)
+
+        if history.status == "Rejected" or leave_request.status == "Approved":
+            employee = leave_request.employee
+            decided.setdefault(employee.pk, (employee, []))[1].append(leave_request)
+        rollup_changes.append((old_key, rollup_key(leave_request)))
+
+    leave_requests = [history.request for history in histories]
+    ApprovalHistory.objects.bulk_update(
+        histories, ["status", "comment", "approval_date", "approval_time"]
+    )
+    LeaveRequest.objects.bulk_update(leave_requests, ["status", "current_approver_role"])
+    # เหมือน close_other_tasks (งานของขั้นถัดไปยังไม่ถูกสร้าง จึงไม่ถูกลบไปด้วย)
+    ApprovalHistory.objects.filter(request__in=leave_requests, status="Pending").exclude(
+        pk__in=[history.pk for history in histories]
+    ).delete()
+    ApprovalHistory.objects.bulk_create(new_histories)
+
+    if apply_rollup_changes(rollup_changes):
+        bump_statistics_version("leave")
+
+    publish_inbox_count(approver.pk)
+    for next_approver, forwarded_requests in forwarded.values():
+        publish_inbox_count(next_approver.pk)
+        _notify_forwarded(next_approver, forwarded_requests)
+    for employee, decided_requests in decided.values():
+        _notify_decided(employee, decided_requests, approver, comment)
+
+    # คำขอของวันนี้ที่อนุมัติครบแล้ว -> แสดงบน Security Dashboard (เหมือน signal ของ LeaveRequest)
+    ready = [
+        lr for lr in leave_requests if lr.status == "Approved" and lr.leave_date == today
+    ]
+    if ready:
+        recorded = set(
+            InOutHistory.objects.filter(request__in=ready).values_list(
+                "request_id", flat=True
+            )
+        )
+        for leave_request in ready:
+            if leave_request.pk not in recorded:
+                publish_event(
+                    SECURITY_CHANNEL, "leave.ready", ready_to_leave_data(leave_request)
+                )
+    return result
@@ -3,6 +3,10 @@ ASGI config for leave project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live event stream (/events/) requires running under ASGI, e.g.:
+
+    uvicorn leave.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
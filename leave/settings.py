@@ -33,6 +33,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'app.middleware.PrincipalMiddleware',  # (หลัง auth: โหลดพนักงาน/สิทธิ์ครั้งเดียวต่อ request)
     'app.middleware.ForcePasswordChangeMiddleware',  # (หลัง messages)
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -50,12 +51,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'app.context_processors.load_site_config',
+                'app.context_processors.load_principal_flags',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'leave.wsgi.application'
+ASGI_APPLICATION = 'leave.asgi.application'
 
 DATABASES = {
     'default': {
@@ -126,4 +129,110 @@ LINE_CHANNEL_ACCESS_TOKEN = 'RaIJYRzSOTH4GOEK0CBQ8l192kqS+5U5+fGwcvBk8py35XAi6sd
 # ID นี้จะใช้รับการแจ้งเตือนทั้งหมดเมื่อ DEBUG = True
 LINE_TEST_USER_ID = 'Uc533199e2c2c614aa8a1b2a566616b3e' 
 # -------------------------
-# --- Development/Testing Settings ---
\ No newline at end of file
+# --- Development/Testing Settings ---
+# --- Site Configuration Settings ---
+# ==============================================================================
+# 'db' = เก็บค่าตั้งค่าเว็บไซต์ในฐานข้อมูล (ใช้ร่วมกันได้ทุกเครื่อง)
+# 'file' = อ่าน/เขียน site_config.json (สำหรับเครื่องเดียว)
+SITE_CONFIG_BACKEND = 'db'
+# จำนวนวินาทีที่แต่ละ worker จะใช้ค่าใน cache ก่อนตรวจ version ซ้ำ
+SITE_CONFIG_CHECK_INTERVAL = 5
+
+# --- Notification Outbox Settings ---
+# ==============================================================================
+# แจ้งเตือนทั้งหมดจะถูกบันทึกลงตาราง Outbox แล้วส่งจริงโดย
+#   python manage.py notification_worker
+NOTIFICATION_WORKER_THREADS = 4          # จำนวน thread ที่ส่งพร้อมกัน
+NOTIFICATION_WORKER_BATCH_SIZE = 50      # จำนวนงานที่ดึงมาต่อรอบ
+NOTIFICATION_WORKER_POLL_INTERVAL = 2.0  # วินาทีที่รอเมื่อไม่มีงานค้าง
+NOTIFICATION_MAX_ATTEMPTS = 5            # ส่งไม่สำเร็จครบจำนวนนี้ จะย้ายเป็นสถานะ Dead
+NOTIFICATION_RETRY_BASE_SECONDS = 30     # backoff: 30s, 60s, 120s, ...
+NOTIFICATION_RETRY_MAX_SECONDS = 3600
+NOTIFICATION_LEASE_SECONDS = 300         # งานที่ค้างสถานะ Sending นานกว่านี้จะถูกส่งใหม่
+
+# --- LINE Client Settings ---
+# ==============================================================================
+LINE_CONNECT_TIMEOUT = 3.05  # วินาที (รอเชื่อมต่อ)
+LINE_READ_TIMEOUT = 10       # วินาที (รอคำตอบ)
+LINE_MAX_RETRIES = 3         # ลองใหม่อัตโนมัติเมื่อเจอ 429/5xx
+LINE_POOL_SIZE = 10          # ควรเท่ากับหรือมากกว่า NOTIFICATION_WORKER_THREADS
+
+# --- Cached Counters ---
+# ==============================================================================
+# จำนวนพนักงานทั้งหมด (หน้า Dashboard) ถูกเก็บใน cache และนับใหม่เมื่อเพิ่ม/ลบพนักงาน
+# หากรันหลายเครื่อง ควรตั้งค่า CACHES ให้ใช้ cache ร่วมกัน (เช่น Redis/Memcached)
+EMPLOYEE_COUNT_CACHE_TIMEOUT = 300
+# ข้อมูลกราฟหน้าสถิติ (/reports/statistics/<chart>.json) ถูกล้างทันทีเมื่อข้อมูลเปลี่ยน
+# (version เก็บในฐานข้อมูล ทุก worker เห็นพร้อมกันแม้ CACHES แยกต่อ worker) ค่านี้เป็นอายุสูงสุดของแต่ละ key (วินาที)
+STATISTICS_CACHE_TIMEOUT = 600
+
+# --- Live Events (Server-Sent Events) ---
+# ==============================================================================
+# Security Dashboard และ badge กล่องงานอนุมัติ อัปเดตแบบ real-time ผ่าน /events/
+# ต้องรันผ่าน ASGI เช่น  uvicorn leave.asgi:application
+# - InProcessBroker : ASGI process เดียว (เครื่องเดียว, worker เดียว)
+# - DatabaseBroker  : หลาย worker/หลายเครื่อง (ส่งต่อ event ผ่านตาราง LiveEvent)
+# หรือระบุ path ของ class อื่นที่มี start() และ publish(channel, event_type, data)
+LIVE_EVENTS_BROKER = 'app.live_events.InProcessBroker'
+LIVE_EVENTS_KEEPALIVE_SECONDS = 15   # ส่ง keep-alive ทุกกี่วินาที (กัน proxy ตัดการเชื่อมต่อ)
+LIVE_EVENTS_QUEUE_SIZE = 100         # event ค้างต่อผู้ฟังเกินนี้ หน้าจอจะโหลดใหม่แทน
+LIVE_EVENTS_POLL_INTERVAL = 1.0      # (DatabaseBroker) วินาทีระหว่างการอ่าน event ใหม่
+LIVE_EVENTS_RETENTION_SECONDS = 300  # (DatabaseBroker) ลบ event ที่เก่ากว่านี้
+LIVE_EVENTS_GAP_SECONDS = 30         # (DatabaseBroker) รอ event ที่ commit ช้า (id ข้ามไป) ได้นานเท่านี้
+
+# --- Report Jobs (สร้างไฟล์รายงานเบื้องหลัง) ---
+# ==============================================================================
+# ไฟล์รายงานถูกสร้างโดย  python manage.py report_worker  และเก็บไว้ที่ MEDIA_ROOT/reports/
+REPORT_WORKER_PROCESSES = 2        # จำนวน process ที่สร้างรายงานพร้อมกัน
+REPORT_WORKER_POLL_INTERVAL = 2.0  # วินาทีที่รอเมื่อไม่มีงานค้าง
+REPORT_JOB_TTL_SECONDS = 3600      # ขอรายงานตัวกรองเดิมภายในเวลานี้ จะได้ไฟล์เดิม (และลบไฟล์เมื่อหมดอายุ)
+REPORT_JOB_LEASE_SECONDS = 600     # งานที่ไม่มีความคืบหน้านานกว่านี้ (worker ตาย) จะถูกสร้างใหม่
+EXPORT_XLSX_MAX_ROWS = 20000       # Excel ที่ใหญ่กว่านี้ (แถว) ส่งไปสร้างเบื้องหลังแทนการดาวน์โหลดทันที
+
+# --- Attachment Storage ---
+# ==============================================================================
+# ไฟล์แนบของคำขอและภาพถ่ายการกลับเข้า เก็บตามเนื้อหาไฟล์ที่ MEDIA_ROOT/blobs/ (ไฟล์ซ้ำเก็บครั้งเดียว)
+# ไฟล์ที่ไม่มีการอ้างอิงแล้วถูกลบโดย  python manage.py dedupe_media
+BLOB_GRACE_SECONDS = 24 * 3600     # ไฟล์ที่ไม่มีการอ้างอิงนานกว่านี้จะถูกลบโดย dedupe_media
+# อัปโหลดไฟล์แนบทีละส่วน (/uploads/) ส่งต่อจากจุดเดิมได้เมื่อสัญญาณหลุด
+CHUNKED_UPLOAD_MAX_SIZE = 20 * 1024 * 1024    # ขนาดไฟล์สูงสุด (byte)
+CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024       # ขนาดต่อส่วน (ต่อ request)
+CHUNKED_UPLOAD_EXPIRE_SECONDS = 24 * 3600     # การอัปโหลดที่ค้างนานกว่านี้จะถูกลบโดย dedupe_media
+# CHUNKED_UPLOAD_DIR = ...                    # ค่าเริ่มต้น MEDIA_ROOT/uploads (ควรอยู่บนดิสก์เดียวกับ MEDIA_ROOT)
+
+# --- Object Storage (หลายเครื่อง) ---
+# ==============================================================================
+# เก็บไฟล์แนบ/ภาพถ่ายบน object storage แบบ S3 (AWS S3, MinIO ฯลฯ) แทน MEDIA_ROOT ของแต่ละเครื่อง
+# browser อัปโหลดไฟล์ตรงไปที่ bucket ด้วย presigned URL (bucket ต้องตั้ง CORS ให้ PUT จากโดเมนของระบบได้
+# โดยอนุญาต header Content-Type และ x-amz-checksum-sha256)
+# ATTACHMENT_STORAGE = 'app.object_storage.DedupObjectStorage'
+ATTACHMENT_STORAGE = 'app.storage.DedupFileSystemStorage'
+# 'app.object_storage.S3Client' หรือ 'app.object_storage.InMemoryObjectClient' (ทดสอบด้วย runserver โดยไม่ต้องมี MinIO)
+OBJECT_STORAGE_CLIENT = 'app.object_storage.S3Client'
+OBJECT_STORAGE_ENDPOINT_URL = 'http://127.0.0.1:9000'  # เช่น https://s3.ap-southeast-1.amazonaws.com
+OBJECT_STORAGE_BUCKET = 'eleave-media'
+OBJECT_STORAGE_REGION = 'us-east-1'
+OBJECT_STORAGE_ACCESS_KEY = ''
+OBJECT_STORAGE_SECRET_KEY = ''
+OBJECT_STORAGE_ADDRESSING_STYLE = 'path'  # 'path' (MinIO) หรือ 'virtual' (https://<bucket>.<host>/)
+OBJECT_STORAGE_PRESIGN_SECONDS = 300      # อายุของ presigned URL (อัปโหลด/เปิดไฟล์)
+
+# --- Protected Media ---
+# ==============================================================================
+# ไฟล์แนบ/ภาพถ่าย/รายงาน ถูกส่งผ่าน view ที่ตรวจสิทธิ์ก่อน (ไม่เปิด MEDIA_URL ให้เข้าถึงโดยตรง)
+# 'django'   = ส่งไฟล์ด้วย Django (FileResponse)
+# 'nginx'    = ให้ nginx ส่งไฟล์ผ่าน X-Accel-Redirect (ดูตัวอย่าง location ใน README)
+# 'sendfile' = ให้ Apache (mod_xsendfile) ส่งไฟล์ผ่าน X-Sendfile
+MEDIA_SERVE_BACKEND = 'django'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'  # (nginx) location แบบ internal ที่ชี้ไปยัง MEDIA_ROOT
+
+# --- Return Image Processing ---
+# ==============================================================================
+# ภาพถ่ายการกลับเข้าถูกตัด EXIF/ย่อขนาด/สร้าง WebP เบื้องหลังโดย  python manage.py image_worker
+IMAGE_WORKER_PROCESSES = 2         # จำนวน process ที่ประมวลผลภาพพร้อมกัน
+IMAGE_WORKER_POLL_INTERVAL = 2.0   # วินาทีที่รอเมื่อไม่มีงานค้าง
+IMAGE_WORKER_LEASE_SECONDS = 300   # ภาพที่ค้างสถานะ Processing นานกว่านี้ (worker ตาย) จะถูกประมวลผลใหม่
+RETURN_IMAGE_MAX_SIZE = 2048       # ด้านยาวสูงสุด (px) ของภาพที่เก็บแทนต้นฉบับ (JPEG)
+RETURN_IMAGE_DISPLAY_SIZE = 1280   # ภาพสำหรับเปิดดู (WebP)
+RETURN_IMAGE_THUMB_SIZE = 320      # ภาพย่อในรายงาน (WebP)
+RETURN_IMAGE_QUALITY = 80
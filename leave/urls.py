@@ -1,8 +1,5 @@
 from django.contrib import admin
 from django.urls import path, include
-# --- Import ที่เพิ่มเข้ามาใหม่ ---
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,8 +7,7 @@ urlpatterns = [
     path('db-manager/', include('db_manager.urls')),
 ]
 
-# --- การตั้งค่าที่เพิ่มเข้ามาใหม่ ---
-# เพิ่ม path สำหรับให้บริการไฟล์ media ในระหว่างการพัฒนา (development)
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# --- ไฟล์ media ---
+# ไฟล์แนบ/ภาพถ่าย/รายงาน ส่งผ่าน view ที่ตรวจสิทธิ์ก่อน (app/protected_media.py) ทั้งตอนพัฒนาและใช้งานจริง
+# จึงไม่เปิด MEDIA_URL ให้เข้าถึงได้โดยตรง (เดิมใช้ static() เมื่อ DEBUG = True)
 